@@ -0,0 +1,226 @@
+"""
+Headless Runner for the Demo 1 tool agent
+
+Runs the conference assistant (tool_agent.py) over a JSONL file of prompts
+without Streamlit, to measure throughput and latency:
+- Configurable concurrency (prompts in flight at once) and repeats (to see
+  the tool, trajectory and intent-router caches warm up)
+- Writes to --out:
+  - responses.jsonl: one line per run with the answer, who planned the tools,
+    timing and any error
+  - traces.jsonl: per-turn timing and every tool call (arguments, status,
+    cached/timed out, seconds, result)
+  - summary.json: p50/p95/p99 latency end to end, model time and tool time,
+    throughput, planning sources, timeouts, cache/router stats and tokens used
+- Works against the local stub LLM (llm_stub_server.py)
+
+Prompts file, one JSON object per line ("id" optional):
+    {"id": "weather", "prompt": "What's the weather like in Cape Town on November 22, 2025?"}
+    {"prompt": "I'm attending .NET Conf in Cape Town on November 22. Help me prepare!"}
+
+Usage:
+    python agent_runner.py prompts.jsonl --out agent_output --concurrency 8
+    python agent_runner.py prompts.jsonl --repeat 3
+
+Test offline against the stub:
+    python llm_stub_server.py --port 8000 --profile fast
+    (AZURE_AI_ENDPOINT=http://localhost:8000/cognitiveservices/openai/v1/ in .env)
+"""
+
+import argparse
+import contextvars
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional
+
+from dotenv import load_dotenv
+
+from conference_tools import registry
+from intent_router import get_intent_router_stats
+from llm_client import get_azure_client
+from llm_metrics import percentile
+from llm_usage import usage_ledger, usage_run
+from tool_agent import run_agent_with_tools
+from tool_cache import get_tool_cache_stats
+from trajectory_cache import get_trajectory_cache_stats
+
+load_dotenv()
+
+
+def load_prompts(path: str) -> List[Dict[str, str]]:
+    """Read and validate the prompts file"""
+    prompts, seen = [], set()
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if not isinstance(entry, dict) or not str(entry.get("prompt") or "").strip():
+                raise ValueError(f"Line {number}: expected an object with a non-empty \"prompt\"")
+            prompt_id = str(entry.get("id") or f"prompt{number}")
+            if not re.fullmatch(r"[\w.-]+", prompt_id) or prompt_id in seen:
+                raise ValueError(f"Line {number}: prompt id {prompt_id!r} must be unique and file-name safe")
+            seen.add(prompt_id)
+            prompts.append({"id": prompt_id, "prompt": entry["prompt"]})
+    return prompts
+
+
+def _write_jsonl(path: str, lines: List[Dict[str, Any]]):
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+
+
+def run_prompt(client, entry: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    """
+    Run the agent on one prompt
+
+    Returns:
+        {"response": response line, "trace": trace line}
+    """
+    start = time.perf_counter()
+    try:
+        result = run_agent_with_tools(client, entry["prompt"])
+        error = None
+    except Exception as e:
+        result, error = None, f"{type(e).__name__}: {e}"
+    seconds = time.perf_counter() - start
+
+    turns = result["turns"] if result else []
+    tool_calls = result["tool_calls"] if result else []
+    response = {
+        "id": entry["id"],
+        "repeat": repeat,
+        "prompt": entry["prompt"],
+        "response": result["response"] if result else None,
+        "error": error,
+        "planned_by": result["planned_by"] if result else None,
+        "seconds": seconds,
+        "model_seconds": sum(turn["model_seconds"] for turn in turns),
+        "tool_seconds": sum(turn["tool_seconds"] for turn in turns),
+        "model_calls": sum(1 for turn in turns if turn["planned_by"] == "model"),
+        "tool_calls": len(tool_calls),
+        "timed_out": sum(turn["timed_out"] for turn in turns),
+        "saved_prompt_tokens": result["compaction"]["saved_tokens"] if result else 0
+    }
+    trace = {"id": entry["id"], "repeat": repeat, "turns": turns, "tool_calls": tool_calls}
+    return {"response": response, "trace": trace}
+
+
+def _latency(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": (sum(values) / len(values)) if values else None,
+        "max": max(values) if values else None
+    }
+
+
+def summarize(responses: List[Dict[str, Any]], wall_seconds: float, concurrency: int) -> Dict[str, Any]:
+    """Latency percentiles, throughput and where the time went"""
+    succeeded = [r for r in responses if r["error"] is None]
+    model_total = sum(r["model_seconds"] for r in succeeded)
+    tool_total = sum(r["tool_seconds"] for r in succeeded)
+    planned_by: Dict[str, int] = {}
+    for r in succeeded:
+        planned_by[r["planned_by"]] = planned_by.get(r["planned_by"], 0) + 1
+    return {
+        "runs": len(responses),
+        "succeeded": len(succeeded),
+        "failed": len(responses) - len(succeeded),
+        "concurrency": concurrency,
+        "wall_seconds": wall_seconds,
+        "throughput_per_second": (len(responses) / wall_seconds) if wall_seconds else 0.0,
+        "latency_seconds": {
+            "total": _latency([r["seconds"] for r in succeeded]),
+            "model": _latency([r["model_seconds"] for r in succeeded]),
+            "tools": _latency([r["tool_seconds"] for r in succeeded])
+        },
+        "model_share": (model_total / (model_total + tool_total)) if model_total + tool_total else 0.0,
+        "model_calls": sum(r["model_calls"] for r in succeeded),
+        "tool_calls": sum(r["tool_calls"] for r in succeeded),
+        "tool_timeouts": sum(r["timed_out"] for r in succeeded),
+        "saved_prompt_tokens": sum(r["saved_prompt_tokens"] for r in succeeded),
+        "planned_by": planned_by,
+        "tool_cache": get_tool_cache_stats(),
+        "trajectory_cache": get_trajectory_cache_stats(),
+        "intent_router": get_intent_router_stats(),
+        "tools": registry.stats()
+    }
+
+
+def run_all(client, prompts: List[Dict[str, str]], concurrency: int, repeat: int = 1) -> List[Dict[str, Any]]:
+    """
+    Run every prompt (repeat times, one pass after another) with bounded concurrency
+
+    Returns:
+        Results in prompt order within each pass
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for number in range(1, repeat + 1):
+            # copy_context: the usage run (and its tags) follows each prompt into its worker thread
+            futures = {pool.submit(contextvars.copy_context().run, run_prompt, client, entry, number): index
+                       for index, entry in enumerate(prompts)}
+            done = [None] * len(prompts)
+            for future in as_completed(futures):
+                result = future.result()
+                done[futures[future]] = result
+                r = result["response"]
+                status = f"❌ {r['error']}" if r["error"] else f"{r['seconds']:.2f}s ({r['planned_by']})"
+                print(f"   {r['id']} #{number}: {status}")
+            results.extend(done)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Demo 1 tool agent over a JSONL file of prompts")
+    parser.add_argument("prompts", help="JSONL file of prompts")
+    parser.add_argument("--out", default="agent_output", help="Directory for responses, traces and summary")
+    parser.add_argument("--concurrency", type=int, default=4, help="Prompts in flight at once")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the prompts file")
+    args = parser.parse_args()
+
+    client = get_azure_client()
+    if client is None:
+        print("⚠️ Configure AZURE_AI_ENDPOINT and AZURE_AI_API_KEY (or point them at llm_stub_server.py)")
+        sys.exit(1)
+
+    prompts = load_prompts(args.prompts)
+    os.makedirs(args.out, exist_ok=True)
+    print(f"▶️  {len(prompts)} prompt(s) x {args.repeat} with concurrency {args.concurrency}")
+
+    start = time.perf_counter()
+    with usage_run("agent_runner") as run_id:
+        results = run_all(client, prompts, args.concurrency, args.repeat)
+    wall_seconds = time.perf_counter() - start
+
+    responses = [r["response"] for r in results]
+    _write_jsonl(os.path.join(args.out, "responses.jsonl"), responses)
+    _write_jsonl(os.path.join(args.out, "traces.jsonl"), [r["trace"] for r in results])
+    summary = summarize(responses, wall_seconds, args.concurrency)
+    summary["usage"] = usage_ledger.run(run_id)
+    with open(os.path.join(args.out, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False, default=str)
+
+    latency = summary["latency_seconds"]
+    print(f"\n✅ {summary['succeeded']}/{summary['runs']} runs in {wall_seconds:.1f}s "
+          f"({summary['throughput_per_second']:.2f}/s, outputs in {args.out}/)")
+    if summary["succeeded"]:
+        for name in ("total", "model", "tools"):
+            print(f"   {name:>5}: p50 {latency[name]['p50']:.2f}s | p95 {latency[name]['p95']:.2f}s | "
+                  f"p99 {latency[name]['p99']:.2f}s")
+        print(f"   Model vs tools: {summary['model_share']:.0%} / {1 - summary['model_share']:.0%} of agent time, "
+              f"{summary['model_calls']} model calls, {summary['tool_calls']} tool calls "
+              f"({summary['tool_timeouts']} timed out)")
+    usage = summary["usage"]
+    print(f"🧾 This run: {usage['calls']} calls, {usage['total_tokens']:,} tokens (~${usage['cost']:.4f})")
+
+
+if __name__ == "__main__":
+    main()
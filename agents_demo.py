@@ -5,9 +5,12 @@ This demonstrates more complex agent interactions and workflows
 
 import streamlit as st
 import os
+import asyncio
 from dotenv import load_dotenv
-from openai import AzureOpenAI, OpenAI
+from llm_client import get_azure_client, get_async_azure_client, run_async, chat_completion, achat_completion
 import json
+import time
+from history_budget import HistoryBudgeter, DEFAULT_MAX_PROMPT_TOKENS
 
 load_dotenv()
 
@@ -65,30 +68,27 @@ ADVANCED_AGENTS = {
     }
 }
 
-def get_azure_client():
-    """Initialize Azure OpenAI client"""
-    api_key = os.getenv("AZURE_AI_API_KEY")
-    endpoint = os.getenv("AZURE_AI_ENDPOINT")
-    
-    if not endpoint or not api_key:
-        return None
+def get_agent_response(client, agent_key, conversation_history):
+    """Get response from Azure OpenAI agent with conversation history"""
+    agent = ADVANCED_AGENTS[agent_key]
+    deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
     
-    # Check if using Cognitive Services endpoint
-    if 'cognitiveservices' in endpoint:
-        return OpenAI(
-            base_url=endpoint,
-            api_key=api_key
-        )
-    else:
-        api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
-        return AzureOpenAI(
-            api_key=api_key,
-            api_version=api_version,
-            azure_endpoint=endpoint
+    try:
+        messages = [{"role": "system", "content": agent["system_prompt"]}]
+        messages.extend(conversation_history)
+        
+        response = chat_completion(
+            client, "agents_demo.get_agent_response",
+            tags={"agent": agent_key},
+            model=deployment_name,
+            messages=messages
         )
+        return response.choices[0].message.content
+    except Exception as e:
+        return f"Error: {str(e)}"
 
-def get_agent_response(client, agent_key, conversation_history):
-    """Get response from Azure OpenAI agent with conversation history"""
+async def get_agent_response_async(client, agent_key, conversation_history):
+    """Async variant of get_agent_response (takes the async client)"""
     agent = ADVANCED_AGENTS[agent_key]
     deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
     
@@ -96,7 +96,9 @@ def get_agent_response(client, agent_key, conversation_history):
         messages = [{"role": "system", "content": agent["system_prompt"]}]
         messages.extend(conversation_history)
         
-        response = client.chat.completions.create(
+        response = await achat_completion(
+            client, "agents_demo.get_agent_response",
+            tags={"agent": agent_key},
             model=deployment_name,
             messages=messages
         )
@@ -104,9 +106,25 @@ def get_agent_response(client, agent_key, conversation_history):
     except Exception as e:
         return f"Error: {str(e)}"
 
-def multi_agent_workflow(client, user_query):
-    """Run a multi-agent workflow where agents build on each other's responses"""
+async def compare_agents_async(client, agent_keys, query):
+    """Ask several agents the same question concurrently"""
+    conversation = [{"role": "user", "content": query}]
+    responses = await asyncio.gather(*[
+        get_agent_response_async(client, agent_key, conversation)
+        for agent_key in agent_keys
+    ])
+    return dict(zip(agent_keys, responses))
+
+def multi_agent_workflow(client, user_query, max_prompt_tokens=DEFAULT_MAX_PROMPT_TOKENS):
+    """
+    Run a multi-agent workflow where agents build on each other's responses
+    
+    Earlier answers are digested as needed to keep each agent's prompt under
+    max_prompt_tokens. Returns (results per agent, prompt size report per step).
+    """
     workflow_results = {}
+    step_report = []
+    budgeter = HistoryBudgeter(max_prompt_tokens)
     
     # Agent workflow order
     workflow_order = ["Analyst", "Strategist", "Innovator", "Critic"]
@@ -115,13 +133,26 @@ def multi_agent_workflow(client, user_query):
     
     for agent_key in workflow_order:
         with st.spinner(f"Consulting {ADVANCED_AGENTS[agent_key]['name']}..."):
-            response = get_agent_response(client, agent_key, conversation_history)
+            budgeted = budgeter.fit(ADVANCED_AGENTS[agent_key]["system_prompt"], conversation_history)
+            
+            start = time.perf_counter()
+            response = get_agent_response(client, agent_key, budgeted["messages"])
             workflow_results[agent_key] = response
             
-            # Add this agent's response to the conversation history
+            step_report.append({
+                "agent": agent_key,
+                "full_prompt_tokens": budgeted["full_tokens"],
+                "prompt_tokens": budgeted["prompt_tokens"],
+                "digested_turns": budgeted["digested_turns"],
+                "dropped_turns": budgeted["dropped_turns"],
+                "truncated_query": budgeted["truncated_query"],
+                "latency": time.perf_counter() - start
+            })
+            
+            # Add this agent's full response to the history (the budgeter trims it per step)
             conversation_history.append({"role": "assistant", "content": f"[{agent_key}]: {response}"})
     
-    return workflow_results
+    return workflow_results, step_report
 
 # Sidebar
 with st.sidebar:
@@ -199,18 +230,42 @@ elif mode == "Multi-Agent Workflow":
     
     query = st.text_area("Enter your query:", height=100, placeholder="e.g., How can we improve customer retention for our SaaS product?")
     
+    max_prompt_tokens = st.number_input(
+        "Max prompt tokens per agent:",
+        min_value=500,
+        value=DEFAULT_MAX_PROMPT_TOKENS,
+        step=250,
+        help="Earlier agents' answers are condensed into digests to stay under this cap"
+    )
+    
     if st.button("🚀 Run Workflow", type="primary"):
         if query:
             client = get_azure_client()
             if client:
                 st.markdown("---")
-                results = multi_agent_workflow(client, query)
+                results, step_report = multi_agent_workflow(client, query, max_prompt_tokens)
                 
                 for agent_key, response in results.items():
                     agent = ADVANCED_AGENTS[agent_key]
                     with st.expander(f"{agent['icon']} {agent['name']}", expanded=True):
                         st.markdown(response)
                 
+                if any(step["truncated_query"] for step in step_report):
+                    st.warning("⚠️ The query is longer than the prompt token cap; agents only saw its beginning. "
+                               "Raise the cap or shorten the query.")
+                
+                # Prompt size per step (should stay flat as the workflow grows)
+                with st.expander("📏 Prompt Size per Step"):
+                    st.table([
+                        {"Agent": ADVANCED_AGENTS[step["agent"]]["name"],
+                         "Full History (tokens)": step["full_prompt_tokens"],
+                         "Sent (tokens)": step["prompt_tokens"],
+                         "Digested Turns": step["digested_turns"],
+                         "Dropped Turns": step["dropped_turns"],
+                         "Latency (s)": round(step["latency"], 2)}
+                        for step in step_report
+                    ])
+                
                 # Summary
                 st.markdown("---")
                 st.success("✅ Workflow completed! Review each agent's perspective above.")
@@ -243,21 +298,21 @@ elif mode == "Agent Comparison":
     
     if st.button("🔄 Compare Responses", type="primary"):
         if query:
-            client = get_azure_client()
+            client = get_async_azure_client()
             if client:
+                # Both agents answer independently, so run them concurrently
+                with st.spinner("Both agents are thinking..."):
+                    responses = run_async(compare_agents_async(client, [agent1, agent2], query))
+                
                 col1, col2 = st.columns(2)
                 
                 with col1:
                     st.markdown(f"### {ADVANCED_AGENTS[agent1]['icon']} {ADVANCED_AGENTS[agent1]['name']}")
-                    with st.spinner("Thinking..."):
-                        response1 = get_agent_response(client, agent1, [{"role": "user", "content": query}])
-                        st.markdown(response1)
+                    st.markdown(responses[agent1])
                 
                 with col2:
                     st.markdown(f"### {ADVANCED_AGENTS[agent2]['icon']} {ADVANCED_AGENTS[agent2]['name']}")
-                    with st.spinner("Thinking..."):
-                        response2 = get_agent_response(client, agent2, [{"role": "user", "content": query}])
-                        st.markdown(response2)
+                    st.markdown(responses[agent2])
             else:
                 st.error("Please configure Azure AI credentials.")
         else:
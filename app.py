@@ -1,7 +1,14 @@
 import streamlit as st
 import os
 from dotenv import load_dotenv
-from openai import AzureOpenAI, OpenAI
+from llm_client import get_azure_client, get_pool_stats, chat_completion, achat_completion, stream_chat_completion
+from llm_metrics import get_latency_summary
+from llm_rate_limit import get_rate_limit_stats
+from llm_router import get_router_stats
+from llm_cache import get_cache_stats
+from llm_single_flight import get_single_flight_stats
+from llm_hedge import get_hedge_stats
+from semantic_cache import semantic_cache, get_semantic_cache_stats
 
 # Load environment variables
 load_dotenv()
@@ -41,45 +48,65 @@ AGENTS = {
     }
 }
 
-def get_azure_client():
-    """Initialize Azure OpenAI client"""
-    api_key = os.getenv("AZURE_AI_API_KEY")
-    endpoint = os.getenv("AZURE_AI_ENDPOINT")
+def build_agent_messages(agent_key, user_message):
+    """Build the chat messages for an agent"""
+    agent = AGENTS[agent_key]
+    return [
+        {"role": "system", "content": agent["system_prompt"]},
+        {"role": "user", "content": user_message}
+    ]
+
+def get_agent_response(client, agent_key, user_message, stream=False):
+    """Get response from Azure OpenAI agent (stream=True returns an iterable of text deltas)"""
+    deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
+    namespace = f"app.get_agent_response|{deployment_name}|{agent_key}"
     
-    if not endpoint or not api_key:
-        return None
+    # Near-duplicate questions to the same agent reuse a previous answer
+    cached = semantic_cache.lookup(namespace, user_message)
+    if cached:
+        return iter([cached["answer"]]) if stream else cached["answer"]
     
-    # Check if using Cognitive Services endpoint (contains 'cognitiveservices')
-    if 'cognitiveservices' in endpoint:
-        # Use OpenAI client with base_url for Cognitive Services endpoints
-        from openai import OpenAI
-        return OpenAI(
-            base_url=endpoint,
-            api_key=api_key
+    if stream:
+        return stream_chat_completion(
+            client, "app.get_agent_response",
+            tags={"agent": agent_key},
+            on_complete=lambda answer: semantic_cache.store(namespace, user_message, answer),
+            model=deployment_name,
+            messages=build_agent_messages(agent_key, user_message)
         )
-    else:
-        # Use AzureOpenAI client for standard Azure OpenAI endpoints
-        api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
-        return AzureOpenAI(
-            api_key=api_key,
-            api_version=api_version,
-            azure_endpoint=endpoint
+    
+    try:
+        response = chat_completion(
+            client, "app.get_agent_response",
+            tags={"agent": agent_key},
+            model=deployment_name,
+            messages=build_agent_messages(agent_key, user_message)
         )
+        answer = response.choices[0].message.content
+        semantic_cache.store(namespace, user_message, answer)
+        return answer
+    except Exception as e:
+        return f"Error: {str(e)}"
 
-def get_agent_response(client, agent_key, user_message):
-    """Get response from Azure OpenAI agent"""
-    agent = AGENTS[agent_key]
+async def get_agent_response_async(client, agent_key, user_message):
+    """Async variant of get_agent_response (takes the async client)"""
     deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
+    namespace = f"app.get_agent_response|{deployment_name}|{agent_key}"
+    
+    cached = semantic_cache.lookup(namespace, user_message)
+    if cached:
+        return cached["answer"]
     
     try:
-        response = client.chat.completions.create(
+        response = await achat_completion(
+            client, "app.get_agent_response",
+            tags={"agent": agent_key},
             model=deployment_name,
-            messages=[
-                {"role": "system", "content": agent["system_prompt"]},
-                {"role": "user", "content": user_message}
-            ]
+            messages=build_agent_messages(agent_key, user_message)
         )
-        return response.choices[0].message.content
+        answer = response.choices[0].message.content
+        semantic_cache.store(namespace, user_message, answer)
+        return answer
     except Exception as e:
         return f"Error: {str(e)}"
 
@@ -110,11 +137,63 @@ with st.sidebar:
     endpoint = os.getenv("AZURE_AI_ENDPOINT")
     api_key = os.getenv("AZURE_AI_API_KEY")
     
-    if endpoint and api_key:
+    if (endpoint and api_key) or os.getenv("LLM_DEPLOYMENTS"):
         st.success("✅ Azure AI configured")
     else:
         st.warning("⚠️ Configure .env file")
-    
+
+    # Connection pool reuse (shared client across reruns and sessions)
+    with st.expander("🔌 Connection Pool"):
+        pool_stats = get_pool_stats()
+        st.metric("Requests", pool_stats["requests"])
+        st.metric("Reused Connections", f"{pool_stats['reuse_ratio']:.0%}")
+        st.caption(f"New: {pool_stats['new_connections']} | Reused: {pool_stats['reused_connections']}")
+        limit_stats = get_rate_limit_stats()
+        st.caption(f"Throttled (429): {limit_stats['throttled']} | Retries: {limit_stats['retries']}")
+        st.caption(f"Concurrency limit: {limit_stats['concurrency_limit']}/{limit_stats['max_concurrency']}")
+
+    # Latency-aware routing across deployments (only when LLM_DEPLOYMENTS lists them)
+    router_stats = get_router_stats()
+    if router_stats["backends"]:
+        with st.expander("🧭 Deployments"):
+            st.caption(f"Routed: {router_stats['requests']} | Failovers: {router_stats['failovers']}")
+            for backend in router_stats["backends"]:
+                status = "🟢" if backend["healthy"] else f"🔴 ejected {backend['ejected_for']:.0f}s"
+                ewma = f"{backend['ewma_latency']:.2f}s" if backend["ewma_latency"] is not None else "n/a"
+                st.caption(f"{status} {backend['name']}: {backend['successes']}/{backend['requests']} ok, "
+                           f"EWMA {ewma}, in flight {backend['outstanding']}, 429s {backend['throttled']}")
+
+    # Response cache savings
+    with st.expander("🗄️ Response Cache"):
+        cache_stats = get_cache_stats()
+        st.metric("Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+        st.caption(f"Hits: {cache_stats['hits']} | Misses: {cache_stats['misses']}")
+        st.caption(f"Saved: {cache_stats['tokens_saved']:,} tokens, {cache_stats['seconds_saved']:.1f}s")
+        semantic_stats = get_semantic_cache_stats()
+        st.caption(f"Semantic hits: {semantic_stats['hits']} | Misses: {semantic_stats['misses']}")
+        flight_stats = get_single_flight_stats()
+        st.caption(f"Coalesced in-flight requests: {flight_stats['coalesced']} "
+                   f"({flight_stats['coalesce_rate']:.0%})")
+
+    # Perceived latency (time-to-first-token) vs total latency
+    with st.expander("⏱️ Latency"):
+        latency_stats = get_latency_summary().get("app.get_agent_response")
+        if latency_stats and latency_stats["p50_latency"] is not None:
+            if latency_stats["p50_ttft"] is not None:
+                st.metric("Time to First Token (p50)", f"{latency_stats['p50_ttft']:.2f}s")
+            st.caption(f"Total latency p50: {latency_stats['p50_latency']:.2f}s | p95: {latency_stats['p95_latency']:.2f}s")
+            if latency_stats["avg_tokens_per_sec"]:
+                st.caption(f"Throughput: {latency_stats['avg_tokens_per_sec']:.0f} tokens/sec")
+            if latency_stats["prompt_tokens"]:
+                st.caption(f"Prompt prefix cache: {latency_stats['cached_token_ratio']:.0%} of prompt tokens "
+                           f"({latency_stats['prefix_hits']} calls with a hit)")
+        else:
+            st.caption("No calls yet")
+        hedge_stats = get_hedge_stats()
+        if hedge_stats["eligible"]:
+            st.caption(f"Hedged requests (all pages): {hedge_stats['hedged']} "
+                       f"({hedge_stats['hedge_rate']:.0%}), hedge answered first {hedge_stats['hedge_wins']}x")
+
     # Clear chat button
     if st.button("🗑️ Clear Chat History"):
         st.session_state.messages = {}
@@ -148,10 +227,9 @@ if prompt := st.chat_input("Type your message here..."):
     # Display assistant response
     with st.chat_message("assistant"):
         if client:
-            with st.spinner("Thinking..."):
-                response = get_agent_response(client, selected_agent, prompt)
-                st.markdown(response)
-                st.session_state.messages[selected_agent].append({"role": "assistant", "content": response})
+            # Tokens render as they arrive instead of after the full completion
+            response = st.write_stream(get_agent_response(client, selected_agent, prompt, stream=True))
+            st.session_state.messages[selected_agent].append({"role": "assistant", "content": response})
         else:
             error_msg = "⚠️ Please configure your Azure AI credentials in the .env file."
             st.error(error_msg)
@@ -0,0 +1,187 @@
+"""
+Conference Assistant Tools (Demo 1)
+
+Mock weather, venue and travel APIs for the tool-use demo, registered with
+tool_registry.py: their JSON schemas come from the signatures and docstrings
+below, so the schema sent to the model can't drift from the implementation.
+Results are memoized per tool (tool_cache.py) for repeated arguments.
+Batch variants of get_weather and calculate_travel_time cover multi-city and
+multi-leg questions in one call, with a single request to the backend.
+Calls are cancelled after TOOL_TIMEOUT_SECONDS (default 5); the simulated
+latency is TOOL_MOCK_LATENCY_SECONDS (default 0.5).
+
+Importable without Streamlit, so the agent can also run headless.
+"""
+
+import os
+from typing import Any, Dict, List, Literal, TypedDict
+
+from dotenv import load_dotenv
+
+from tool_cache import tool_cache, canonical_date, collapse_whitespace, normalize_text
+from tool_registry import ToolRegistry, cancellable_sleep
+
+load_dotenv()
+
+# Simulated API latency, and how long a call may take before it's cancelled
+MOCK_LATENCY_SECONDS = float(os.getenv("TOOL_MOCK_LATENCY_SECONDS", 0.5))
+
+registry = ToolRegistry(cache=tool_cache, default_timeout=float(os.getenv("TOOL_TIMEOUT_SECONDS", 5)))
+
+
+# Mock backends: one simulated API call per request, however many items it
+# carries (like a bulk endpoint), so batch tools cost one round trip
+WEATHER_DATA = {
+    "Cape Town": {
+        "temperature": "22°C",
+        "condition": "Partly Cloudy",
+        "humidity": "65%",
+        "wind": "15 km/h",
+        "precipitation": "10%",
+        "recommendation": "Perfect weather for outdoor activities!"
+    }
+}
+
+DEFAULT_WEATHER = {
+    "temperature": "20°C",
+    "condition": "Clear",
+    "humidity": "60%",
+    "wind": "10 km/h",
+    "precipitation": "5%"
+}
+
+# Looked up the way tool_cache.py keys arguments ("cape town" and "Cape Town"
+# share a cache entry, so they must get the same forecast)
+_WEATHER_BY_CITY = {normalize_text(city): data for city, data in WEATHER_DATA.items()}
+
+TRAVEL_TIMES = {
+    "driving": "25 minutes",
+    "walking": "1 hour 15 minutes",
+    "public_transport": "35 minutes"
+}
+
+
+def _weather_backend(queries: List[Dict[str, Any]]) -> List[dict]:
+    cancellable_sleep(MOCK_LATENCY_SECONDS)  # Simulate API call (stops early when cancelled)
+    return [dict(_WEATHER_BY_CITY.get(normalize_text(q["city"]), DEFAULT_WEATHER)) for q in queries]
+
+
+def _travel_backend(legs: List[Dict[str, Any]]) -> List[dict]:
+    cancellable_sleep(MOCK_LATENCY_SECONDS)  # Simulate API call (stops early when cancelled)
+    return [
+        {
+            "from": collapse_whitespace(leg["from_location"]),
+            "to": collapse_whitespace(leg["to_location"]),
+            "mode": leg["mode"],
+            "duration": TRAVEL_TIMES.get(leg["mode"], "30 minutes"),
+            "distance": "12 km",
+            "traffic": "Light traffic expected"
+        } for leg in legs
+    ]
+
+
+class WeatherQuery(TypedDict):
+    city: str
+    date: str
+
+
+class _TravelLegRoute(TypedDict):
+    from_location: str
+    to_location: str
+
+
+class TravelLeg(_TravelLegRoute, total=False):
+    mode: Literal["driving", "walking", "public_transport"]
+
+
+# Concurrency limits stand in for the real APIs' rate limits.
+# Result TTLs: forecasts change, venue details don't, traffic somewhere in between.
+# result_fields: what the model is shown (tool_compaction.py), the UI still gets everything
+WEATHER_FIELDS = ["temperature", "condition", "precipitation", "wind", "recommendation"]
+TRAVEL_FIELDS = ["from", "to", "mode", "duration", "traffic"]
+
+
+@registry.tool(max_concurrency=8, cache_ttl=600, normalizers={"date": canonical_date},
+               result_fields=WEATHER_FIELDS)
+def get_weather(city: str, date: str) -> dict:
+    """
+    Get weather forecast for a specific city and date
+
+    Args:
+        city: The city name, e.g. Cape Town
+        date: The date in YYYY-MM-DD format
+    """
+    return _weather_backend([{"city": city, "date": date}])[0]
+
+
+@registry.tool(max_concurrency=4, cache_ttl=24 * 3600,
+               result_fields=["name", "address", "start_time", "end_time", "facilities", "tracks"])
+def get_venue_info(venue_name: str) -> dict:
+    """
+    Get information about a conference venue including address, capacity, and facilities
+
+    Args:
+        venue_name: The name of the venue or conference
+    """
+    cancellable_sleep(MOCK_LATENCY_SECONDS)  # Simulate API call (stops early when cancelled)
+    return {
+        "name": ".NET Conf 2025 Cape Town",
+        "address": "Cape Town Convention Centre, 1 Lower Long St, Cape Town",
+        "capacity": "500 attendees",
+        "facilities": ["WiFi", "Parking", "Catering", "AV Equipment"],
+        "start_time": "09:00 AM",
+        "end_time": "05:00 PM",
+        "sessions": 12,
+        "tracks": ["AI/ML", ".NET Core", "Azure", "DevOps"]
+    }
+
+
+# Locations are echoed back in the result, so only whitespace is normalized for the cache key
+@registry.tool(max_concurrency=8, cache_ttl=900, result_fields=TRAVEL_FIELDS,
+               normalizers={"from_location": collapse_whitespace, "to_location": collapse_whitespace})
+def calculate_travel_time(from_location: str, to_location: str,
+                          mode: Literal["driving", "walking", "public_transport"] = "driving") -> dict:
+    """
+    Calculate travel time between two locations
+
+    Args:
+        from_location: Starting location
+        to_location: Destination location
+        mode: Mode of transportation
+    """
+    return _travel_backend([{"from_location": from_location, "to_location": to_location, "mode": mode}])[0]
+
+
+# Batch variants: one tool call (and one tool message) for a multi-city or
+# multi-leg question. Items share get_weather/calculate_travel_time's cache entries
+@registry.tool(max_concurrency=2, result_fields=["city", "date"] + WEATHER_FIELDS)
+def get_weather_batch(queries: List[WeatherQuery]) -> list:
+    """
+    Get weather forecasts for several city/date pairs in one call
+
+    Args:
+        queries: City/date pairs (date in YYYY-MM-DD format), e.g. every day of a multi-day trip
+    """
+    results = registry.batch("get_weather", queries, _weather_backend)
+    return [dict(query, **result) for query, result in zip(queries, results)]
+
+
+@registry.tool(max_concurrency=2, result_fields=TRAVEL_FIELDS)
+def calculate_travel_time_batch(legs: List[TravelLeg]) -> list:
+    """
+    Calculate travel times for several legs of a trip in one call
+
+    Args:
+        legs: Trip legs, each with from_location, to_location and an optional mode
+            (driving, walking or public_transport; default driving)
+    """
+    return registry.batch("calculate_travel_time", legs, _travel_backend)
+
+
+# Schemas for chat.completions.create(tools=TOOLS), generated once at import
+TOOLS = registry.schemas()
+
+
+def execute_tool(tool_name, arguments):
+    """Execute the appropriate tool based on name"""
+    return registry.execute(tool_name, arguments)
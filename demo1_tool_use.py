@@ -11,11 +11,13 @@ This demo showcases:
 
 import streamlit as st
 import os
-import json
 from dotenv import load_dotenv
-from openai import AzureOpenAI, OpenAI
-from datetime import datetime
-import time
+from llm_client import get_azure_client
+from conference_tools import TOOLS, registry
+from tool_cache import get_tool_cache_stats
+from trajectory_cache import get_trajectory_cache_stats
+from intent_router import get_intent_router_stats
+from tool_agent import run_agent_events
 
 load_dotenv()
 
@@ -25,240 +27,8 @@ st.set_page_config(
     layout="wide"
 )
 
-# Tool definitions (mock implementations for demo)
-TOOLS = [
-    {
-        "type": "function",
-        "function": {
-            "name": "get_weather",
-            "description": "Get weather forecast for a specific city and date",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "city": {
-                        "type": "string",
-                        "description": "The city name, e.g. Cape Town"
-                    },
-                    "date": {
-                        "type": "string",
-                        "description": "The date in YYYY-MM-DD format"
-                    }
-                },
-                "required": ["city", "date"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_venue_info",
-            "description": "Get information about a conference venue including address, capacity, and facilities",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "venue_name": {
-                        "type": "string",
-                        "description": "The name of the venue or conference"
-                    }
-                },
-                "required": ["venue_name"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "calculate_travel_time",
-            "description": "Calculate travel time between two locations",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "from_location": {
-                        "type": "string",
-                        "description": "Starting location"
-                    },
-                    "to_location": {
-                        "type": "string",
-                        "description": "Destination location"
-                    },
-                    "mode": {
-                        "type": "string",
-                        "enum": ["driving", "walking", "public_transport"],
-                        "description": "Mode of transportation"
-                    }
-                },
-                "required": ["from_location", "to_location"]
-            }
-        }
-    }
-]
-
-# Mock tool implementations
-def get_weather(city, date):
-    """Mock weather API - returns realistic data"""
-    time.sleep(0.5)  # Simulate API call
-    weather_data = {
-        "Cape Town": {
-            "temperature": "22°C",
-            "condition": "Partly Cloudy",
-            "humidity": "65%",
-            "wind": "15 km/h",
-            "precipitation": "10%",
-            "recommendation": "Perfect weather for outdoor activities!"
-        }
-    }
-    return weather_data.get(city, {
-        "temperature": "20°C",
-        "condition": "Clear",
-        "humidity": "60%",
-        "wind": "10 km/h",
-        "precipitation": "5%"
-    })
-
-def get_venue_info(venue_name):
-    """Mock venue API - returns conference details"""
-    time.sleep(0.5)  # Simulate API call
-    return {
-        "name": ".NET Conf 2025 Cape Town",
-        "address": "Cape Town Convention Centre, 1 Lower Long St, Cape Town",
-        "capacity": "500 attendees",
-        "facilities": ["WiFi", "Parking", "Catering", "AV Equipment"],
-        "start_time": "09:00 AM",
-        "end_time": "05:00 PM",
-        "sessions": 12,
-        "tracks": ["AI/ML", ".NET Core", "Azure", "DevOps"]
-    }
-
-def calculate_travel_time(from_location, to_location, mode="driving"):
-    """Mock travel time calculator"""
-    time.sleep(0.5)  # Simulate API call
-    times = {
-        "driving": "25 minutes",
-        "walking": "1 hour 15 minutes",
-        "public_transport": "35 minutes"
-    }
-    return {
-        "from": from_location,
-        "to": to_location,
-        "mode": mode,
-        "duration": times.get(mode, "30 minutes"),
-        "distance": "12 km",
-        "traffic": "Light traffic expected"
-    }
-
-def execute_tool(tool_name, arguments):
-    """Execute the appropriate tool based on name"""
-    if tool_name == "get_weather":
-        return get_weather(**arguments)
-    elif tool_name == "get_venue_info":
-        return get_venue_info(**arguments)
-    elif tool_name == "calculate_travel_time":
-        return calculate_travel_time(**arguments)
-    return {"error": "Unknown tool"}
-
-def get_azure_client():
-    """Initialize Azure OpenAI client"""
-    api_key = os.getenv("AZURE_AI_API_KEY")
-    endpoint = os.getenv("AZURE_AI_ENDPOINT")
-    
-    if not endpoint or not api_key:
-        return None
-    
-    if 'cognitiveservices' in endpoint:
-        return OpenAI(base_url=endpoint, api_key=api_key)
-    else:
-        api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
-        return AzureOpenAI(api_key=api_key, api_version=api_version, azure_endpoint=endpoint)
-
-def run_agent_with_tools(client, user_message):
-    """Run agent with tool calling capability"""
-    deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
-    
-    messages = [
-        {
-            "role": "system",
-            "content": """You are a helpful conference assistant. You help attendees prepare for conferences.
-            When asked about conference preparation, use the available tools to gather information about:
-            - Weather conditions
-            - Venue details
-            - Travel times
-            Then provide comprehensive, personalized advice based on the tool results."""
-        },
-        {"role": "user", "content": user_message}
-    ]
-    
-    tool_calls_made = []
-    iterations = 0
-    max_iterations = 5
-    
-    while iterations < max_iterations:
-        iterations += 1
-        
-        # Call the model
-        response = client.chat.completions.create(
-            model=deployment_name,
-            messages=messages,
-            tools=TOOLS,
-            tool_choice="auto"
-        )
-        
-        assistant_message = response.choices[0].message
-        
-        # Check if the model wants to call tools
-        if assistant_message.tool_calls:
-            # Add assistant message to conversation
-            messages.append({
-                "role": "assistant",
-                "content": assistant_message.content,
-                "tool_calls": [
-                    {
-                        "id": tc.id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.function.name,
-                            "arguments": tc.function.arguments
-                        }
-                    } for tc in assistant_message.tool_calls
-                ]
-            })
-            
-            # Execute each tool call
-            for tool_call in assistant_message.tool_calls:
-                function_name = tool_call.function.name
-                function_args = json.loads(tool_call.function.arguments)
-                
-                # Track tool call for display
-                tool_calls_made.append({
-                    "name": function_name,
-                    "arguments": function_args,
-                    "status": "executing"
-                })
-                
-                # Execute the tool
-                function_response = execute_tool(function_name, function_args)
-                
-                # Update status
-                tool_calls_made[-1]["status"] = "completed"
-                tool_calls_made[-1]["result"] = function_response
-                
-                # Add tool response to conversation
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "name": function_name,
-                    "content": json.dumps(function_response)
-                })
-        else:
-            # No more tool calls, return final response
-            return {
-                "response": assistant_message.content,
-                "tool_calls": tool_calls_made
-            }
-    
-    return {
-        "response": "Maximum iterations reached",
-        "tool_calls": tool_calls_made
-    }
+# Tools (mock implementations for demo) are registered in conference_tools.py;
+# the agent loop lives in tool_agent.py and reports each step as an event
 
 # Sidebar
 with st.sidebar:
@@ -283,6 +53,27 @@ with st.sidebar:
         with st.expander(f"📌 {func['name']}"):
             st.write(f"**Description:** {func['description']}")
             st.write(f"**Parameters:** {', '.join(func['parameters']['properties'].keys())}")
+            limit = registry.get(func["name"]).max_concurrency
+            tool_stats = registry.stats()[func["name"]]
+            st.caption(f"Max concurrent calls: {limit or 'unlimited'} | Calls so far: {tool_stats['calls']} | "
+                       f"Timeouts: {tool_stats['timeouts']}")
+    
+    # Tool results reused for repeated arguments
+    tool_cache_stats = get_tool_cache_stats()
+    st.caption(f"🗄️ Tool cache: {tool_cache_stats['hits']} hits / {tool_cache_stats['misses']} misses "
+               f"({tool_cache_stats['hit_rate']:.0%}), {tool_cache_stats['seconds_saved']:.1f}s saved")
+    
+    # Repeated questions replay their tool plan and skip the planning model call
+    trajectory_stats = get_trajectory_cache_stats()
+    st.caption(f"♻️ Trajectory cache: {trajectory_stats['hits']} hits / {trajectory_stats['misses']} misses "
+               f"({trajectory_stats['hit_rate']:.0%}), {trajectory_stats['model_calls_saved']} model call(s) "
+               f"and {trajectory_stats['seconds_saved']:.1f}s saved")
+    
+    # Confident predictions of the tool calls skip the model's planning call
+    router_stats = get_intent_router_stats()
+    st.caption(f"🧭 Intent router: {router_stats['routed']} routed ({router_stats['route_rate']:.0%}), "
+               f"{sum(router_stats['fallbacks'].values())} left to the model, {router_stats['corrections']} corrected, "
+               f"{router_stats['training_examples']} training examples (routes from {router_stats['min_examples']})")
     
     st.markdown("---")
     
@@ -337,30 +128,100 @@ if st.button("🚀 Run Agent", type="primary", use_container_width=True):
         client = get_azure_client()
         
         if client:
-            with st.spinner("🤖 Agent is thinking and calling tools..."):
-                result = run_agent_with_tools(client, user_input)
+            status_text = st.empty()
+            st.markdown("### 🔄 Tool Execution Log")
+            log = st.container()
+            tool_slots = {}
+            call_number = 0
+            result = None
             
-            # Display tool calls
-            if result["tool_calls"]:
-                st.markdown("### 🔄 Tool Execution Log")
-                
-                for idx, tool_call in enumerate(result["tool_calls"], 1):
-                    with st.expander(f"🔧 Tool Call {idx}: `{tool_call['name']}`", expanded=True):
+            def render_tool_call(slot, number, event, finished):
+                """Draw one tool call; redrawn in place when it finishes"""
+                with slot.container():
+                    if finished and event.get("timed_out"):
+                        timing = f"⏱️ timed out after {event['seconds']:.1f}s"
+                    elif finished:
+                        timing = "⚡ cached" if event["cached"] else f"{event['seconds']:.2f}s"
+                    else:
+                        timing = "running"
+                    with st.expander(f"🔧 Tool Call {number}: `{event['name']}` ({timing}, turn {event['iteration']})", expanded=True):
                         col1, col2 = st.columns([1, 2])
                         
                         with col1:
                             st.markdown("**Arguments:**")
-                            st.json(tool_call["arguments"])
+                            st.json(event["arguments"])
                             
-                            if tool_call["status"] == "completed":
+                            if finished and event.get("timed_out"):
+                                st.warning("⏱️ Timed out: the model was told, with any partial data")
+                            elif finished and event["cached"]:
+                                st.success("✅ Completed (served from tool cache)")
+                            elif finished:
                                 st.success("✅ Completed")
                             else:
                                 st.info("⏳ Executing...")
                         
                         with col2:
-                            if tool_call["status"] == "completed":
+                            if finished:
                                 st.markdown("**Result:**")
-                                st.json(tool_call["result"])
+                                st.json(event["result"])
+            
+            # Render each step as it happens instead of after the whole run
+            for event in run_agent_events(client, user_input):
+                if event["type"] == "trajectory_hit":
+                    status_text.info(f"♻️ Seen this question before: replaying {event['tool_turns']} tool turn(s) without asking the model")
+                
+                elif event["type"] == "intent_routed":
+                    status_text.info(f"🧭 Intent router picked {', '.join(event['tools'])} "
+                                     f"({event['confidence']:.0%} confident) without asking the model")
+                
+                elif event["type"] == "model_call_start":
+                    status_text.info(f"🤖 Turn {event['iteration']}: model is deciding what to do... ({event['elapsed']:.1f}s)")
+                
+                elif event["type"] == "model_call_complete":
+                    if event["tool_calls"]:
+                        status_text.info(f"🔧 Turn {event['iteration']}: running {event['tool_calls']} tool(s)... ({event['elapsed']:.1f}s)")
+                    else:
+                        status_text.info(f"✍️ Turn {event['iteration']}: final answer ready ({event['elapsed']:.1f}s)")
+                
+                elif event["type"] == "tool_start":
+                    call_number += 1
+                    with log:
+                        slot = st.empty()
+                    tool_slots[(event["iteration"], event["index"])] = (slot, call_number)
+                    render_tool_call(slot, call_number, event, finished=False)
+                
+                elif event["type"] == "tool_finish":
+                    slot, number = tool_slots[(event["iteration"], event["index"])]
+                    render_tool_call(slot, number, event, finished=True)
+                
+                elif event["type"] == "turn_complete":
+                    with log:
+                        planning = {
+                            "trajectory_cache": "replayed from trajectory cache",
+                            "intent_router": "tools picked by local intent router"
+                        }.get(event["planned_by"], f"model {event['model_seconds']:.2f}s")
+                        st.caption(
+                            f"Turn {event['iteration']}: {planning}, "
+                            f"{event['tool_calls']} tool(s) in {event['tool_seconds']:.2f}s "
+                            f"({event['sequential_tool_seconds']:.2f}s if run one by one)"
+                            + (f", {event['timed_out']} timed out" if event["timed_out"] else "")
+                        )
+                
+                elif event["type"] == "final_answer":
+                    result = event
+                    status_text.success(f"🎉 Done in {event['elapsed']:.2f}s "
+                                        f"({len(event['tool_calls'])} tool call(s), {len(event['turns'])} turn(s))")
+            
+            if not result["tool_calls"]:
+                with log:
+                    st.caption("No tools were needed for this question")
+            
+            compaction = result["compaction"]
+            if compaction["saved_tokens"]:
+                with log:
+                    st.caption(f"🗜️ Tool results sent to the model compacted: {compaction['raw_prompt_tokens']} → "
+                               f"{compaction['sent_prompt_tokens']} prompt tokens over the run "
+                               f"({compaction['saved_ratio']:.0%} saved, {compaction['summarized_results']} summarized)")
             
             # Display final response
             st.markdown("---")
@@ -13,7 +13,9 @@ import streamlit as st
 import os
 import json
 from dotenv import load_dotenv
-from openai import AzureOpenAI, OpenAI
+from llm_client import get_azure_client, chat_completion, achat_completion, stream_chat_completion
+from semantic_cache import semantic_cache, corpus_fingerprint, get_semantic_cache_stats
+from prompt_layout import assemble_messages
 import re
 from typing import List, Dict
 
@@ -265,6 +267,9 @@ streamlit run app.py
     }
 }
 
+# Drop cached answers whenever the knowledge base content changes
+semantic_cache.sync_corpus("demo2", corpus_fingerprint(KNOWLEDGE_BASE))
+
 def simple_search(query: str, top_k: int = 2) -> List[Dict]:
     """
     Simple keyword-based search (in production, use vector embeddings)
@@ -293,31 +298,7 @@ def simple_search(query: str, top_k: int = 2) -> List[Dict]:
     results.sort(key=lambda x: x['score'], reverse=True)
     return results[:top_k]
 
-def get_azure_client():
-    """Initialize Azure OpenAI client"""
-    api_key = os.getenv("AZURE_AI_API_KEY")
-    endpoint = os.getenv("AZURE_AI_ENDPOINT")
-    
-    if not endpoint or not api_key:
-        return None
-    
-    if 'cognitiveservices' in endpoint:
-        return OpenAI(base_url=endpoint, api_key=api_key)
-    else:
-        api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
-        return AzureOpenAI(api_key=api_key, api_version=api_version, azure_endpoint=endpoint)
-
-def answer_with_rag(client, question: str, retrieved_docs: List[Dict]) -> str:
-    """Generate answer using retrieved context"""
-    deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
-    
-    # Build context from retrieved documents
-    context = "\n\n---\n\n".join([
-        f"Document: {doc['title']}\n{doc['content']}"
-        for doc in retrieved_docs
-    ])
-    
-    system_prompt = """You are a helpful assistant that answers questions based on the provided context.
+RAG_SYSTEM_PROMPT = """You are a helpful assistant that answers questions based on the provided context.
 
 Rules:
 1. Only use information from the provided context
@@ -326,27 +307,84 @@ Rules:
 4. Be concise but complete
 5. If asked about something not in the context, acknowledge the limitation"""
 
-    user_prompt = f"""Context from knowledge base:
-
-{context}
-
----
+def build_rag_messages(question: str, retrieved_docs: List[Dict]) -> List[Dict]:
+    """Build the chat messages with retrieved documents injected as context"""
+    # Documents in a fixed (doc id) order before the question, so questions that
+    # retrieve the same documents share the prompt prefix
+    context = "\n\n---\n\n".join([
+        f"Document: {doc['title']}\n{doc['content']}"
+        for doc in sorted(retrieved_docs, key=lambda d: d['doc_id'])
+    ])
+    
+    return assemble_messages(
+        RAG_SYSTEM_PROMPT,
+        [("Context from knowledge base", context)],
+        f"""---
 
 Question: {question}
 
 Please answer based on the context above."""
+    )
 
+def rag_cache_namespace(deployment_name: str, retrieved_docs: List[Dict]) -> str:
+    """Semantic cache namespace: answers are only reused for the same retrieved documents"""
+    doc_ids = ",".join(doc['doc_id'] for doc in retrieved_docs)
+    return f"demo2.answer_with_rag|{deployment_name}|{doc_ids}"
+
+def answer_with_rag(client, question: str, retrieved_docs: List[Dict], stream: bool = False):
+    """Generate answer using retrieved context (stream=True returns an iterable of text deltas)"""
+    deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
+    namespace = rag_cache_namespace(deployment_name, retrieved_docs)
+    
+    # Rephrased questions over the same documents reuse a previous answer
+    cached = semantic_cache.lookup(namespace, question)
+    if cached:
+        return iter([cached["answer"]]) if stream else cached["answer"]
+    
+    if stream:
+        return stream_chat_completion(
+            client, "demo2.answer_with_rag",
+            on_complete=lambda answer: semantic_cache.store(namespace, question, answer),
+            error_message="Error generating response: {error}",
+            model=deployment_name,
+            messages=build_rag_messages(question, retrieved_docs),
+            temperature=0.3
+        )
+    
     try:
-        response = client.chat.completions.create(
+        response = chat_completion(
+            client, "demo2.answer_with_rag",
             model=deployment_name,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+            messages=build_rag_messages(question, retrieved_docs),
             temperature=0.3  # Lower temperature for more factual responses
         )
         
-        return response.choices[0].message.content
+        answer = response.choices[0].message.content
+        semantic_cache.store(namespace, question, answer)
+        return answer
+    except Exception as e:
+        return f"Error generating response: {str(e)}"
+
+async def answer_with_rag_async(client, question: str, retrieved_docs: List[Dict]) -> str:
+    """Async variant of answer_with_rag (takes the async client)"""
+    deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
+    namespace = rag_cache_namespace(deployment_name, retrieved_docs)
+    
+    cached = semantic_cache.lookup(namespace, question)
+    if cached:
+        return cached["answer"]
+    
+    try:
+        response = await achat_completion(
+            client, "demo2.answer_with_rag",
+            model=deployment_name,
+            messages=build_rag_messages(question, retrieved_docs),
+            temperature=0.3
+        )
+        
+        answer = response.choices[0].message.content
+        semantic_cache.store(namespace, question, answer)
+        return answer
     except Exception as e:
         return f"Error generating response: {str(e)}"
 
@@ -374,6 +412,12 @@ with st.sidebar:
             st.caption(f"ID: {doc_id}")
             st.caption(f"Length: {len(doc['content'])} chars")
     
+    semantic_stats = get_semantic_cache_stats()
+    st.caption(
+        f"⚡ Semantic cache: {semantic_stats['hits']} hits / {semantic_stats['misses']} misses "
+        f"({semantic_stats['entries']} answers cached)"
+    )
+    
     st.markdown("---")
     
     st.markdown("### 🔍 How RAG Works")
@@ -470,12 +514,12 @@ if st.button("🔍 Ask Question", type="primary", use_container_width=True):
                 st.markdown("---")
                 st.markdown("## 💬 Step 2: Answer Generation")
                 
-                with st.spinner("Generating answer from context..."):
-                    answer = answer_with_rag(client, user_question, retrieved_docs)
-                
-                # Show answer
+                # Show answer (streamed as it is generated)
                 st.markdown("### 🎯 Answer")
-                st.success(answer)
+                answer_placeholder = st.empty()
+                with answer_placeholder.container():
+                    answer = st.write_stream(answer_with_rag(client, user_question, retrieved_docs, stream=True))
+                answer_placeholder.success(answer)
                 
                 # Show sources
                 st.markdown("---")
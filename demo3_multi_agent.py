@@ -12,8 +12,11 @@ This demo showcases:
 import streamlit as st
 import os
 import json
+import asyncio
 from dotenv import load_dotenv
-from openai import AzureOpenAI, OpenAI
+from llm_client import get_azure_client, get_async_azure_client, run_async, chat_completion, achat_completion, stream_chat_completion
+from llm_usage import usage_ledger, usage_run
+from prompt_layout import assemble_messages
 import time
 from datetime import datetime
 
@@ -89,58 +92,73 @@ Keep your review balanced (2-3 strengths, 2-3 improvements)."""
     }
 }
 
-def get_azure_client():
-    """Initialize Azure OpenAI client"""
-    api_key = os.getenv("AZURE_AI_API_KEY")
-    endpoint = os.getenv("AZURE_AI_ENDPOINT")
-    
-    if not endpoint or not api_key:
-        return None
+def build_agent_messages(agent_key, context, previous_outputs=None):
+    """Build the prompt with context from previous agents (static first, so prompt prefixes cache)"""
+    agent = AGENTS[agent_key]
     
-    if 'cognitiveservices' in endpoint:
-        return OpenAI(base_url=endpoint, api_key=api_key)
+    # The request and earlier outputs are shared by every later agent in the run;
+    # the agent-specific ask goes last
+    stable_context = [("Request", context)]
+    if previous_outputs:
+        stable_context += [
+            (f"Context from {AGENTS[k]['name']}", v)
+            for k, v in previous_outputs.items()
+        ]
+        request = f"Now, as the {agent['name']}, provide your contribution for the request above."
     else:
-        api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
-        return AzureOpenAI(api_key=api_key, api_version=api_version, azure_endpoint=endpoint)
+        request = f"As the {agent['name']}, analyze the request above."
+    
+    return assemble_messages(agent["system_prompt"], stable_context, request)
 
-def call_agent(client, agent_key, context, previous_outputs=None):
-    """Call a specific agent with context"""
-    agent = AGENTS[agent_key]
+def call_agent(client, agent_key, context, previous_outputs=None, stream=False):
+    """Call a specific agent with context (stream=True returns a CompletionStream)"""
     deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
     
-    # Build the prompt with context from previous agents
-    messages = [{"role": "system", "content": agent["system_prompt"]}]
+    if stream:
+        return stream_chat_completion(
+            client, "demo3.call_agent",
+            tags={"agent": agent_key},
+            model=deployment_name,
+            messages=build_agent_messages(agent_key, context, previous_outputs),
+            temperature=0.7
+        )
     
-    # Add previous agent outputs as context
-    if previous_outputs:
-        context_summary = "\n\n".join([
-            f"**{AGENTS[k]['name']}:**\n{v}" 
-            for k, v in previous_outputs.items()
-        ])
-        messages.append({
-            "role": "user",
-            "content": f"""Based on the following context from other team members:
-
-{context_summary}
+    try:
+        response = chat_completion(
+            client, "demo3.call_agent",
+            tags={"agent": agent_key},
+            model=deployment_name,
+            messages=build_agent_messages(agent_key, context, previous_outputs),
+            temperature=0.7
+        )
+        return response.choices[0].message.content
+    except Exception as e:
+        return f"Error: {str(e)}"
 
-Now, as the {agent['name']}, provide your contribution for: {context}"""
-        })
-    else:
-        messages.append({
-            "role": "user",
-            "content": f"As the {agent['name']}, analyze this: {context}"
-        })
+async def call_agent_async(client, agent_key, context, previous_outputs=None):
+    """Async variant of call_agent (takes the async client)"""
+    deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
     
     try:
-        response = client.chat.completions.create(
+        response = await achat_completion(
+            client, "demo3.call_agent",
+            tags={"agent": agent_key},
             model=deployment_name,
-            messages=messages,
+            messages=build_agent_messages(agent_key, context, previous_outputs),
             temperature=0.7
         )
         return response.choices[0].message.content
     except Exception as e:
         return f"Error: {str(e)}"
 
+async def run_agents_concurrently(client, agent_keys, context):
+    """Run independent agents at the same time and collect their outputs"""
+    results = await asyncio.gather(*[
+        call_agent_async(client, agent_key, context, None)
+        for agent_key in agent_keys
+    ])
+    return dict(zip(agent_keys, results))
+
 def run_sequential_workflow(client, user_input, workflow_type="sequential"):
     """Run agents in sequence, each building on previous outputs"""
     
@@ -164,8 +182,16 @@ def run_sequential_workflow(client, user_input, workflow_type="sequential"):
             # Simulate thinking time for demo effect
             time.sleep(0.5)
             
-            # Call the agent
-            result = call_agent(client, agent_key, user_input, workflow_results)
+            # Call the agent, streaming its output to the UI as it is generated
+            stream = call_agent(client, agent_key, user_input, workflow_results, stream=True)
+            yield {
+                "type": "agent_stream",
+                "agent": agent_key,
+                "agent_name": agent["name"],
+                "icon": agent["icon"],
+                "stream": stream
+            }
+            result = stream.read()
             workflow_results[agent_key] = result
             
             # Return result
@@ -183,7 +209,7 @@ def run_sequential_workflow(client, user_input, workflow_type="sequential"):
         parallel_agents = ["researcher", "strategist", "writer"]
         workflow_results = {}
         
-        # Phase 1: Parallel execution (simulated)
+        # Phase 1: Parallel execution
         for agent_key in parallel_agents:
             agent = AGENTS[agent_key]
             
@@ -195,12 +221,14 @@ def run_sequential_workflow(client, user_input, workflow_type="sequential"):
                 "status": "thinking"
             }
         
-        time.sleep(0.5)
+        # Execute all parallel agents concurrently on the async client
+        parallel_results = run_async(
+            run_agents_concurrently(get_async_azure_client(), parallel_agents, user_input)
+        )
         
-        # Execute all parallel agents
         for agent_key in parallel_agents:
             agent = AGENTS[agent_key]
-            result = call_agent(client, agent_key, user_input, None)
+            result = parallel_results[agent_key]
             workflow_results[agent_key] = result
             
             yield {
@@ -223,7 +251,15 @@ def run_sequential_workflow(client, user_input, workflow_type="sequential"):
         
         time.sleep(0.5)
         
-        result = call_agent(client, "reviewer", user_input, workflow_results)
+        stream = call_agent(client, "reviewer", user_input, workflow_results, stream=True)
+        yield {
+            "type": "agent_stream",
+            "agent": "reviewer",
+            "agent_name": AGENTS["reviewer"]["name"],
+            "icon": AGENTS["reviewer"]["icon"],
+            "stream": stream
+        }
+        result = stream.read()
         workflow_results["reviewer"] = result
         
         yield {
@@ -340,34 +376,42 @@ if st.button("🚀 Run Multi-Agent Workflow", type="primary", use_container_widt
             completed_agents = 0
             
             results = {}
-            
-            for event in run_sequential_workflow(client, user_input, workflow_type):
-                if event["type"] == "agent_start":
-                    agent_key = event["agent"]
-                    status_text.info(f"🤔 {event['icon']} {event['agent_name']} is thinking...")
+            with usage_run("demo3") as run_id:
+                for event in run_sequential_workflow(client, user_input, workflow_type):
+                    if event["type"] == "agent_start":
+                        agent_key = event["agent"]
+                        status_text.info(f"🤔 {event['icon']} {event['agent_name']} is thinking...")
                     
-                    with agent_containers[agent_key].container():
-                        st.markdown(f"### {event['icon']} {event['agent_name']}")
-                        st.info("⏳ Processing...")
+                        with agent_containers[agent_key].container():
+                            st.markdown(f"### {event['icon']} {event['agent_name']}")
+                            st.info("⏳ Processing...")
                 
-                elif event["type"] == "agent_complete":
-                    agent_key = event["agent"]
-                    completed_agents += 1
-                    progress_bar.progress(completed_agents / total_agents)
+                    elif event["type"] == "agent_stream":
+                        agent_key = event["agent"]
+                        status_text.info(f"✍️ {event['icon']} {event['agent_name']} is writing...")
                     
-                    results[agent_key] = event["result"]
+                        with agent_containers[agent_key].container():
+                            st.markdown(f"### {event['icon']} {event['agent_name']}")
+                            st.write_stream(event["stream"])
+                
+                    elif event["type"] == "agent_complete":
+                        agent_key = event["agent"]
+                        completed_agents += 1
+                        progress_bar.progress(completed_agents / total_agents)
                     
-                    with agent_containers[agent_key].container():
-                        st.markdown(f"### {event['icon']} {event['agent_name']}")
+                        results[agent_key] = event["result"]
+                    
+                        with agent_containers[agent_key].container():
+                            st.markdown(f"### {event['icon']} {event['agent_name']}")
                         
-                        with st.expander("📄 View Output", expanded=True):
-                            st.markdown(event["result"])
+                            with st.expander("📄 View Output", expanded=True):
+                                st.markdown(event["result"])
                         
-                        st.success("✅ Completed")
+                            st.success("✅ Completed")
                 
-                elif event["type"] == "workflow_complete":
-                    status_text.success("🎉 All agents completed!")
-                    progress_bar.progress(1.0)
+                    elif event["type"] == "workflow_complete":
+                        status_text.success("🎉 All agents completed!")
+                        progress_bar.progress(1.0)
             
             # Final summary
             st.markdown("---")
@@ -391,6 +435,16 @@ if st.button("🚀 Run Multi-Agent Workflow", type="primary", use_container_widt
                 mime="application/json"
             )
             
+            # Token usage for this run, per agent
+            run_usage = usage_ledger.run(run_id)
+            with st.expander(f"🧾 Token Usage: {run_usage['total_tokens']:,} tokens (~${run_usage['cost']:.4f})"):
+                st.table([
+                    {"Agent": AGENTS[agent_key]["name"] if agent_key in AGENTS else "-", "Calls": totals["calls"],
+                     "Prompt": totals["prompt_tokens"], "Completion": totals["completion_tokens"],
+                     "Cached": totals["cached_tokens"], "Cost ($)": round(totals["cost"], 4)}
+                    for agent_key, totals in usage_ledger.summarize("agent", run_id=run_id).items()
+                ])
+            
         else:
             st.error("⚠️ Please configure Azure AI credentials in .env file")
     else:
@@ -13,7 +13,11 @@ import streamlit as st
 import os
 import json
 from dotenv import load_dotenv
-from openai import AzureOpenAI, OpenAI
+from llm_client import get_azure_client, chat_completion, achat_completion, stream_chat_completion
+from llm_usage import usage_ledger, usage_run
+from planning_prompts import (
+    build_plan_messages, build_step_messages, build_reflection_messages, plan_error
+)
 import time
 from datetime import datetime
 
@@ -25,54 +29,16 @@ st.set_page_config(
     layout="wide"
 )
 
-def get_azure_client():
-    """Initialize Azure OpenAI client"""
-    api_key = os.getenv("AZURE_AI_API_KEY")
-    endpoint = os.getenv("AZURE_AI_ENDPOINT")
-    
-    if not endpoint or not api_key:
-        return None
-    
-    if 'cognitiveservices' in endpoint:
-        return OpenAI(base_url=endpoint, api_key=api_key)
-    else:
-        api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
-        return AzureOpenAI(api_key=api_key, api_version=api_version, azure_endpoint=endpoint)
-
 def create_plan(client, task):
     """Create a step-by-step plan for the given task"""
     deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
     
-    system_prompt = """You are an expert task planner. Your job is to break down complex tasks into clear, actionable steps.
-
-For each task, create a plan with:
-1. A brief analysis of the task
-2. 4-6 specific, actionable steps
-3. Expected outcome for each step
-
-Format your response as JSON:
-{
-    "analysis": "Brief analysis of the task",
-    "steps": [
-        {
-            "step_number": 1,
-            "title": "Step title",
-            "description": "What to do",
-            "expected_outcome": "What should result"
-        }
-    ],
-    "success_criteria": "How to know if the task is complete"
-}
-
-Be specific and practical. Each step should be clear enough to execute."""
-
     try:
-        response = client.chat.completions.create(
+        response = chat_completion(
+            client, "demo4.create_plan",
+            tags={"agent": "planner"},
             model=deployment_name,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Create a detailed execution plan for this task: {task}"}
-            ],
+            messages=build_plan_messages(task),
             temperature=0.7,
             response_format={"type": "json_object"}
         )
@@ -80,49 +46,63 @@ Be specific and practical. Each step should be clear enough to execute."""
         plan_json = response.choices[0].message.content
         return json.loads(plan_json)
     except Exception as e:
-        return {
-            "error": str(e),
-            "analysis": "Failed to create plan",
-            "steps": [],
-            "success_criteria": "N/A"
-        }
+        return plan_error(e)
 
-def execute_step(client, step, task_context, previous_results):
-    """Execute a single step of the plan"""
+async def create_plan_async(client, task):
+    """Async variant of create_plan (takes the async client)"""
     deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
     
-    system_prompt = """You are an expert executor. You receive a step from a plan and execute it thoughtfully.
-
-For each step:
-1. Consider the context and previous results
-2. Execute the step thoroughly
-3. Provide concrete, actionable output
-4. Note any challenges or insights
-
-Keep your response focused and practical (2-3 paragraphs max)."""
-
-    context_summary = ""
-    if previous_results:
-        context_summary = "\n\nPrevious steps completed:\n" + "\n".join([
-            f"Step {r['step_number']}: {r['result'][:100]}..." 
-            for r in previous_results
-        ])
+    try:
+        response = await achat_completion(
+            client, "demo4.create_plan",
+            tags={"agent": "planner"},
+            model=deployment_name,
+            messages=build_plan_messages(task),
+            temperature=0.7,
+            response_format={"type": "json_object"}
+        )
+        
+        return json.loads(response.choices[0].message.content)
+    except Exception as e:
+        return plan_error(e)
 
+def execute_step(client, step, task_context, previous_results, stream=False):
+    """Execute a single step of the plan (stream=True returns a CompletionStream)"""
+    deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
+    
+    if stream:
+        return stream_chat_completion(
+            client, "demo4.execute_step",
+            tags={"agent": "executor", "step": step["step_number"]},
+            error_message="Error executing step: {error}",
+            model=deployment_name,
+            messages=build_step_messages(step, task_context, previous_results),
+            temperature=0.7
+        )
+    
     try:
-        response = client.chat.completions.create(
+        response = chat_completion(
+            client, "demo4.execute_step",
+            tags={"agent": "executor", "step": step["step_number"]},
             model=deployment_name,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"""Task Context: {task_context}
-                
-Current Step:
-- Title: {step['title']}
-- Description: {step['description']}
-- Expected Outcome: {step['expected_outcome']}
-{context_summary}
+            messages=build_step_messages(step, task_context, previous_results),
+            temperature=0.7
+        )
+        
+        return response.choices[0].message.content
+    except Exception as e:
+        return f"Error executing step: {str(e)}"
 
-Execute this step and provide the results."""}
-            ],
+async def execute_step_async(client, step, task_context, previous_results):
+    """Async variant of execute_step (takes the async client)"""
+    deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
+    
+    try:
+        response = await achat_completion(
+            client, "demo4.execute_step",
+            tags={"agent": "executor", "step": step["step_number"]},
+            model=deployment_name,
+            messages=build_step_messages(step, task_context, previous_results),
             temperature=0.7
         )
         
@@ -134,33 +114,29 @@ def reflect_on_execution(client, task, plan, results):
     """Reflect on the execution and provide insights"""
     deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
     
-    system_prompt = """You are a reflective analyst. Review the task execution and provide insights.
-
-Analyze:
-1. What went well
-2. What could be improved
-3. Key learnings
-4. Next steps or recommendations
-
-Be concise (3-4 key points total)."""
-
-    results_summary = "\n".join([
-        f"Step {r['step_number']} ({r['title']}): {r['result'][:150]}..."
-        for r in results
-    ])
-
     try:
-        response = client.chat.completions.create(
+        response = chat_completion(
+            client, "demo4.reflect_on_execution",
+            tags={"agent": "reflector"},
             model=deployment_name,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"""Original Task: {task}
-
-Execution Results:
-{results_summary}
+            messages=build_reflection_messages(task, plan, results),
+            temperature=0.7
+        )
+        
+        return response.choices[0].message.content
+    except Exception as e:
+        return f"Error in reflection: {str(e)}"
 
-Provide your reflection and insights."""}
-            ],
+async def reflect_on_execution_async(client, task, plan, results):
+    """Async variant of reflect_on_execution (takes the async client)"""
+    deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
+    
+    try:
+        response = await achat_completion(
+            client, "demo4.reflect_on_execution",
+            tags={"agent": "reflector"},
+            model=deployment_name,
+            messages=build_reflection_messages(task, plan, results),
             temperature=0.7
         )
         
@@ -205,6 +181,18 @@ with st.sidebar:
     
     st.markdown("---")
     
+    # Per-run token budget (enforced before every LLM call)
+    st.markdown("### 💰 Token Budget")
+    token_budget = st.number_input(
+        "Max tokens per run (0 = unlimited)",
+        min_value=0,
+        value=0,
+        step=1000,
+        help="Step execution stops and reflection is skipped once the run has used this many tokens"
+    )
+    
+    st.markdown("---")
+    
     # Configuration status
     endpoint = os.getenv("AZURE_AI_ENDPOINT")
     api_key = os.getenv("AZURE_AI_API_KEY")
@@ -271,123 +259,146 @@ if run_button and user_task:
     
     if client:
         st.markdown("---")
+        with usage_run("demo4", token_budget=token_budget or None) as run_id:
+            # Phase 1: Planning
+            st.markdown("## 📝 Phase 1: Planning")
+            with st.spinner("🤔 Analyzing task and creating plan..."):
+                plan = create_plan(client, user_task)
+                time.sleep(0.5)  # Demo effect
         
-        # Phase 1: Planning
-        st.markdown("## 📝 Phase 1: Planning")
-        with st.spinner("🤔 Analyzing task and creating plan..."):
-            plan = create_plan(client, user_task)
-            time.sleep(0.5)  # Demo effect
-        
-        if "error" not in plan:
-            # Show analysis
-            st.markdown("### 🔍 Task Analysis")
-            st.info(plan.get("analysis", "No analysis available"))
+            if "error" not in plan:
+                # Show analysis
+                st.markdown("### 🔍 Task Analysis")
+                st.info(plan.get("analysis", "No analysis available"))
             
-            # Show plan
-            st.markdown("### 📋 Execution Plan")
+                # Show plan
+                st.markdown("### 📋 Execution Plan")
             
-            steps_data = []
-            for step in plan.get("steps", []):
-                steps_data.append({
-                    "Step": f"#{step['step_number']}",
-                    "Title": step['title'],
-                    "Description": step['description'][:60] + "..." if len(step['description']) > 60 else step['description']
-                })
+                steps_data = []
+                for step in plan.get("steps", []):
+                    steps_data.append({
+                        "Step": f"#{step['step_number']}",
+                        "Title": step['title'],
+                        "Description": step['description'][:60] + "..." if len(step['description']) > 60 else step['description']
+                    })
             
-            if steps_data:
-                st.table(steps_data)
+                if steps_data:
+                    st.table(steps_data)
             
-            # Show success criteria
-            with st.expander("🎯 Success Criteria", expanded=False):
-                st.write(plan.get("success_criteria", "N/A"))
+                # Show success criteria
+                with st.expander("🎯 Success Criteria", expanded=False):
+                    st.write(plan.get("success_criteria", "N/A"))
             
-            # Phase 2: Execution
-            if execute_mode in ["Plan + Execute", "Plan + Execute + Reflect"]:
-                st.markdown("---")
-                st.markdown("## ⚙️ Phase 2: Execution")
+                # Phase 2: Execution
+                if execute_mode in ["Plan + Execute", "Plan + Execute + Reflect"]:
+                    st.markdown("---")
+                    st.markdown("## ⚙️ Phase 2: Execution")
                 
-                progress_bar = st.progress(0)
-                status_text = st.empty()
+                    progress_bar = st.progress(0)
+                    status_text = st.empty()
                 
-                execution_results = []
-                total_steps = len(plan.get("steps", []))
+                    execution_results = []
+                    total_steps = len(plan.get("steps", []))
                 
-                for idx, step in enumerate(plan.get("steps", [])):
-                    step_number = step['step_number']
+                    budget_stopped = False
+                    for idx, step in enumerate(plan.get("steps", [])):
+                        step_number = step['step_number']
                     
-                    # Update progress
-                    progress = (idx) / total_steps
-                    progress_bar.progress(progress)
-                    status_text.info(f"⚙️ Executing Step {step_number}: {step['title']}...")
+                        if usage_ledger.budget_exceeded(run_id):
+                            budget_stopped = True
+                            st.warning(f"💰 Token budget reached - stopped before Step {step_number}")
+                            break
                     
-                    # Create step container
-                    with st.expander(f"📍 Step {step_number}: {step['title']}", expanded=True):
-                        st.markdown(f"**Description:** {step['description']}")
-                        st.markdown(f"**Expected Outcome:** {step['expected_outcome']}")
-                        
-                        with st.spinner("Processing..."):
-                            result = execute_step(client, step, user_task, execution_results)
-                            time.sleep(0.5)  # Demo effect
+                        # Update progress
+                        progress = (idx) / total_steps
+                        progress_bar.progress(progress)
+                        status_text.info(f"⚙️ Executing Step {step_number}: {step['title']}...")
+                    
+                        # Create step container
+                        with st.expander(f"📍 Step {step_number}: {step['title']}", expanded=True):
+                            st.markdown(f"**Description:** {step['description']}")
+                            st.markdown(f"**Expected Outcome:** {step['expected_outcome']}")
                         
-                        st.markdown("**Result:**")
-                        st.success(result)
+                            st.markdown("**Result:**")
+                            result_placeholder = st.empty()
+                            with result_placeholder.container():
+                                result = st.write_stream(execute_step(client, step, user_task, execution_results, stream=True))
+                            result_placeholder.success(result)
                         
-                        execution_results.append({
-                            "step_number": step_number,
-                            "title": step['title'],
-                            "result": result
-                        })
+                            execution_results.append({
+                                "step_number": step_number,
+                                "title": step['title'],
+                                "result": result
+                            })
                 
-                # Complete progress
-                progress_bar.progress(1.0)
-                status_text.success("✅ All steps completed!")
+                    # Complete progress
+                    progress_bar.progress(1.0)
+                    if budget_stopped:
+                        status_text.warning(f"⏹️ Completed {len(execution_results)} of {total_steps} steps within budget")
+                    else:
+                        status_text.success("✅ All steps completed!")
                 
-                # Phase 3: Reflection
-                if execute_mode == "Plan + Execute + Reflect":
-                    st.markdown("---")
-                    st.markdown("## 🔍 Phase 3: Reflection")
+                    # Phase 3: Reflection
+                    reflection = None
+                    if execute_mode == "Plan + Execute + Reflect" and usage_ledger.budget_exceeded(run_id):
+                        st.markdown("---")
+                        st.warning("💰 Token budget reached - skipping reflection")
+                    elif execute_mode == "Plan + Execute + Reflect":
+                        st.markdown("---")
+                        st.markdown("## 🔍 Phase 3: Reflection")
                     
-                    with st.spinner("🤔 Reflecting on execution..."):
-                        reflection = reflect_on_execution(client, user_task, plan, execution_results)
-                        time.sleep(0.5)  # Demo effect
+                        with st.spinner("🤔 Reflecting on execution..."):
+                            reflection = reflect_on_execution(client, user_task, plan, execution_results)
+                            time.sleep(0.5)  # Demo effect
                     
-                    st.markdown("### 💡 Insights & Learnings")
-                    st.info(reflection)
+                        st.markdown("### 💡 Insights & Learnings")
+                        st.info(reflection)
             
-            # Summary
-            st.markdown("---")
-            st.markdown("## 📊 Summary")
+                # Summary
+                st.markdown("---")
+                st.markdown("## 📊 Summary")
             
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric("Total Steps", len(plan.get("steps", [])))
-            with col2:
-                completed = len(execution_results) if execute_mode != "Plan Only" else 0
-                st.metric("Completed", completed)
-            with col3:
-                st.metric("Mode", execute_mode.split(" + ")[0])
-            with col4:
-                st.metric("Status", "✅ Complete")
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("Total Steps", len(plan.get("steps", [])))
+                with col2:
+                    completed = len(execution_results) if execute_mode != "Plan Only" else 0
+                    st.metric("Completed", completed)
+                with col3:
+                    st.metric("Mode", execute_mode.split(" + ")[0])
+                with col4:
+                    st.metric("Status", "✅ Complete")
             
-            # Download option
-            if execute_mode != "Plan Only":
-                st.markdown("---")
-                export_data = {
-                    "task": user_task,
-                    "plan": plan,
-                    "execution_results": execution_results if execute_mode != "Plan Only" else [],
-                    "reflection": reflection if execute_mode == "Plan + Execute + Reflect" else None,
-                    "timestamp": datetime.now().isoformat()
-                }
+                # Download option
+                if execute_mode != "Plan Only":
+                    st.markdown("---")
+                    export_data = {
+                        "task": user_task,
+                        "plan": plan,
+                        "execution_results": execution_results if execute_mode != "Plan Only" else [],
+                        "reflection": reflection,
+                        "usage": usage_ledger.run(run_id),
+                        "timestamp": datetime.now().isoformat()
+                    }
                 
-                st.download_button(
-                    label="📥 Download Complete Report (JSON)",
-                    data=json.dumps(export_data, indent=2),
-                    file_name=f"task_execution_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                    mime="application/json"
-                )
-        else:
-            st.error(f"Failed to create plan: {plan.get('error', 'Unknown error')}")
+                    st.download_button(
+                        label="📥 Download Complete Report (JSON)",
+                        data=json.dumps(export_data, indent=2),
+                        file_name=f"task_execution_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                        mime="application/json"
+                    )
+            else:
+                st.error(f"Failed to create plan: {plan.get('error', 'Unknown error')}")
+        
+        # Token usage for this run, per plan step
+        run_usage = usage_ledger.run(run_id)
+        with st.expander(f"🧾 Token Usage: {run_usage['total_tokens']:,} tokens (~${run_usage['cost']:.4f})"):
+            st.table([
+                {"Step": step if step is not None else "-", "Calls": totals["calls"],
+                 "Prompt": totals["prompt_tokens"], "Completion": totals["completion_tokens"],
+                 "Cached": totals["cached_tokens"], "Cost ($)": round(totals["cost"], 4)}
+                for step, totals in usage_ledger.summarize("step", run_id=run_id).items()
+            ])
     
     else:
         st.error("⚠️ Please configure Azure AI credentials in .env file")
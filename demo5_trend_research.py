@@ -18,10 +18,12 @@ import streamlit as st
 import os
 import json
 from dotenv import load_dotenv
-from openai import AzureOpenAI, OpenAI
+from llm_client import get_azure_client, chat_completion, achat_completion, stream_chat_completion
+from llm_usage import usage_ledger, usage_run
 import time
 from datetime import datetime
 from api_connectors_mock import get_mock_apis
+from research_prompts import RESEARCH_QUESTIONS, AGENTS, build_insights_messages, build_report_messages
 
 load_dotenv()
 
@@ -31,121 +33,6 @@ st.set_page_config(
     layout="wide"
 )
 
-def get_azure_client():
-    """Initialize Azure OpenAI client"""
-    api_key = os.getenv("AZURE_AI_API_KEY")
-    endpoint = os.getenv("AZURE_AI_ENDPOINT")
-    
-    if not endpoint or not api_key:
-        return None
-    
-    if 'cognitiveservices' in endpoint:
-        return OpenAI(
-            base_url=endpoint,
-            api_key=api_key
-        )
-    else:
-        api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
-        return AzureOpenAI(
-            api_key=api_key,
-            api_version=api_version,
-            azure_endpoint=endpoint
-        )
-
-# Research questions for marketing agencies
-RESEARCH_QUESTIONS = {
-    "gen_z_nigeria": {
-        "title": "Gen Z Nigeria: Facebook vs Google Usage",
-        "question": "Why does Gen Z in Nigeria appear to use Facebook for community and content discovery, while using Google primarily for functional, task-based searches?",
-        "focus": "Social behavior patterns, platform preferences, user motivations",
-        "search_terms": ["Gen Z Nigeria Facebook", "Nigeria Google usage", "Nigerian social media behavior"]
-    },
-    "detty_december": {
-        "title": "Detty December Tourism Analysis",
-        "question": "Beyond the parties, what are the core drivers and frustrations for the diaspora and domestic tourists participating in 'Detty December' in Nigeria and Ghana?",
-        "focus": "Tourism motivations, pain points, diaspora engagement",
-        "search_terms": ["Detty December Nigeria Ghana", "Diaspora tourism Africa", "December tourism West Africa"]
-    },
-    "creator_economy": {
-        "title": "African Creator Economy Challenges",
-        "question": "What are the primary financial challenges and unmet needs of emerging creators and gamers in key African markets?",
-        "focus": "Monetization barriers, infrastructure gaps, creator pain points",
-        "search_terms": ["African creators challenges", "African gamers monetization", "Creator economy Africa"]
-    },
-    "mpesa_competition": {
-        "title": "M-Pesa Market Dominance Analysis",
-        "question": "What are the primary drivers of M-Pesa's dominance in East Africa, and what specific user frustrations or unmet needs could a competitor leverage to capture market share among the digital-native population?",
-        "focus": "Competitive analysis, user pain points, market opportunities",
-        "search_terms": ["M-Pesa dominance East Africa", "Mobile money Kenya", "M-Pesa competition"]
-    }
-}
-
-# Agent definitions
-AGENTS = {
-    "orchestrator": {
-        "name": "Research Orchestrator",
-        "icon": "🎯",
-        "color": "#FF6B6B",
-        "role": "coordinator",
-        "system_prompt": """You are a Research Orchestrator for a marketing agency.
-Your role is to coordinate multi-source research projects and ensure comprehensive data collection.
-Break down research questions into specific data collection tasks for specialized agents."""
-    },
-    "social_media": {
-        "name": "Social Media Intelligence Agent",
-        "icon": "📱",
-        "color": "#4ECDC4",
-        "role": "data_collector",
-        "system_prompt": """You are a Social Media Intelligence Agent specializing in Twitter/X, TikTok, and Reddit analysis.
-Analyze social media data for trends, sentiment, engagement patterns, and audience insights.
-Focus on actionable insights for marketing strategies."""
-    },
-    "trends": {
-        "name": "Trends Analysis Agent",
-        "icon": "📈",
-        "color": "#45B7D1",
-        "role": "data_collector",
-        "system_prompt": """You are a Trends Analysis Agent specializing in Google Trends data.
-Analyze search trends, regional interest, related queries, and temporal patterns.
-Identify rising trends and seasonal patterns relevant to marketing campaigns."""
-    },
-    "web_intelligence": {
-        "name": "Web Intelligence Agent",
-        "icon": "🌐",
-        "color": "#96CEB4",
-        "role": "data_collector",
-        "system_prompt": """You are a Web Intelligence Agent specializing in web search and content analysis.
-Analyze news articles, blog posts, reports, and online discussions.
-Extract key themes, expert opinions, and market signals."""
-    },
-    "insight_analyst": {
-        "name": "Insight Analyst Agent",
-        "icon": "🔍",
-        "color": "#FFEAA7",
-        "role": "analyst",
-        "system_prompt": """You are an Insight Analyst Agent for a marketing agency.
-Synthesize data from multiple sources to identify patterns, trends, and actionable insights.
-Focus on: audience behavior, market opportunities, competitive dynamics, and strategic recommendations."""
-    },
-    "report_generator": {
-        "name": "Report Generator Agent",
-        "icon": "📄",
-        "color": "#DFE6E9",
-        "role": "synthesizer",
-        "system_prompt": """You are a Report Generator Agent for a marketing agency.
-Create comprehensive, client-ready research reports with:
-- Executive Summary
-- Key Findings
-- Platform-specific Insights
-- Audience Demographics
-- Sentiment Analysis
-- Actionable Recommendations
-- Data Sources
-
-Use clear, professional language suitable for marketing executives."""
-    }
-}
-
 def collect_social_media_data(question_data, apis):
     """Phase 1: Collect data from social media platforms"""
     results = {}
@@ -215,55 +102,12 @@ def analyze_insights(client, model, all_data, question_data):
         st.write(f"- Google Trends data")
         st.write(f"- {all_data['web_intelligence']['total_results']} web sources")
         
-        # Create analysis prompt
-        data_summary = f"""
-Research Question: {question_data['question']}
-
-TWITTER/X DATA:
-- Total tweets: {all_data['social_media']['twitter']['total_results']}
-- Sentiment: {all_data['social_media']['twitter']['metrics']['sentiment_breakdown']}
-- Top hashtags: {all_data['social_media']['twitter']['metrics']['top_hashtags']}
-- Geographic distribution: {all_data['social_media']['twitter']['metrics']['geographic_distribution']}
-
-TIKTOK DATA:
-- Total videos: {all_data['social_media']['tiktok']['total_results']}
-- Total views: {all_data['social_media']['tiktok']['metrics']['total_views']:,}
-- Engagement rate: {all_data['social_media']['tiktok']['metrics']['total_engagement_rate']}%
-- Age demographics: {all_data['social_media']['tiktok']['metrics']['age_demographics']}
-
-REDDIT DATA:
-- Total posts: {all_data['social_media']['reddit']['total_results']}
-- Total comments: {all_data['social_media']['reddit']['metrics']['total_comments']}
-- Top subreddits: {all_data['social_media']['reddit']['metrics']['top_subreddits']}
-- Discussion intensity: {all_data['social_media']['reddit']['metrics']['discussion_intensity']}
-
-GOOGLE TRENDS:
-- Search volume index: {all_data['trends']['search_volume_index']}
-- Trending status: {all_data['trends']['trending_status']}
-- Regional interest: {all_data['trends']['regional_interest']}
-- Related queries: {all_data['trends']['related_queries']}
-
-WEB INTELLIGENCE:
-- Total sources: {all_data['web_intelligence']['total_results']}
-- News articles: {all_data['web_intelligence']['metrics']['news_articles']}
-- Blog posts: {all_data['web_intelligence']['metrics']['blog_posts']}
-- Top domains: {all_data['web_intelligence']['metrics']['top_domains']}
-
-Analyze this data and identify:
-1. Key patterns and trends
-2. Audience behavior insights
-3. Platform-specific findings
-4. Market opportunities
-5. Strategic implications for marketing
-"""
-        
         try:
-            response = client.chat.completions.create(
+            response = chat_completion(
+                client, "demo5.analyze_insights",
+                tags={"agent": "insight_analyst"},
                 model=os.getenv("AZURE_AI_MODEL_NAME", "gpt-4"),
-                messages=[
-                    {"role": "system", "content": agent["system_prompt"]},
-                    {"role": "user", "content": data_summary}
-                ],
+                messages=build_insights_messages(all_data, question_data),
                 temperature=0.7,
                 max_tokens=1500
             )
@@ -278,8 +122,8 @@ Analyze this data and identify:
             st.error(f"Error during analysis: {str(e)}")
             return None
 
-def generate_report(client, model, all_data, insights, question_data):
-    """Phase 2: Generate comprehensive marketing report"""
+def generate_report(client, model, all_data, insights, question_data, stream=False):
+    """Phase 2: Generate comprehensive marketing report (stream=True renders tokens as they arrive)"""
     agent = AGENTS["report_generator"]
     
     with st.status(f"{agent['icon']} {agent['name']} creating report...", expanded=True) as status:
@@ -287,44 +131,34 @@ def generate_report(client, model, all_data, insights, question_data):
         st.write("Creating executive summary...")
         st.write("Formatting recommendations...")
         
-        report_prompt = f"""
-Create a comprehensive marketing research report for the following question:
-
-{question_data['question']}
-
-INSIGHTS FROM ANALYSIS:
-{insights}
-
-RAW DATA SUMMARY:
-- Twitter: {all_data['social_media']['twitter']['total_results']} tweets, {all_data['social_media']['twitter']['metrics']['sentiment_breakdown']}
-- TikTok: {all_data['social_media']['tiktok']['total_results']} videos, {all_data['social_media']['tiktok']['metrics']['total_views']:,} views
-- Reddit: {all_data['social_media']['reddit']['total_results']} posts, {all_data['social_media']['reddit']['metrics']['total_comments']} comments
-- Google Trends: Index {all_data['trends']['search_volume_index']}, Status: {all_data['trends']['trending_status']}
-- Web Sources: {all_data['web_intelligence']['total_results']} articles
-
-Create a client-ready report with these sections:
-1. EXECUTIVE SUMMARY (2-3 paragraphs)
-2. KEY FINDINGS (5-7 bullet points)
-3. PLATFORM INSIGHTS
-   - Twitter/X Analysis
-   - TikTok Analysis
-   - Reddit Analysis
-   - Google Trends Analysis
-4. AUDIENCE DEMOGRAPHICS & BEHAVIOR
-5. SENTIMENT ANALYSIS
-6. ACTIONABLE RECOMMENDATIONS (5-7 specific actions)
-7. DATA SOURCES & METHODOLOGY
-
-Use professional, clear language suitable for marketing executives.
-"""
+        if stream:
+            report_stream = stream_chat_completion(
+                client, "demo5.generate_report",
+                tags={"agent": "report_generator"},
+                model=os.getenv("AZURE_AI_MODEL_NAME", "gpt-4"),
+                messages=build_report_messages(all_data, insights, question_data),
+                temperature=0.7,
+                max_tokens=2500
+            )
+            preview = st.empty()
+            with preview.container():
+                st.write_stream(report_stream)
+            preview.empty()
+            
+            if report_stream.error:
+                st.error(f"Error generating report: {str(report_stream.error)}")
+                return None
+            
+            st.write(f"✅ Report generated (first token after {report_stream.ttft or 0:.1f}s)")
+            status.update(label=f"✅ {agent['name']} completed report", state="complete")
+            return report_stream.text
         
         try:
-            response = client.chat.completions.create(
+            response = chat_completion(
+                client, "demo5.generate_report",
+                tags={"agent": "report_generator"},
                 model=os.getenv("AZURE_AI_MODEL_NAME", "gpt-4"),
-                messages=[
-                    {"role": "system", "content": agent["system_prompt"]},
-                    {"role": "user", "content": report_prompt}
-                ],
+                messages=build_report_messages(all_data, insights, question_data),
                 temperature=0.7,
                 max_tokens=2500
             )
@@ -339,6 +173,38 @@ Use professional, clear language suitable for marketing executives.
             st.error(f"Error generating report: {str(e)}")
             return None
 
+async def analyze_insights_async(client, all_data, question_data):
+    """
+    Async variant of analyze_insights (takes the async client, no UI)
+    
+    Raises on failure so the caller can report the error.
+    """
+    response = await achat_completion(
+        client, "demo5.analyze_insights",
+        tags={"agent": "insight_analyst"},
+        model=os.getenv("AZURE_AI_MODEL_NAME", "gpt-4"),
+        messages=build_insights_messages(all_data, question_data),
+        temperature=0.7,
+        max_tokens=1500
+    )
+    return response.choices[0].message.content
+
+async def generate_report_async(client, all_data, insights, question_data):
+    """
+    Async variant of generate_report (takes the async client, no UI)
+    
+    Raises on failure so the caller can report the error.
+    """
+    response = await achat_completion(
+        client, "demo5.generate_report",
+        tags={"agent": "report_generator"},
+        model=os.getenv("AZURE_AI_MODEL_NAME", "gpt-4"),
+        messages=build_report_messages(all_data, insights, question_data),
+        temperature=0.7,
+        max_tokens=2500
+    )
+    return response.choices[0].message.content
+
 # Main UI
 st.title("📊 Demo 5: Trend Research System")
 st.markdown("### Multi-Source Intelligence for Marketing Agencies")
@@ -461,13 +327,14 @@ if start_research:
     st.markdown("---")
     st.subheader("🔍 Phase 2: Analysis & Synthesis (Sequential Execution)")
     
-    # Step 1: Analyze insights
-    insights = analyze_insights(client, model, all_data, selected_question)
+    # Step 1: Analyze insights (token usage is tracked per agent for this run)
+    with usage_run("demo5") as run_id:
+        insights = analyze_insights(client, model, all_data, selected_question)
+        
+        # Step 2: Generate report
+        report = generate_report(client, model, all_data, insights, selected_question, stream=True) if insights else None
     
     if insights:
-        # Step 2: Generate report
-        report = generate_report(client, model, all_data, insights, selected_question)
-        
         if report:
             # Calculate execution time
             execution_time = time.time() - start_time
@@ -497,6 +364,14 @@ if start_research:
             with col5:
                 st.metric("Report Sections", "7")
             
+            # Token usage per agent
+            run_usage = usage_ledger.run(run_id)
+            usage_by_agent = usage_ledger.summarize("agent", run_id=run_id)
+            st.caption("🧾 Tokens: " + " | ".join(
+                f"{AGENTS[agent_key]['name']}: {totals['total_tokens']:,}"
+                for agent_key, totals in usage_by_agent.items() if agent_key in AGENTS
+            ) + f" | Total: {run_usage['total_tokens']:,} (~${run_usage['cost']:.4f})")
+            
             # Display report
             st.markdown(report)
             
@@ -15,7 +15,8 @@ import streamlit as st
 import os
 import json
 from dotenv import load_dotenv
-from openai import AzureOpenAI, OpenAI
+from llm_client import get_azure_client, chat_completion, achat_completion, stream_chat_completion
+from llm_usage import usage_ledger, usage_run
 import time
 from datetime import datetime
 
@@ -36,27 +37,6 @@ st.set_page_config(
     layout="wide"
 )
 
-def get_azure_client():
-    """Initialize Azure OpenAI client"""
-    api_key = os.getenv("AZURE_AI_API_KEY")
-    endpoint = os.getenv("AZURE_AI_ENDPOINT")
-    
-    if not endpoint or not api_key:
-        return None
-    
-    if 'cognitiveservices' in endpoint:
-        return OpenAI(
-            base_url=endpoint,
-            api_key=api_key
-        )
-    else:
-        api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
-        return AzureOpenAI(
-            api_key=api_key,
-            api_version=api_version,
-            azure_endpoint=endpoint
-        )
-
 # Pre-configured research questions
 RESEARCH_QUESTIONS = {
     "gen_z_nigeria": {
@@ -279,6 +259,57 @@ WEB INTELLIGENCE:
     
     return "\n".join(summary_parts)
 
+def build_insights_messages(all_data, question):
+    """Build the Insight Analyst prompt from the available data"""
+    data_summary = create_data_summary(all_data, question)
+    
+    analysis_prompt = f"""{data_summary}
+
+Analyze this data and identify:
+1. Key patterns and trends
+2. Audience behavior insights
+3. Platform-specific findings
+4. Market opportunities
+5. Strategic implications for marketing
+"""
+    
+    return [
+        {"role": "system", "content": "You are an Insight Analyst Agent for a marketing agency. Synthesize data from multiple sources to identify patterns, trends, and actionable insights."},
+        {"role": "user", "content": analysis_prompt}
+    ]
+
+def build_report_messages(all_data, insights, question):
+    """Build the Report Generator prompt from insights and the data summary"""
+    data_summary = create_data_summary(all_data, question)
+    
+    report_prompt = f"""
+Create a comprehensive marketing research report for the following question:
+
+{question}
+
+INSIGHTS FROM ANALYSIS:
+{insights}
+
+RAW DATA SUMMARY:
+{data_summary}
+
+Create a client-ready report with these sections:
+1. EXECUTIVE SUMMARY (2-3 paragraphs)
+2. KEY FINDINGS (5-7 bullet points)
+3. PLATFORM INSIGHTS (for each available platform)
+4. AUDIENCE DEMOGRAPHICS & BEHAVIOR
+5. SENTIMENT ANALYSIS
+6. ACTIONABLE RECOMMENDATIONS (5-7 specific actions)
+7. DATA SOURCES & METHODOLOGY
+
+Use professional, clear language suitable for marketing executives.
+"""
+    
+    return [
+        {"role": "system", "content": "You are a Report Generator Agent for a marketing agency. Create comprehensive, client-ready research reports."},
+        {"role": "user", "content": report_prompt}
+    ]
+
 def analyze_insights(client, model, all_data, question):
     """Phase 2: Analyze all collected data for insights"""
     agent = AGENTS["insight_analyst"]
@@ -298,25 +329,12 @@ def analyze_insights(client, model, all_data, question):
         
         st.write(f"- Analyzing {data_points} data points")
         
-        data_summary = create_data_summary(all_data, question)
-        
-        analysis_prompt = f"""{data_summary}
-
-Analyze this data and identify:
-1. Key patterns and trends
-2. Audience behavior insights
-3. Platform-specific findings
-4. Market opportunities
-5. Strategic implications for marketing
-"""
-        
         try:
-            response = client.chat.completions.create(
+            response = chat_completion(
+                client, "demo5.analyze_insights",
+                tags={"agent": "insight_analyst"},
                 model=os.getenv("AZURE_AI_MODEL_NAME", "gpt-4"),
-                messages=[
-                    {"role": "system", "content": "You are an Insight Analyst Agent for a marketing agency. Synthesize data from multiple sources to identify patterns, trends, and actionable insights."},
-                    {"role": "user", "content": analysis_prompt}
-                ],
+                messages=build_insights_messages(all_data, question),
                 temperature=0.7,
                 max_tokens=1500
             )
@@ -331,8 +349,8 @@ Analyze this data and identify:
             st.error(f"Error during analysis: {str(e)}")
             return None
 
-def generate_report(client, model, all_data, insights, question):
-    """Phase 2: Generate comprehensive marketing report"""
+def generate_report(client, model, all_data, insights, question, stream=False):
+    """Phase 2: Generate comprehensive marketing report (stream=True renders tokens as they arrive)"""
     agent = AGENTS["report_generator"]
     
     with st.status(f"{agent['icon']} {agent['name']} creating report...", expanded=True) as status:
@@ -340,38 +358,34 @@ def generate_report(client, model, all_data, insights, question):
         st.write("Creating executive summary...")
         st.write("Formatting recommendations...")
         
-        data_summary = create_data_summary(all_data, question)
-        
-        report_prompt = f"""
-Create a comprehensive marketing research report for the following question:
-
-{question}
-
-INSIGHTS FROM ANALYSIS:
-{insights}
-
-RAW DATA SUMMARY:
-{data_summary}
-
-Create a client-ready report with these sections:
-1. EXECUTIVE SUMMARY (2-3 paragraphs)
-2. KEY FINDINGS (5-7 bullet points)
-3. PLATFORM INSIGHTS (for each available platform)
-4. AUDIENCE DEMOGRAPHICS & BEHAVIOR
-5. SENTIMENT ANALYSIS
-6. ACTIONABLE RECOMMENDATIONS (5-7 specific actions)
-7. DATA SOURCES & METHODOLOGY
-
-Use professional, clear language suitable for marketing executives.
-"""
+        if stream:
+            report_stream = stream_chat_completion(
+                client, "demo5.generate_report",
+                tags={"agent": "report_generator"},
+                model=os.getenv("AZURE_AI_MODEL_NAME", "gpt-4"),
+                messages=build_report_messages(all_data, insights, question),
+                temperature=0.7,
+                max_tokens=2500
+            )
+            preview = st.empty()
+            with preview.container():
+                st.write_stream(report_stream)
+            preview.empty()
+            
+            if report_stream.error:
+                st.error(f"Error generating report: {str(report_stream.error)}")
+                return None
+            
+            st.write(f"✅ Report generated (first token after {report_stream.ttft or 0:.1f}s)")
+            status.update(label=f"✅ {agent['name']} completed report", state="complete")
+            return report_stream.text
         
         try:
-            response = client.chat.completions.create(
+            response = chat_completion(
+                client, "demo5.generate_report",
+                tags={"agent": "report_generator"},
                 model=os.getenv("AZURE_AI_MODEL_NAME", "gpt-4"),
-                messages=[
-                    {"role": "system", "content": "You are a Report Generator Agent for a marketing agency. Create comprehensive, client-ready research reports."},
-                    {"role": "user", "content": report_prompt}
-                ],
+                messages=build_report_messages(all_data, insights, question),
                 temperature=0.7,
                 max_tokens=2500
             )
@@ -386,6 +400,38 @@ Use professional, clear language suitable for marketing executives.
             st.error(f"Error generating report: {str(e)}")
             return None
 
+async def analyze_insights_async(client, all_data, question):
+    """
+    Async variant of analyze_insights (takes the async client, no UI)
+    
+    Raises on failure so the caller can report the error.
+    """
+    response = await achat_completion(
+        client, "demo5.analyze_insights",
+        tags={"agent": "insight_analyst"},
+        model=os.getenv("AZURE_AI_MODEL_NAME", "gpt-4"),
+        messages=build_insights_messages(all_data, question),
+        temperature=0.7,
+        max_tokens=1500
+    )
+    return response.choices[0].message.content
+
+async def generate_report_async(client, all_data, insights, question):
+    """
+    Async variant of generate_report (takes the async client, no UI)
+    
+    Raises on failure so the caller can report the error.
+    """
+    response = await achat_completion(
+        client, "demo5.generate_report",
+        tags={"agent": "report_generator"},
+        model=os.getenv("AZURE_AI_MODEL_NAME", "gpt-4"),
+        messages=build_report_messages(all_data, insights, question),
+        temperature=0.7,
+        max_tokens=2500
+    )
+    return response.choices[0].message.content
+
 # Main UI
 st.title("📊 Demo 5: Trend Research System")
 st.markdown("### Multi-Source Intelligence for Marketing Agencies (Real APIs)")
@@ -569,13 +615,14 @@ if start_research:
     st.markdown("---")
     st.subheader("🔍 Phase 2: Analysis & Synthesis (Sequential Execution)")
     
-    # Step 1: Analyze insights
-    insights = analyze_insights(client, model, all_data, question_text)
+    # Step 1: Analyze insights (token usage is tracked per agent for this run)
+    with usage_run("demo5") as run_id:
+        insights = analyze_insights(client, model, all_data, question_text)
+        
+        # Step 2: Generate report
+        report = generate_report(client, model, all_data, insights, question_text, stream=True) if insights else None
     
     if insights:
-        # Step 2: Generate report
-        report = generate_report(client, model, all_data, insights, question_text)
-        
         if report:
             # Calculate execution time
             execution_time = time.time() - start_time
@@ -607,6 +654,14 @@ if start_research:
             with col5:
                 st.metric("Failed APIs", str(len(failed_apis)))
             
+            # Token usage per agent
+            run_usage = usage_ledger.run(run_id)
+            usage_by_agent = usage_ledger.summarize("agent", run_id=run_id)
+            st.caption("🧾 Tokens: " + " | ".join(
+                f"{AGENTS[agent_key]['name']}: {totals['total_tokens']:,}"
+                for agent_key, totals in usage_by_agent.items() if agent_key in AGENTS
+            ) + f" | Total: {run_usage['total_tokens']:,} (~${run_usage['cost']:.4f})")
+            
             # Display report
             st.markdown(report)
             
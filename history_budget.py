@@ -0,0 +1,194 @@
+"""
+Conversation History Budgeter for sequential multi-agent workflows
+
+In agents_demo.multi_agent_workflow each agent sees every previous agent's
+full answer, so the prompt grows with every step. This module keeps the
+prompt under a token cap without extra LLM calls:
+- The user's query and the latest agent turn are kept verbatim when they fit
+- Older turns become structured digests: headings plus the sentences most
+  relevant to the query, in their original order
+- Digests shrink (and the oldest are dropped) until the prompt fits
+- A query too long for the cap on its own is truncated (and flagged)
+
+Token counts are estimated at ~4 characters per token, which is close enough
+to keep prompt size (and therefore latency) flat as workflows grow.
+
+Configuration via .env:
+- AGENT_HISTORY_MAX_TOKENS prompt token cap per step (default 3000)
+"""
+
+import os
+import re
+from typing import Dict, Any, List
+
+from dotenv import load_dotenv
+
+from semantic_cache import HashedNgramEmbedder
+
+load_dotenv()
+
+
+DEFAULT_MAX_PROMPT_TOKENS = int(os.getenv("AGENT_HISTORY_MAX_TOKENS", 3000))
+
+# Never shrink a digest below this many tokens (below that, drop it instead)
+MIN_DIGEST_TOKENS = 40
+
+# Per-message overhead (role, separators) in the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+TRUNCATION_MARKER = "…(truncated)"
+
+_tokenizer = HashedNgramEmbedder()
+
+
+def count_tokens(text: str) -> int:
+    """Estimate tokens at ~4 characters per token"""
+    return len(text) // 4 + 1
+
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """Estimate prompt tokens for a list of chat messages"""
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    """Cut text to a token budget, keeping its start"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    return text[:max((max_tokens - 1) * 4 - len(TRUNCATION_MARKER), 0)] + TRUNCATION_MARKER
+
+
+def _split_units(text: str) -> List[str]:
+    """Split an answer into headings and sentences (a bullet's marker stays on its first sentence)"""
+    units = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if _is_heading(line):
+            units.append(line)
+        else:
+            units.extend(s.strip() for s in re.split(r"(?<=[.!?])\s+", line) if s.strip())
+    return units
+
+
+def _is_heading(unit: str) -> bool:
+    return unit.startswith("#") or (unit.startswith("**") and unit.endswith("**"))
+
+
+def digest(text: str, query: str, max_tokens: int) -> str:
+    """
+    Build an extractive digest of an agent's answer
+
+    Args:
+        text: The full answer
+        query: The user's query (sentences sharing its terms rank higher)
+        max_tokens: Token budget for the digest
+
+    Returns:
+        Headings plus the highest-ranked sentences, in original order
+    """
+    units = _split_units(text)
+    query_terms = set(_tokenizer.tokenize(query))
+
+    def score(index: int, unit: str) -> float:
+        terms = set(_tokenizer.tokenize(unit))
+        overlap = len(terms & query_terms) / (len(query_terms) or 1)
+        # Earlier sentences in a section usually carry the point
+        position = 1.0 / (1 + index / 4)
+        return (2.0 if _is_heading(unit) else 0.0) + overlap + 0.5 * position
+
+    ranked = sorted(range(len(units)), key=lambda i: score(i, units[i]), reverse=True)
+    chosen, used = set(), 0
+    for i in ranked:
+        cost = count_tokens(units[i])
+        if used + cost > max_tokens:
+            continue
+        chosen.add(i)
+        used += cost
+
+    return "\n".join(units[i] for i in sorted(chosen))
+
+
+class HistoryBudgeter:
+    """Fits a sequential workflow's conversation history under a prompt token cap"""
+
+    def __init__(self, max_prompt_tokens: int = DEFAULT_MAX_PROMPT_TOKENS):
+        self.max_prompt_tokens = max_prompt_tokens
+
+    def fit(self, system_prompt: str, history: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Budget the history for the next agent
+
+        Args:
+            system_prompt: The next agent's system prompt
+            history: [user query, agent turn, agent turn, ...] as chat messages
+
+        Returns:
+            Dictionary with the messages to send (history only, without the system
+            prompt), full vs sent prompt tokens, how many turns were digested/dropped
+            and whether the query itself had to be truncated
+        """
+        query = history[0]["content"]
+        system_tokens = count_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+        full_tokens = system_tokens + count_message_tokens(history)
+        report = {"full_tokens": full_tokens, "digested_turns": 0, "dropped_turns": 0, "truncated_query": False}
+
+        if full_tokens <= self.max_prompt_tokens:
+            return dict(report, messages=list(history), prompt_tokens=full_tokens)
+
+        # The query always goes out; if it alone is over the cap, keep as much of it as fits
+        query_message = history[0]
+        query_budget = self.max_prompt_tokens - system_tokens - MESSAGE_OVERHEAD_TOKENS
+        if count_tokens(query) > query_budget:
+            query_message = dict(query_message, content=truncate(query, query_budget))
+            report["truncated_query"] = True
+
+        turns = [dict(m) for m in history[1:]]
+        available = self.max_prompt_tokens - system_tokens - count_message_tokens([query_message])
+        if not turns or available <= 0:
+            report["dropped_turns"] = len(turns)
+            return dict(report, messages=[query_message],
+                        prompt_tokens=system_tokens + count_message_tokens([query_message]))
+
+        # Latest turn stays verbatim if it fits in half the budget; older turns share the rest
+        latest_full = count_tokens(turns[-1]["content"]) + MESSAGE_OVERHEAD_TOKENS
+        keep_latest = latest_full <= available // 2
+        older = turns[:-1] if keep_latest else turns
+        remaining = available - (latest_full if keep_latest else 0)
+
+        # Drop the oldest turns until every digest gets a useful minimum
+        while older and remaining // len(older) < MIN_DIGEST_TOKENS + MESSAGE_OVERHEAD_TOKENS:
+            older.pop(0)
+            report["dropped_turns"] += 1
+
+        digested = []
+        for turn in older:
+            # Keep the "[Agent]:" label so the next agent knows whose points these are
+            label = re.match(r"^\[[^\]]+\]:\s*", turn["content"])
+            label_text = label.group(0).rstrip() + " (digest)\n" if label else ""
+            body = turn["content"][label.end():] if label else turn["content"]
+            per_turn = remaining // len(older) - MESSAGE_OVERHEAD_TOKENS - count_tokens(label_text)
+            digested.append({
+                "role": turn["role"],
+                "content": label_text + digest(body, query, per_turn)
+            })
+            report["digested_turns"] += 1
+
+        messages = [query_message] + digested + ([turns[-1]] if keep_latest else [])
+        return dict(report, messages=messages,
+                    prompt_tokens=system_tokens + count_message_tokens(messages))
+
+
+# Test function
+if __name__ == "__main__":
+    answer = "## Findings\n" + " ".join(
+        f"Sentence {i} about customer retention and churn in SaaS products." for i in range(60)
+    )
+    history = [{"role": "user", "content": "How can we improve customer retention for our SaaS product?"}]
+    budgeter = HistoryBudgeter(max_prompt_tokens=800)
+    for agent in ["Analyst", "Strategist", "Innovator", "Critic"]:
+        result = budgeter.fit("You are a helpful agent.", history)
+        print(f"{agent}: full={result['full_tokens']} sent={result['prompt_tokens']} "
+              f"digested={result['digested_turns']} dropped={result['dropped_turns']}")
+        history.append({"role": "assistant", "content": f"[{agent}]: {answer}"})
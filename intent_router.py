@@ -0,0 +1,294 @@
+"""
+Local Intent Router for the Demo 1 tool agent
+
+For questions like the example buttons, the agent's first model call only
+decides which of get_weather, get_venue_info and calculate_travel_time to
+call. This router makes that decision locally, in well under a millisecond:
+- Keyword/regex rules per tool, used as fixed prior features: a match only
+  makes a tool possible (p=0.5), no match makes it unlikely (p≈0.05)
+- A small CPU-only linear model (one-vs-rest logistic regression over the
+  hashed word/n-gram features of semantic_cache.py) trained online from the
+  model's own tool choices, and replayed from a JSONL trajectory log at start
+- Regex argument extraction (city, date, venue, route, travel mode)
+- A plan is returned only after enough logged trajectories have been learned,
+  when every tool is confidently in or out (which takes learned n-gram
+  evidence, never keywords alone) and all required arguments were found;
+  anything else falls back to the model's normal tool choice
+- Routed, fallback (by reason) and correction counters; a correction is a
+  routed run where the model still asked for more tools
+
+Configuration via .env:
+- INTENT_ROUTER_ENABLED (default true)
+- INTENT_ROUTER_THRESHOLD probability a tool must reach (or stay below 1 - it), default 0.9
+- INTENT_ROUTER_MIN_EXAMPLES trajectories to learn before routing at all (default 20)
+- INTENT_ROUTER_LOG JSONL file of logged trajectories (unset = learn in memory only)
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from datetime import date
+from typing import Dict, Any, List, Optional, Callable
+
+import numpy as np
+from dotenv import load_dotenv
+
+from semantic_cache import HashedNgramEmbedder
+from tool_cache import canonical_date
+
+load_dotenv()
+
+MONTHS = r"(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|June?|July?|Aug(?:ust)?|Sep(?:t(?:ember)?)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)"
+
+# Keyword rules per tool (a match is a strong feature, not a decision)
+PREPARATION = r"|prepare|preparation|attending"
+RULES = {
+    "get_weather": r"\b(?:weather|forecast|temperature|rain\w*|sunny|umbrella|pack|wear" + PREPARATION + r")\b",
+    "get_venue_info": r"\b(?:venue|address|facilit\w*|capacity|parking|wifi|sessions|tracks|where is" + PREPARATION + r")\b",
+    "calculate_travel_time": r"\b(?:travel|commute|get (?:to|there)|driv\w*|walk\w*|how long|how far|distance|from \S+ to" + PREPARATION + r")\b",
+}
+
+
+DATE_PATTERNS = (r"\b\d{4}-\d{2}-\d{2}\b",
+                 rf"\b({MONTHS})\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?\b(?:,?\s+(\d{{4}}))?",
+                 rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?({MONTHS})\b(?:,?\s+(\d{{4}}))?")
+
+
+def extract_date(message: str, today: Optional[date] = None) -> Optional[str]:
+    """YYYY-MM-DD from "2025-11-22", "November 22, 2025" or "22 Nov" (no year = next occurrence)"""
+    iso = re.search(DATE_PATTERNS[0], message)
+    if iso:
+        return iso.group(0)
+    today = today or date.today()
+    match = re.search(DATE_PATTERNS[1], message, re.I) or re.search(DATE_PATTERNS[2], message, re.I)
+    if not match:
+        return None
+    first, second, year = match.groups()
+    month, day = (first, second) if not first.isdigit() else (second, first)
+    parsed = canonical_date(f"{day} {month[:3].title()} {year or today.year}")
+    if not re.fullmatch(r"\d{4}-\d{2}-\d{2}", parsed):
+        return None
+    if not year and parsed < today.isoformat():
+        parsed = canonical_date(f"{day} {month[:3].title()} {today.year + 1}")
+    return parsed
+
+
+def count_dates(message: str) -> int:
+    """Number of dates mentioned (in any of the supported formats)"""
+    return sum(len(re.findall(pattern, message, re.I)) for pattern in DATE_PATTERNS)
+
+
+def extract_cities(message: str) -> List[str]:
+    """Capitalized places after in/at/to/visiting/and, e.g. ["Cape Town", "Durban"]"""
+    cities = []
+    for match in re.finditer(r"\b(?:in|at|to|visiting|and)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)", message):
+        city = match.group(1)
+        if not re.fullmatch(MONTHS, city.split()[0], re.I) and city not in cities:
+            cities.append(city)
+    return cities
+
+
+def extract_city(message: str) -> Optional[str]:
+    """First capitalized place after in/at/to/visiting, e.g. "Cape Town" """
+    cities = extract_cities(message)
+    return cities[0] if cities else None
+
+
+def extract_venue(message: str) -> Optional[str]:
+    """Event name (".NET Conf", "Build 2025 Conference") plus the city, if any"""
+    match = re.search(r"((?:\.NET|[A-Z]\w*)(?:\s+[A-Z]\w*)*\s+(?:Conf|Conference|Summit|Expo|Meetup)(?:\s+\d{4})?)", message)
+    if not match:
+        return None
+    city = extract_city(message)
+    return f"{match.group(1)} {city}" if city and city not in match.group(1) else match.group(1)
+
+
+def extract_route(message: str) -> Optional[Dict[str, str]]:
+    """from_location/to_location from "from X to Y", and the travel mode"""
+    match = re.search(r"\bfrom\s+(?:the\s+)?(.+?)\s+to\s+(?:the\s+)?(.+?)(?=\s+(?:by|on|via|in)\b|[?!,]|\.\s|\.$|$)", message, re.I)
+    if not match:
+        return None
+    if re.search(r"\bwalk", message, re.I):
+        mode = "walking"
+    elif re.search(r"\b(?:public transport|bus|train|metro|transit|MyCiTi)\b", message, re.I):
+        mode = "public_transport"
+    else:
+        mode = "driving"
+    return {"from_location": match.group(1).strip(), "to_location": match.group(2).strip(), "mode": mode}
+
+
+def _weather_arguments(message: str) -> Optional[Dict[str, Any]]:
+    # Several cities or days need the batch tool; leave those to the model
+    if len(extract_cities(message)) > 1 or count_dates(message) > 1:
+        return None
+    city, day = extract_city(message), extract_date(message)
+    return {"city": city, "date": day} if city and day else None
+
+
+def _venue_arguments(message: str) -> Optional[Dict[str, Any]]:
+    venue = extract_venue(message)
+    return {"venue_name": venue} if venue else None
+
+
+# Tool name → function returning its arguments from the message (None = can't tell)
+EXTRACTORS: Dict[str, Callable[[str], Optional[Dict[str, Any]]]] = {
+    "get_weather": _weather_arguments,
+    "get_venue_info": _venue_arguments,
+    "calculate_travel_time": extract_route,
+}
+
+
+class IntentClassifier:
+    """One-vs-rest logistic regression over hashed n-grams plus keyword-rule indicators"""
+
+    def __init__(self, labels: List[str], rules: Dict[str, str], dim: int = 4096,
+                 learning_rate: float = 1.0, rule_prior: float = 3.0):
+        self.labels = labels
+        self.rules = [re.compile(rules[label], re.I) for label in labels]
+        self.embedder = HashedNgramEmbedder(dim)
+        self.learning_rate = learning_rate
+        # Rule weights and bias are fixed and cancel out on a match: p=0.5 with a match,
+        # p≈0.05 without. Only the learned n-gram weights can make a tool likely, so
+        # keyword hits alone never clear a routing threshold (> 0.5)
+        self.dim = dim
+        self.weights = np.zeros((len(labels), dim + len(labels)), dtype=np.float32)
+        self.weights[:, dim:] = np.eye(len(labels), dtype=np.float32) * rule_prior
+        self.bias = np.full(len(labels), -rule_prior, dtype=np.float32)
+        self.examples = 0
+        self._lock = threading.Lock()
+
+    def vector(self, message: str) -> np.ndarray:
+        tf = self.embedder.term_frequencies(message)
+        norm = np.linalg.norm(tf)
+        rules = np.array([1.0 if rule.search(message) else 0.0 for rule in self.rules], dtype=np.float32)
+        return np.concatenate([tf / norm if norm else tf, rules])
+
+    def predict(self, message: str) -> Dict[str, float]:
+        """Probability that the model would call each tool for this message"""
+        x = self.vector(message)
+        with self._lock:
+            logits = self.weights @ x + self.bias
+        return dict(zip(self.labels, (1.0 / (1.0 + np.exp(-logits))).tolist()))
+
+    def learn(self, message: str, positives: List[str], epochs: int = 1, new_example: bool = True):
+        """SGD step(s) on the n-gram weights towards the tools the model actually called"""
+        x = self.vector(message)
+        y = np.array([1.0 if label in positives else 0.0 for label in self.labels], dtype=np.float32)
+        with self._lock:
+            for _ in range(epochs):
+                p = 1.0 / (1.0 + np.exp(-(self.weights @ x + self.bias)))
+                self.weights[:, :self.dim] -= self.learning_rate * np.outer(p - y, x[:self.dim])
+            if new_example:
+                self.examples += 1
+
+
+class IntentRouter:
+    """Predicts a whole tool turn locally, or declines so the model chooses"""
+
+    def __init__(self, classifier: IntentClassifier,
+                 extractors: Dict[str, Callable[[str], Optional[Dict[str, Any]]]],
+                 threshold: float = 0.9, min_examples: int = 20, enabled: bool = True,
+                 log_path: Optional[str] = None):
+        if not 0.5 < threshold < 1.0:
+            raise ValueError(f"Intent router threshold must be between 0.5 and 1, got {threshold}")
+        self.classifier = classifier
+        self.extractors = extractors
+        self.threshold = threshold
+        self.min_examples = min_examples
+        self.enabled = enabled
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._stats = {"routed": 0, "corrections": 0, "learned": 0,
+                       "fallbacks": {"untrained": 0, "low_confidence": 0, "no_tools": 0, "missing_arguments": 0}}
+        if enabled and log_path and os.path.exists(log_path):
+            self.load_log()
+
+    def _fallback(self, reason: str):
+        with self._lock:
+            self._stats["fallbacks"][reason] += 1
+
+    def predict(self, user_message: str) -> Optional[Dict[str, Any]]:
+        """
+        Predict the tool calls for a question
+
+        Returns:
+            {"tool_calls": [{"name", "arguments"}], "confidence": lowest per-tool
+            certainty, "probabilities": per tool}, or None to let the model choose
+        """
+        if not self.enabled:
+            return None
+        if self.classifier.examples < self.min_examples:
+            self._fallback("untrained")
+            return None
+        probabilities = self.classifier.predict(user_message)
+        confidence = min(max(p, 1.0 - p) for p in probabilities.values())
+        if confidence < self.threshold:
+            self._fallback("low_confidence")
+            return None
+        names = [name for name, p in probabilities.items() if p >= self.threshold]
+        if not names:
+            self._fallback("no_tools")
+            return None
+        tool_calls = []
+        for name in names:
+            arguments = self.extractors[name](user_message)
+            if arguments is None:
+                self._fallback("missing_arguments")
+                return None
+            tool_calls.append({"name": name, "arguments": arguments})
+        with self._lock:
+            self._stats["routed"] += 1
+        return {"tool_calls": tool_calls, "confidence": confidence, "probabilities": probabilities}
+
+    def learn(self, user_message: str, tool_names: List[str]):
+        """Train on the tools the model chose for a question (and log it, if configured)"""
+        if not self.enabled:
+            return
+        self.classifier.learn(user_message, tool_names)
+        with self._lock:
+            self._stats["learned"] += 1
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"message": user_message, "tools": sorted(set(tool_names)),
+                                        "time": time.time()}, ensure_ascii=False) + "\n")
+
+    def record_correction(self):
+        """A routed run where the model asked for more tools before answering"""
+        with self._lock:
+            self._stats["corrections"] += 1
+
+    def load_log(self, epochs: int = 5):
+        """Train on every trajectory in the log"""
+        with open(self.log_path, encoding="utf-8") as f:
+            examples = [json.loads(line) for line in f if line.strip()]
+        for epoch in range(epochs):
+            for example in examples:
+                self.classifier.learn(example["message"], example["tools"], new_example=epoch == 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """Routed/fallback/correction counters"""
+        with self._lock:
+            stats = {**self._stats, "fallbacks": dict(self._stats["fallbacks"])}
+        decisions = stats["routed"] + sum(stats["fallbacks"].values())
+        stats["route_rate"] = (stats["routed"] / decisions) if decisions else 0.0
+        stats["training_examples"] = self.classifier.examples
+        stats["min_examples"] = self.min_examples
+        return stats
+
+
+# Process-wide router for the Demo 1 tools
+intent_router = IntentRouter(
+    IntentClassifier(list(EXTRACTORS), RULES),
+    EXTRACTORS,
+    threshold=float(os.getenv("INTENT_ROUTER_THRESHOLD", 0.9)),
+    min_examples=int(os.getenv("INTENT_ROUTER_MIN_EXAMPLES", 20)),
+    enabled=os.getenv("INTENT_ROUTER_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on"),
+    log_path=os.getenv("INTENT_ROUTER_LOG") or None
+)
+
+
+def get_intent_router_stats() -> Dict[str, Any]:
+    """Get routed/fallback counters for the Demo 1 intent router"""
+    return intent_router.stats()
@@ -0,0 +1,430 @@
+"""
+Offline Batch Mode for bulk research (demo5) and planning (demo4) jobs
+
+Runs a JSONL file of jobs overnight instead of one interactive call at a time:
+- Each job is a pipeline of dependent chat completions (research: insights →
+  report; planning: plan → steps → reflection)
+- Jobs advance in rounds: every round collects the next request of every
+  unfinished job into one file in the Batch API input format
+  ({"custom_id", "method", "url", "body"}) and reads results in the Batch API
+  output format ({"custom_id", "response": {"status_code", "body"}, "error"})
+- Executors:
+  - local: runs each round through the shared middleware (cache, rate
+    limiting, usage ledger) with bounded concurrency
+  - batch-api: uploads the round with the Files API and runs it as a Batch
+    job (Azure OpenAI Global Batch deployment, ~50% cheaper, 24h window)
+- Resumable: each job's progress is saved to <out>/<job id>.json after every
+  result, and a submitted batch is reattached instead of resubmitted
+- Per-job output files: <out>/<job id>.md with the report or executed plan;
+  every round's input and output files are kept in <out>/rounds/
+
+Jobs file, one JSON object per line:
+    {"id": "genz", "type": "research", "question": "gen_z_nigeria"}
+    {"id": "fintech", "type": "research", "question": "How do Kenyan SMEs choose payment apps?"}
+    {"id": "launch", "type": "planning", "task": "Plan the launch of a budgeting app in Lagos"}
+
+Usage:
+    python llm_batch.py jobs.jsonl --out batch_output --concurrency 8
+    python llm_batch.py jobs.jsonl --out batch_output --executor batch-api
+
+Test offline against the stub (it implements the Files and Batches API too):
+    python llm_stub_server.py --port 8000 --profile fast
+
+Configuration via .env:
+- LLM_BATCH_DEPLOYMENT Global Batch deployment for --executor batch-api
+  (default AZURE_AI_MODEL_NAME)
+- LLM_BATCH_ENDPOINT batch request url (default /chat/completions)
+- LLM_BATCH_POLL_SECONDS seconds between batch status checks (default 30)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Callable
+
+from dotenv import load_dotenv
+
+from api_connectors_mock import get_mock_apis
+from llm_client import get_azure_client, get_async_azure_client, achat_completion, run_async
+from llm_usage import usage_ledger, usage_run
+from planning_prompts import build_plan_messages, build_step_messages, build_reflection_messages
+from research_prompts import RESEARCH_QUESTIONS, collect_research_data, build_insights_messages, build_report_messages
+
+load_dotenv()
+
+
+TERMINAL_BATCH_STATES = ("completed", "failed", "expired", "cancelled")
+
+
+def _write_json(path: str, value: Any):
+    """Write JSON atomically, so an interrupted run never leaves a truncated progress file"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(value, f, indent=2, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Optional[Any]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_jsonl(path: str, lines: List[Dict[str, Any]]):
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+
+def load_jobs(path: str) -> List[Dict[str, Any]]:
+    """Read and validate the jobs file"""
+    jobs, seen = [], set()
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            if job.get("type") not in PIPELINES:
+                raise ValueError(f"Line {number}: type must be one of {', '.join(PIPELINES)}")
+            job_id = str(job.get("id") or f"job{number}")
+            if not re.fullmatch(r"[\w.-]+", job_id) or job_id in seen:
+                raise ValueError(f"Line {number}: job id {job_id!r} must be unique and file-name safe")
+            seen.add(job_id)
+            jobs.append(dict(job, id=job_id))
+    return jobs
+
+
+# --- Pipelines ---------------------------------------------------------------
+
+class ResearchPipeline:
+    """Demo 5 research question: insights, then the client report"""
+
+    def start(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        question = RESEARCH_QUESTIONS.get(job["question"]) or {
+            "title": job.get("title") or job["question"][:60],
+            "question": job["question"],
+            "search_terms": job.get("search_terms") or [job["question"]]
+        }
+        return {"question": question, "data": collect_research_data(question, get_mock_apis())}
+
+    def next_request(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if "insights" not in state:
+            return {"stage": "insights", "call_site": "demo5.analyze_insights",
+                    "tags": {"agent": "insight_analyst"},
+                    "body": {"messages": build_insights_messages(state["data"], state["question"]),
+                             "temperature": 0.7, "max_tokens": 1500}}
+        if "report" not in state:
+            return {"stage": "report", "call_site": "demo5.generate_report",
+                    "tags": {"agent": "report_generator"},
+                    "body": {"messages": build_report_messages(state["data"], state["insights"], state["question"]),
+                             "temperature": 0.7, "max_tokens": 2500}}
+        return None
+
+    def apply(self, state: Dict[str, Any], stage: str, content: str):
+        state[stage] = content
+
+    def render(self, state: Dict[str, Any]) -> str:
+        return (f"# {state['question']['title']}\n\n**Research Question:** {state['question']['question']}\n\n"
+                f"## Insights\n\n{state['insights']}\n\n## Report\n\n{state['report']}\n")
+
+
+class PlanningPipeline:
+    """Demo 4 task: plan, then each step in order, then the reflection"""
+
+    def start(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        return {"task": job["task"], "results": []}
+
+    def next_request(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if "plan" not in state:
+            return {"stage": "plan", "call_site": "demo4.create_plan", "tags": {"agent": "planner"},
+                    "body": {"messages": build_plan_messages(state["task"]), "temperature": 0.7,
+                             "response_format": {"type": "json_object"}}}
+        steps = state["plan"]["steps"]
+        if len(state["results"]) < len(steps):
+            step = steps[len(state["results"])]
+            return {"stage": f"step_{step['step_number']}", "call_site": "demo4.execute_step",
+                    "tags": {"agent": "executor", "step": step["step_number"]},
+                    "body": {"messages": build_step_messages(step, state["task"], state["results"]),
+                             "temperature": 0.7}}
+        if "reflection" not in state:
+            return {"stage": "reflection", "call_site": "demo4.reflect_on_execution",
+                    "tags": {"agent": "reflector"},
+                    "body": {"messages": build_reflection_messages(state["task"], state["plan"], state["results"]),
+                             "temperature": 0.7}}
+        return None
+
+    def apply(self, state: Dict[str, Any], stage: str, content: str):
+        if stage == "plan":
+            plan = json.loads(content)
+            if not plan.get("steps"):
+                raise ValueError("Plan has no steps")
+            state["plan"] = plan
+        elif stage == "reflection":
+            state["reflection"] = content
+        else:
+            step = state["plan"]["steps"][len(state["results"])]
+            state["results"].append({"step_number": step["step_number"], "title": step["title"],
+                                     "result": content})
+
+    def render(self, state: Dict[str, Any]) -> str:
+        parts = [f"# Plan: {state['task']}\n", state["plan"].get("analysis", ""), ""]
+        for result in state["results"]:
+            parts += [f"## Step {result['step_number']}: {result['title']}\n", result["result"], ""]
+        parts += [f"**Success criteria:** {state['plan'].get('success_criteria', 'N/A')}\n",
+                  "## Reflection\n", state["reflection"], ""]
+        return "\n".join(parts)
+
+
+PIPELINES = {
+    "research": ResearchPipeline(),
+    "planning": PlanningPipeline()
+}
+
+
+# --- Executors ---------------------------------------------------------------
+
+def _error_line(custom_id: str, code: str, message: str) -> Dict[str, Any]:
+    return {"id": None, "custom_id": custom_id, "response": None, "error": {"code": code, "message": message}}
+
+
+class LocalExecutor:
+    """Runs a round of batch requests through the shared middleware with bounded concurrency"""
+
+    name = "local"
+
+    def __init__(self, concurrency: int = 8):
+        self.concurrency = concurrency
+
+    def prepare(self, line: Dict[str, Any]) -> Dict[str, Any]:
+        return line
+
+    def run(self, requests: List[Dict[str, Any]], on_result: Callable[[Dict[str, Any]], None],
+            input_path: str) -> bool:
+        """Run one round, calling on_result with each output line as it finishes"""
+        client = get_async_azure_client()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(request: Dict[str, Any]):
+            line = request["line"]
+            async with semaphore:
+                try:
+                    response = await achat_completion(client, request["call_site"], tags=request["tags"],
+                                                      **line["body"])
+                    result = {"id": response.id, "custom_id": line["custom_id"], "error": None,
+                              "response": {"status_code": 200, "body": response.model_dump()}}
+                except Exception as e:
+                    result = _error_line(line["custom_id"], type(e).__name__, str(e))
+            on_result(result)
+
+        async def run_all():
+            await asyncio.gather(*[one(request) for request in requests])
+
+        run_async(run_all())
+        return True
+
+
+class BatchApiExecutor:
+    """Runs a round as a Batch job (Files API upload, create, poll, download)"""
+
+    name = "batch-api"
+
+    def __init__(self, deployment: str, poll_seconds: float = 30.0):
+        self.deployment = deployment
+        self.poll_seconds = poll_seconds
+        self.client = get_azure_client()
+
+    def prepare(self, line: Dict[str, Any]) -> Dict[str, Any]:
+        # Batch requests must name the Global Batch deployment
+        return dict(line, body=dict(line["body"], model=self.deployment))
+
+    def run(self, requests: List[Dict[str, Any]], on_result: Callable[[Dict[str, Any]], None],
+            input_path: str) -> bool:
+        """Submit (or reattach to) one round's batch and wait for it; False if it didn't complete"""
+        pending_path = os.path.join(os.path.dirname(input_path), "pending_batch.json")
+        pending = _read_json(pending_path)
+        if pending is None:
+            with open(input_path, "rb") as f:
+                upload = self.client.files.create(file=(os.path.basename(input_path), f), purpose="batch")
+            batch = self.client.batches.create(
+                input_file_id=upload.id,
+                endpoint=requests[0]["line"]["url"],
+                completion_window="24h"
+            )
+            pending = {"batch_id": batch.id, "input_file_id": upload.id, "submitted_at": time.time()}
+            _write_json(pending_path, pending)
+            print(f"📤 Submitted batch {batch.id} ({len(requests)} requests)")
+        else:
+            print(f"🔁 Reattaching to batch {pending['batch_id']}")
+
+        batch = self.client.batches.retrieve(pending["batch_id"])
+        while batch.status not in TERMINAL_BATCH_STATES:
+            counts = batch.request_counts
+            done = (counts.completed + counts.failed) if counts else 0
+            print(f"⏳ Batch {batch.id}: {batch.status} ({done}/{counts.total if counts else '?'})")
+            time.sleep(self.poll_seconds)
+            batch = self.client.batches.retrieve(batch.id)
+
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                for text in self.client.files.content(file_id).text.splitlines():
+                    if text.strip():
+                        on_result(json.loads(text))
+        os.remove(pending_path)
+        if batch.status != "completed":
+            print(f"⚠️ Batch {batch.id} ended as {batch.status}; unfinished jobs resume on the next run")
+            return False
+        return True
+
+
+# --- Runner ------------------------------------------------------------------
+
+class BatchRunner:
+    """Advances every job one request per round until all are completed or failed"""
+
+    def __init__(self, out_dir: str, executor, endpoint: str = "/chat/completions", model: str = "gpt-4"):
+        self.out_dir = out_dir
+        self.run_dir = os.path.join(out_dir, "rounds")
+        self.executor = executor
+        self.endpoint = endpoint
+        self.model = model
+        os.makedirs(self.run_dir, exist_ok=True)
+
+    def job_path(self, job_id: str) -> str:
+        return os.path.join(self.out_dir, f"{job_id}.json")
+
+    def load(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Saved progress for a job (failed jobs retry their failed stage), or a fresh start"""
+        record = _read_json(self.job_path(job["id"]))
+        if record is None or record["job"] != job:
+            record = {"job": job, "status": "pending", "state": PIPELINES[job["type"]].start(job),
+                      "stages": [], "error": None}
+        elif record["status"] == "failed":
+            record.update(status="pending", error=None)
+        return record
+
+    def save(self, record: Dict[str, Any]):
+        _write_json(self.job_path(record["job"]["id"]), record)
+        if record["status"] == "completed":
+            pipeline = PIPELINES[record["job"]["type"]]
+            with open(os.path.join(self.out_dir, f"{record['job']['id']}.md"), "w", encoding="utf-8") as f:
+                f.write(pipeline.render(record["state"]))
+
+    def _advance(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Next request for a job (or mark it completed)"""
+        request = PIPELINES[record["job"]["type"]].next_request(record["state"])
+        if request is None:
+            record["status"] = "completed"
+            self.save(record)
+            return None
+        custom_id = f"{record['job']['id']}::{request['stage']}"
+        line = {"custom_id": custom_id, "method": "POST", "url": self.endpoint,
+                "body": dict(request["body"], model=self.model)}
+        return dict(request, line=line, record=record)
+
+    def _apply(self, request: Dict[str, Any], result: Dict[str, Any]):
+        record = request["record"]
+        response = result.get("response") or {}
+        error = result.get("error")
+        if not error and response.get("status_code") != 200:
+            error = {"code": str(response.get("status_code")), "message": json.dumps(response.get("body"))}
+        try:
+            if error:
+                raise RuntimeError(f"{error.get('code')}: {error.get('message')}")
+            body = response["body"]
+            PIPELINES[record["job"]["type"]].apply(record["state"], request["stage"],
+                                                   body["choices"][0]["message"]["content"])
+            record["stages"].append({"stage": request["stage"], "custom_id": request["line"]["custom_id"],
+                                     "usage": body.get("usage"), "finished_at": time.time()})
+            if self.executor.name == "batch-api":
+                # Batch calls bypass the middleware, so record them in the ledger here
+                usage_ledger.record(request["call_site"], body.get("model"), body.get("usage"),
+                                    usage_ledger.current_tags(request["tags"]))
+        except Exception as e:
+            record.update(status="failed", error=f"{request['stage']}: {str(e)}")
+        self.save(record)
+
+    def run(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Run (or resume) all jobs
+
+        Returns:
+            The final job records
+        """
+        # Research jobs collect their source data first; do that for all jobs at once
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            records = list(pool.map(self.load, jobs))
+        for record in records:
+            if record["status"] != "completed":
+                self.save(record)
+
+        round_number = 0
+        while True:
+            requests = [r for r in (self._advance(record) for record in records if record["status"] == "pending") if r]
+            if not requests:
+                break
+            round_number += 1
+            by_id = {r["line"]["custom_id"]: r for r in requests}
+            print(f"▶️  Round {round_number}: {len(requests)} request(s) via {self.executor.name}")
+
+            round_name = os.path.join(self.run_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_round{round_number:02d}")
+            _write_jsonl(round_name + "_input.jsonl", [self.executor.prepare(r["line"]) for r in requests])
+            outputs = []
+
+            def on_result(result: Dict[str, Any]):
+                outputs.append(result)
+                request = by_id.pop(result.get("custom_id"), None)
+                if request is not None:
+                    self._apply(request, result)
+
+            completed = self.executor.run(requests, on_result, round_name + "_input.jsonl")
+            _write_jsonl(round_name + "_output.jsonl", outputs)
+            # Requests without a result stay pending (a reattached batch may not cover every job);
+            # stop if the round failed or made no progress, and leave them for the next run
+            if not completed or len(by_id) == len(requests):
+                break
+
+        return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run demo5 research and demo4 planning jobs offline")
+    parser.add_argument("jobs", help="JSONL file of jobs")
+    parser.add_argument("--out", default="batch_output", help="Directory for progress and output files")
+    parser.add_argument("--executor", choices=["local", "batch-api"], default="local")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent requests (local executor)")
+    parser.add_argument("--poll-seconds", type=float, default=float(os.getenv("LLM_BATCH_POLL_SECONDS", 30)))
+    args = parser.parse_args()
+
+    if get_azure_client() is None:
+        print("⚠️ Configure AZURE_AI_ENDPOINT and AZURE_AI_API_KEY (or point them at llm_stub_server.py)")
+        sys.exit(1)
+
+    model = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
+    if args.executor == "local":
+        executor = LocalExecutor(args.concurrency)
+    else:
+        executor = BatchApiExecutor(os.getenv("LLM_BATCH_DEPLOYMENT") or model, args.poll_seconds)
+
+    runner = BatchRunner(args.out, executor, os.getenv("LLM_BATCH_ENDPOINT", "/chat/completions"), model)
+    start = time.perf_counter()
+    with usage_run("batch") as run_id:
+        records = runner.run(load_jobs(args.jobs))
+    elapsed = time.perf_counter() - start
+
+    completed = sum(1 for r in records if r["status"] == "completed")
+    print(f"\n✅ {completed}/{len(records)} jobs completed in {elapsed:.1f}s (outputs in {args.out}/)")
+    for record in records:
+        if record["status"] != "completed":
+            print(f"   ❌ {record['job']['id']}: {record['status']} {record['error'] or ''}")
+    run = usage_ledger.run(run_id)
+    print(f"🧾 This run: {run['calls']} calls, {run['total_tokens']:,} tokens (~${run['cost']:.4f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+Exact-Match LLM Response Cache
+
+This module provides a cache in front of chat completions:
+- Canonical request hashing (model, messages, temperature, tools, response_format, ...)
+- In-memory LRU tier with per-call-site TTLs
+- Optional SQLite tier shared across worker processes
+- Hit/miss counters plus the tokens and seconds saved by hits
+
+Repeated questions (example buttons, pre-configured research questions,
+scenario buttons) are answered from the cache instead of the model.
+
+Configuration via .env:
+- LLM_CACHE_ENABLED (default true)
+- LLM_CACHE_MAX_ENTRIES (default 512)
+- LLM_CACHE_TTL default TTL in seconds (default 3600)
+- LLM_CACHE_SQLITE_PATH (unset = memory only)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable
+
+from dotenv import load_dotenv
+from openai.types.chat import ChatCompletion
+
+load_dotenv()
+
+
+# Fields that change the completion and therefore belong in the cache key
+KEY_FIELDS = (
+    "model", "messages", "temperature", "top_p", "max_tokens",
+    "tools", "tool_choice", "response_format", "seed", "stop"
+)
+
+# Per-call-site TTLs in seconds (anything not listed uses LLM_CACHE_TTL)
+CALL_SITE_TTLS = {
+    "app.get_agent_response": 3600,
+    "agents_demo.get_agent_response": 3600,
+    "demo1.run_agent_with_tools": 900,        # Tool results (weather) go stale
+    "demo2.answer_with_rag": 6 * 3600,        # Grounded in a static knowledge base
+    "demo3.call_agent": 6 * 3600,
+    "demo4.create_plan": 24 * 3600,
+    "demo4.execute_step": 24 * 3600,
+    "demo4.reflect_on_execution": 24 * 3600,
+    "demo5.analyze_insights": 6 * 3600,
+    "demo5.generate_report": 6 * 3600,
+}
+
+
+def _env_flag(name: str, default: str = "true") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def canonical_request(request: Dict[str, Any]) -> str:
+    """
+    Serialize the cache-relevant parts of a request deterministically
+
+    Args:
+        request: Keyword arguments for chat.completions.create
+
+    Returns:
+        Canonical JSON string (sorted keys, no whitespace)
+    """
+    relevant = {k: request[k] for k in KEY_FIELDS if request.get(k) is not None}
+    return json.dumps(relevant, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    """
+    Hash a request into a cache key
+
+    Args:
+        request: Keyword arguments for chat.completions.create
+
+    Returns:
+        SHA-256 hex digest of the canonical request
+    """
+    return hashlib.sha256(canonical_request(request).encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """In-memory LRU cache with per-entry expiry"""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheStore:
+    """SQLite-backed cache tier that several worker processes can share"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    call_site TEXT,
+                    expires_at REAL NOT NULL
+                )"""
+            )
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[tuple]:
+        """Return (value, expires_at) or None if missing or expired"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float, call_site: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, call_site, expires_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), call_site, time.time() + ttl)
+            )
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        """Delete expired rows and return how many were removed"""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+
+class ResponseCache:
+    """Two-tier (memory + optional SQLite) cache for chat completion responses"""
+
+    def __init__(self, max_entries: int = 512, default_ttl: float = 3600,
+                 sqlite_path: Optional[str] = None, enabled: bool = True):
+        self.enabled = enabled
+        self.default_ttl = default_ttl
+        self.memory = LRUCache(max_entries)
+        self.disk = SQLiteCacheStore(sqlite_path) if sqlite_path else None
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def ttl_for(self, call_site: str) -> float:
+        return CALL_SITE_TTLS.get(call_site, self.default_ttl)
+
+    def _count(self, call_site: str, field: str, amount: float = 1):
+        with self._lock:
+            site = self._stats.setdefault(call_site, {
+                "hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0,
+                "tokens_saved": 0, "seconds_saved": 0.0
+            })
+            site[field] += amount
+
+    def lookup(self, call_site: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached entry, promoting disk hits into memory
+
+        Returns:
+            Cached entry ({"response": ..., "latency": ...}) or None on a miss
+        """
+        entry = self.memory.get(key)
+        tier = "memory_hits"
+        if entry is None and self.disk is not None:
+            found = self.disk.get(key)
+            if found is not None:
+                entry, expires_at = found
+                self.memory.set(key, entry, max(expires_at - time.time(), 0))
+                tier = "disk_hits"
+
+        if entry is None:
+            self._count(call_site, "misses")
+            return None
+
+        self._count(call_site, "hits")
+        self._count(call_site, tier)
+        usage = entry["response"].get("usage") or {}
+        self._count(call_site, "tokens_saved", usage.get("total_tokens") or 0)
+        self._count(call_site, "seconds_saved", entry.get("latency", 0.0))
+        return entry
+
+    def store(self, call_site: str, key: str, response: Dict[str, Any], latency: float):
+        """Store a serialized response under both tiers"""
+        entry = {"response": response, "latency": latency}
+        ttl = self.ttl_for(call_site)
+        self.memory.set(key, entry, ttl)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, entry, ttl, call_site)
+            except sqlite3.Error as e:
+                print(f"⚠️ LLM cache write failed: {str(e)}")
+
+    def cached_call(self, call_site: str, request: Dict[str, Any], call: Callable[[], Any]):
+        """
+        Return a cached response for the request, or make the call and cache it
+
+        Args:
+            call_site: Name of the calling function (selects the TTL)
+            request: Keyword arguments for chat.completions.create
+            call: Zero-argument function that performs the real request
+
+        Returns:
+            ChatCompletion (fresh or rebuilt from the cache)
+        """
+        if not self.is_cacheable(request):
+            return call()
+
+        key = request_key(request)
+        entry = self.lookup(call_site, key)
+        if entry is not None:
+            return _to_completion(entry["response"])
+
+        start = time.perf_counter()
+        response = call()
+        self._store_if_complete(call_site, key, response, time.perf_counter() - start)
+        return response
+
+    async def acached_call(self, call_site: str, request: Dict[str, Any], call: Callable[[], Any]):
+        """Async variant of cached_call (call returns an awaitable)"""
+        if not self.is_cacheable(request):
+            return await call()
+
+        key = request_key(request)
+        entry = self.lookup(call_site, key)
+        if entry is not None:
+            return _to_completion(entry["response"])
+
+        start = time.perf_counter()
+        response = await call()
+        self._store_if_complete(call_site, key, response, time.perf_counter() - start)
+        return response
+
+    def is_cacheable(self, request: Dict[str, Any]) -> bool:
+        return self.enabled and not request.get("stream")
+
+    def _store_if_complete(self, call_site: str, key: str, response, latency: float):
+        # Don't cache truncated or filtered completions
+        if not response.choices or response.choices[0].finish_reason not in ("stop", "tool_calls"):
+            return
+        self.store(call_site, key, response.model_dump(mode="json"), latency)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get hit/miss counters overall and per call site
+
+        Returns:
+            Dictionary with totals, hit rate, savings and per-call-site breakdown
+        """
+        with self._lock:
+            per_site = {site: dict(values) for site, values in self._stats.items()}
+        totals = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0,
+                  "tokens_saved": 0, "seconds_saved": 0.0}
+        for values in per_site.values():
+            for field in totals:
+                totals[field] += values[field]
+        lookups = totals["hits"] + totals["misses"]
+        totals["hit_rate"] = (totals["hits"] / lookups) if lookups else 0.0
+        totals["entries"] = len(self.memory)
+        totals["evictions"] = self.memory.evictions
+        totals["by_call_site"] = per_site
+        return totals
+
+    def clear(self):
+        """Drop all cached entries (both tiers) and reset counters"""
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+        with self._lock:
+            self._stats.clear()
+
+
+def _to_completion(data: Dict[str, Any]) -> ChatCompletion:
+    return ChatCompletion.model_validate(data)
+
+
+# Process-wide cache shared by all demos
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", 512)),
+    default_ttl=float(os.getenv("LLM_CACHE_TTL", 3600)),
+    sqlite_path=os.getenv("LLM_CACHE_SQLITE_PATH") or None,
+    enabled=_env_flag("LLM_CACHE_ENABLED")
+)
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Get hit/miss counters for the shared response cache"""
+    return response_cache.stats()
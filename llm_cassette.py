@@ -0,0 +1,319 @@
+"""
+Record/Replay Transport for LLM calls (cassette files)
+
+This module plugs into the shared clients' HTTP layer (see llm_client.py):
+- record: every chat completion request/response is appended to a JSONL cassette,
+  including tool calls and streamed (SSE) chunks with their timing
+- replay: responses are served back from the cassette without a live endpoint,
+  deterministically and in recorded order for repeated identical requests
+- Optional original-latency emulation (time to headers and between chunks)
+
+Because it sits below the middleware, replays still go through caching, rate
+limiting, usage accounting and metrics, so demo3/demo4/demo5 orchestration
+overhead can be timed in isolation from the model. Disable LLM_CACHE_ENABLED
+when benchmarking, or repeated requests will be served from the response cache.
+
+Configuration via .env:
+- LLM_CASSETTE_MODE off | record | replay (default off)
+- LLM_CASSETTE_PATH (default cassettes/llm_calls.jsonl)
+- LLM_CASSETTE_REPLAY_LATENCY replay with the recorded latency (default false)
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from llm_cache import request_key
+
+load_dotenv()
+
+
+MODES = ("off", "record", "replay")
+
+
+def cassette_key(body: Dict[str, Any]) -> str:
+    """Key a request by its canonical cache key (streamed and non-streamed differ in shape)"""
+    return request_key(body) + ("|stream" if body.get("stream") else "")
+
+
+def _parse_body(request: httpx.Request) -> Dict[str, Any]:
+    try:
+        return json.loads(request.content or b"{}")
+    except ValueError:
+        return {}
+
+
+class Cassette:
+    """JSONL file of recorded request/response exchanges"""
+
+    def __init__(self, path: str, mode: str = "off", replay_latency: bool = False):
+        if mode not in MODES:
+            raise ValueError(f"LLM_CASSETTE_MODE must be one of {', '.join(MODES)}, got {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._positions: Dict[str, int] = defaultdict(int)
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        if mode == "replay":
+            self.load()
+
+    def load(self):
+        """Index the cassette by request key (entries keep their recorded order)"""
+        self._entries.clear()
+        self._positions.clear()
+        if not os.path.exists(self.path):
+            print(f"⚠️ Cassette not found: {self.path}")
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+
+    def append(self, entry: Dict[str, Any]):
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._entries[entry["key"]].append(entry)
+            self.recorded += 1
+
+    def next_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """Next recorded exchange for a key (the last one repeats once exhausted)"""
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+                return None
+            position = self._positions[key]
+            self._positions[key] = position + 1
+            self.replayed += 1
+            return entries[min(position, len(entries) - 1)]
+
+    def rewind(self):
+        """Start replaying every key from its first recording again"""
+        with self._lock:
+            self._positions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "path": self.path,
+                "entries": sum(len(e) for e in self._entries.values()),
+                "recorded": self.recorded,
+                "replayed": self.replayed,
+                "misses": self.misses
+            }
+
+    # --- Building exchanges -----------------------------------------------
+
+    def new_entry(self, request: httpx.Request, response: httpx.Response, ttfb: float) -> Dict[str, Any]:
+        body = _parse_body(request)
+        return {
+            "key": cassette_key(body),
+            "recorded_at": time.time(),
+            "method": request.method,
+            "path": request.url.path,
+            "request": body,
+            "status": response.status_code,
+            "headers": [[k, v] for k, v in response.headers.items()],
+            "ttfb": ttfb,
+            "chunks": []
+        }
+
+    def miss_response(self, request: httpx.Request) -> httpx.Response:
+        # A 404 surfaces as a non-retryable API error instead of a connection retry loop
+        body = json.dumps({"error": {
+            "code": "cassette_miss",
+            "message": f"No cassette entry for this request in {self.path} (record it first)"
+        }})
+        return httpx.Response(404, headers={"content-type": "application/json"},
+                              content=body.encode("utf-8"), request=request)
+
+    def replay_response(self, request: httpx.Request, entry: Dict[str, Any], stream) -> httpx.Response:
+        return httpx.Response(entry["status"], headers=entry["headers"], stream=stream, request=request)
+
+
+def _decode(chunk: bytes) -> str:
+    # latin-1 maps bytes 1:1, so chunks split mid-character survive the JSON round trip
+    return chunk.decode("latin-1")
+
+
+def _encode(text: str) -> bytes:
+    return text.encode("latin-1")
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    """Passes response bytes through while recording them with their timing"""
+
+    def __init__(self, inner, cassette: Cassette, entry: Dict[str, Any]):
+        self._inner = inner
+        self._cassette = cassette
+        self._entry = entry
+        self._start = time.perf_counter()
+        self._saved = False
+
+    def __iter__(self):
+        for chunk in self._inner:
+            self._entry["chunks"].append([time.perf_counter() - self._start, _decode(chunk)])
+            yield chunk
+
+    def close(self):
+        self._inner.close()
+        if not self._saved:
+            self._saved = True
+            self._entry["latency"] = self._entry["ttfb"] + time.perf_counter() - self._start
+            self._cassette.append(self._entry)
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    """Async variant of _RecordingStream"""
+
+    def __init__(self, inner, cassette: Cassette, entry: Dict[str, Any]):
+        self._inner = inner
+        self._cassette = cassette
+        self._entry = entry
+        self._start = time.perf_counter()
+        self._saved = False
+
+    async def __aiter__(self):
+        async for chunk in self._inner:
+            self._entry["chunks"].append([time.perf_counter() - self._start, _decode(chunk)])
+            yield chunk
+
+    async def aclose(self):
+        await self._inner.aclose()
+        if not self._saved:
+            self._saved = True
+            self._entry["latency"] = self._entry["ttfb"] + time.perf_counter() - self._start
+            self._cassette.append(self._entry)
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    """Yields recorded chunks, optionally at their recorded offsets"""
+
+    def __init__(self, chunks: List[list], emulate_latency: bool):
+        self._chunks = chunks
+        self._emulate = emulate_latency
+
+    def __iter__(self):
+        start = time.perf_counter()
+        for offset, text in self._chunks:
+            if self._emulate:
+                time.sleep(max(0.0, offset - (time.perf_counter() - start)))
+            yield _encode(text)
+
+
+class _AsyncReplayStream(httpx.AsyncByteStream):
+    """Async variant of _ReplayStream"""
+
+    def __init__(self, chunks: List[list], emulate_latency: bool):
+        self._chunks = chunks
+        self._emulate = emulate_latency
+
+    async def __aiter__(self):
+        start = time.perf_counter()
+        for offset, text in self._chunks:
+            if self._emulate:
+                await asyncio.sleep(max(0.0, offset - (time.perf_counter() - start)))
+            yield _encode(text)
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """httpx transport that records to or replays from a cassette"""
+
+    def __init__(self, cassette: Cassette, inner: Optional[httpx.BaseTransport] = None):
+        self.cassette = cassette
+        self.inner = inner
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if self.cassette.mode == "replay":
+            entry = self.cassette.next_entry(cassette_key(_parse_body(request)))
+            if entry is None:
+                return self.cassette.miss_response(request)
+            if self.cassette.replay_latency:
+                time.sleep(entry["ttfb"])
+            stream = _ReplayStream(entry["chunks"], self.cassette.replay_latency)
+            return self.cassette.replay_response(request, entry, stream)
+
+        # Uncompressed bodies keep the cassette readable
+        request.headers["Accept-Encoding"] = "identity"
+        start = time.perf_counter()
+        response = self.inner.handle_request(request)
+        entry = self.cassette.new_entry(request, response, time.perf_counter() - start)
+        response.stream = _RecordingStream(response.stream, self.cassette, entry)
+        return response
+
+    def close(self):
+        if self.inner is not None:
+            self.inner.close()
+
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """Async variant of CassetteTransport"""
+
+    def __init__(self, cassette: Cassette, inner: Optional[httpx.AsyncBaseTransport] = None):
+        self.cassette = cassette
+        self.inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self.cassette.mode == "replay":
+            entry = self.cassette.next_entry(cassette_key(_parse_body(request)))
+            if entry is None:
+                return self.cassette.miss_response(request)
+            if self.cassette.replay_latency:
+                await asyncio.sleep(entry["ttfb"])
+            stream = _AsyncReplayStream(entry["chunks"], self.cassette.replay_latency)
+            return self.cassette.replay_response(request, entry, stream)
+
+        request.headers["Accept-Encoding"] = "identity"
+        start = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        entry = self.cassette.new_entry(request, response, time.perf_counter() - start)
+        response.stream = _AsyncRecordingStream(response.stream, self.cassette, entry)
+        return response
+
+    async def aclose(self):
+        if self.inner is not None:
+            await self.inner.aclose()
+
+
+# Process-wide cassette shared by all demos
+cassette = Cassette(
+    path=os.getenv("LLM_CASSETTE_PATH", "cassettes/llm_calls.jsonl"),
+    mode=os.getenv("LLM_CASSETTE_MODE", "off").strip().lower(),
+    replay_latency=os.getenv("LLM_CASSETTE_REPLAY_LATENCY", "false").strip().lower() in ("1", "true", "yes", "on")
+)
+
+
+def cassette_transport(limits: httpx.Limits) -> Optional[httpx.BaseTransport]:
+    """Transport for the shared sync client (None when cassettes are off)"""
+    if cassette.mode == "off":
+        return None
+    return CassetteTransport(cassette, httpx.HTTPTransport(limits=limits))
+
+
+def async_cassette_transport(limits: httpx.Limits) -> Optional[httpx.AsyncBaseTransport]:
+    """Transport for the shared async client (None when cassettes are off)"""
+    if cassette.mode == "off":
+        return None
+    return AsyncCassetteTransport(cassette, httpx.AsyncHTTPTransport(limits=limits))
+
+
+def get_cassette_stats() -> Dict[str, Any]:
+    """Get record/replay counters for the shared cassette"""
+    return cassette.stats()
@@ -0,0 +1,626 @@
+"""
+Shared LLM Client Provider for all demos
+
+This module provides a single, process-wide Azure OpenAI client that every
+demo imports instead of building its own:
+- One client per endpoint configuration, reused across Streamlit reruns and sessions
+- Keep-alive HTTP connection pooling with tunable limits
+- Connection reuse statistics (new vs reused connections)
+- An async client plus run_async(), a bridge that runs coroutines from
+  Streamlit script code so independent LLM calls can overlap
+- chat_completion()/achat_completion(), the single entry point every demo
+  uses for chat completions (adds response caching, see llm_cache.py)
+- stream_chat_completion(), a streamed variant that records time-to-first-token
+  and tokens/sec (see llm_metrics.py)
+- Client-side rate limiting and 429-aware retries on every uncached call
+  (see llm_rate_limit.py; the SDK's own retries are disabled so they don't stack)
+- Token usage recorded per call, with optional per-run budgets (see llm_usage.py)
+- Optional record/replay of all HTTP exchanges to a cassette (see llm_cassette.py)
+- Concurrent identical requests share one upstream call, streamed or not
+  (see llm_single_flight.py)
+- Optional latency-aware routing with failover across several deployments
+  (see llm_router.py; replaces the single shared rate limiter when enabled)
+- Optional hedging of slow requests on selected call sites (see llm_hedge.py)
+
+Streamlit re-executes the demo script on every interaction, but imported
+modules stay loaded, so the client (and its open connections) survives reruns.
+
+Pool limits can be tuned via .env:
+- LLM_MAX_CONNECTIONS (default 20)
+- LLM_MAX_KEEPALIVE_CONNECTIONS (default 10)
+- LLM_KEEPALIVE_EXPIRY seconds (default 120)
+"""
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+import weakref
+from typing import Dict, Any, Optional, Callable, Iterator
+
+import httpx
+from dotenv import load_dotenv
+from openai import (
+    AzureOpenAI, OpenAI, AsyncAzureOpenAI, AsyncOpenAI,
+    DefaultHttpxClient, DefaultAsyncHttpxClient
+)
+
+from llm_cache import response_cache, request_key
+from llm_cassette import cassette, cassette_transport, async_cassette_transport
+from llm_hedge import hedger
+from llm_metrics import latency_metrics
+from llm_rate_limit import rate_limiter, estimate_prompt_tokens
+from llm_router import router
+from llm_single_flight import single_flight
+from llm_usage import usage_ledger
+
+load_dotenv()
+
+
+DEFAULT_API_VERSION = "2024-02-15-preview"
+
+# Placeholder endpoint so cassette replays work without Azure credentials
+REPLAY_ENDPOINT = "https://replay.cognitiveservices.invalid/openai/v1/"
+
+_lock = threading.Lock()
+_clients: Dict[tuple, Any] = {}
+_pool_config: Dict[str, float] = {}
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+class ConnectionStats:
+    """Counts requests and whether each one opened or reused a connection"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen_streams = weakref.WeakSet()
+        self.clients_created = 0
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+
+    def record_response(self, response: httpx.Response):
+        """Classify a response by the network stream (socket) it was served on"""
+        stream = response.extensions.get("network_stream")
+        with self._lock:
+            self.requests += 1
+            if stream is None:
+                return
+            try:
+                if stream in self._seen_streams:
+                    self.reused_connections += 1
+                else:
+                    self._seen_streams.add(stream)
+                    self.new_connections += 1
+            except TypeError:
+                # Stream type doesn't support weak references - count as new
+                self.new_connections += 1
+
+    async def record_async_response(self, response: httpx.Response):
+        """Async event hook variant of record_response"""
+        self.record_response(response)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a copy of the counters plus the reuse ratio"""
+        with self._lock:
+            classified = self.new_connections + self.reused_connections
+            return {
+                "clients_created": self.clients_created,
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": self.reused_connections,
+                "reuse_ratio": (self.reused_connections / classified) if classified else 0.0,
+                "pool_limits": get_pool_config()
+            }
+
+    def reset(self):
+        """Zero all counters"""
+        with self._lock:
+            self._seen_streams = weakref.WeakSet()
+            self.clients_created = 0
+            self.requests = 0
+            self.new_connections = 0
+            self.reused_connections = 0
+
+
+connection_stats = ConnectionStats()
+
+
+def get_pool_config() -> Dict[str, float]:
+    """
+    Get the effective connection pool limits
+
+    Returns:
+        Dictionary with max_connections, max_keepalive_connections, keepalive_expiry
+    """
+    return {
+        "max_connections": int(_pool_config.get(
+            "max_connections", os.getenv("LLM_MAX_CONNECTIONS", 20))),
+        "max_keepalive_connections": int(_pool_config.get(
+            "max_keepalive_connections", os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 10))),
+        "keepalive_expiry": float(_pool_config.get(
+            "keepalive_expiry", os.getenv("LLM_KEEPALIVE_EXPIRY", 120)))
+    }
+
+
+def configure_pool(max_connections: Optional[int] = None,
+                   max_keepalive_connections: Optional[int] = None,
+                   keepalive_expiry: Optional[float] = None):
+    """
+    Override pool limits at runtime (takes precedence over .env)
+
+    Existing clients are closed so the next call picks up the new limits.
+
+    Args:
+        max_connections: Maximum concurrent connections per client
+        max_keepalive_connections: Idle connections kept open for reuse
+        keepalive_expiry: Seconds an idle connection stays open
+    """
+    overrides = {
+        "max_connections": max_connections,
+        "max_keepalive_connections": max_keepalive_connections,
+        "keepalive_expiry": keepalive_expiry
+    }
+    with _lock:
+        _pool_config.update({k: v for k, v in overrides.items() if v is not None})
+    close_clients()
+
+
+def _build_limits() -> httpx.Limits:
+    config = get_pool_config()
+    return httpx.Limits(
+        max_connections=config["max_connections"],
+        max_keepalive_connections=config["max_keepalive_connections"],
+        keepalive_expiry=config["keepalive_expiry"]
+    )
+
+
+def _read_settings() -> Optional[tuple]:
+    """Read endpoint settings from the environment, or None if not configured"""
+    api_key = os.getenv("AZURE_AI_API_KEY")
+    endpoint = os.getenv("AZURE_AI_ENDPOINT")
+
+    if (not endpoint or not api_key) and cassette.mode == "replay":
+        return (REPLAY_ENDPOINT, "replay", DEFAULT_API_VERSION)
+    if not endpoint or not api_key:
+        return None
+
+    api_version = os.getenv("AZURE_OPENAI_API_VERSION", DEFAULT_API_VERSION)
+    return (endpoint, api_key, api_version)
+
+
+def _create_client(endpoint: str, api_key: str, api_version: str):
+    http_client = DefaultHttpxClient(
+        limits=_build_limits(),
+        transport=cassette_transport(_build_limits()),
+        event_hooks={"response": [connection_stats.record_response]}
+    )
+
+    # Check if using Cognitive Services endpoint (contains 'cognitiveservices')
+    if 'cognitiveservices' in endpoint:
+        # Use OpenAI client with base_url for Cognitive Services endpoints
+        return OpenAI(base_url=endpoint, api_key=api_key, http_client=http_client, max_retries=0)
+
+    # Use AzureOpenAI client for standard Azure OpenAI endpoints
+    return AzureOpenAI(
+        api_key=api_key,
+        api_version=api_version,
+        azure_endpoint=endpoint,
+        http_client=http_client,
+        max_retries=0
+    )
+
+
+def _create_async_client(endpoint: str, api_key: str, api_version: str):
+    http_client = DefaultAsyncHttpxClient(
+        limits=_build_limits(),
+        transport=async_cassette_transport(_build_limits()),
+        event_hooks={"response": [connection_stats.record_async_response]}
+    )
+
+    if 'cognitiveservices' in endpoint:
+        return AsyncOpenAI(base_url=endpoint, api_key=api_key, http_client=http_client, max_retries=0)
+
+    return AsyncAzureOpenAI(
+        api_key=api_key,
+        api_version=api_version,
+        azure_endpoint=endpoint,
+        http_client=http_client,
+        max_retries=0
+    )
+
+
+def _get_client(kind: str, settings: tuple):
+    """Get (creating once) the pooled "sync" or "async" client for (endpoint, api_key, api_version)"""
+    key = (kind,) + settings
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            factory = _create_client if kind == "sync" else _create_async_client
+            client = factory(*settings)
+            _clients[key] = client
+            connection_stats.clients_created += 1
+    return client
+
+
+def _default_settings() -> Optional[tuple]:
+    """Endpoint settings from .env, else the first routed deployment's"""
+    settings = _read_settings()
+    if settings is None and router.enabled:
+        return router.backends[0].settings
+    return settings
+
+
+def get_azure_client():
+    """
+    Get the shared Azure OpenAI client
+
+    The client is created once per endpoint configuration and then reused,
+    so keep-alive connections carry over between requests, reruns and sessions.
+
+    Returns:
+        OpenAI/AzureOpenAI client, or None if credentials are not configured
+    """
+    settings = _default_settings()
+    if settings is None:
+        return None
+    return _get_client("sync", settings)
+
+
+def get_async_azure_client():
+    """
+    Get the shared async Azure OpenAI client
+
+    The async client's connections belong to the background event loop used
+    by run_async(), so only await it from coroutines passed to run_async().
+
+    Returns:
+        AsyncOpenAI/AsyncAzureOpenAI client, or None if credentials are not configured
+    """
+    settings = _default_settings()
+    if settings is None:
+        return None
+    return _get_client("async", settings)
+
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    """Start (once) the background event loop shared by all async LLM calls"""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever,
+                name="llm-event-loop",
+                daemon=True
+            ).start()
+        return _loop
+
+
+def run_async(coro, timeout: Optional[float] = None):
+    """
+    Run a coroutine from synchronous (Streamlit script) code
+
+    Coroutines run on one long-lived background event loop, so the async
+    client and its keep-alive connections are reused across reruns. Use
+    asyncio.gather() inside the coroutine to overlap independent LLM calls.
+
+    Args:
+        coro: Coroutine to run
+        timeout: Seconds to wait for the result (None waits forever)
+
+    Returns:
+        The coroutine's result
+    """
+    # Carry the caller's usage run/tags over to the loop thread
+    bound = usage_ledger.bind(coro, usage_ledger.current_tags())
+    future = asyncio.run_coroutine_threadsafe(bound, _get_event_loop())
+    return future.result(timeout)
+
+
+def close_clients():
+    """Close all pooled clients and their connections"""
+    with _lock:
+        clients = list(_clients.items())
+        _clients.clear()
+    for key, client in clients:
+        try:
+            if key[0] == "async":
+                if _loop is not None:
+                    asyncio.run_coroutine_threadsafe(client.close(), _loop).result(10)
+            else:
+                client.close()
+        except Exception as e:
+            print(f"⚠️ Failed to close LLM client: {str(e)}")
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """
+    Get connection reuse statistics for the shared clients
+
+    Returns:
+        Dictionary with request count, new/reused connections and reuse ratio
+    """
+    return connection_stats.snapshot()
+
+
+def _token_metrics(usage) -> Dict[str, Optional[int]]:
+    """Token counts from response.usage for latency_metrics.record (incl. prefix-cached prompt tokens)"""
+    if usage is None:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "completion_tokens": usage.completion_tokens,
+        "prompt_tokens": usage.prompt_tokens,
+        "cached_prompt_tokens": getattr(details, "cached_tokens", None) or 0
+    }
+
+
+def chat_completion(client, call_site: str = "default", tags: Optional[Dict[str, Any]] = None, **request):
+    """
+    Create a chat completion through the shared middleware
+
+    Args:
+        client: Client from get_azure_client()
+        call_site: Name of the calling function, e.g. "demo2.answer_with_rag"
+        tags: Usage ledger tags for this call, e.g. {"agent": "researcher"} or {"step": 2}
+        **request: Keyword arguments for chat.completions.create
+
+    Returns:
+        ChatCompletion (possibly served from the response cache)
+
+    Raises:
+        BudgetExceededError: If the current usage run is over budget (cache hits still succeed)
+    """
+    usage_tags = usage_ledger.current_tags(tags)
+
+    def call(target, model):
+        start = time.perf_counter()
+        response = target.chat.completions.create(**dict(request, model=model))
+        latency_metrics.record(call_site, time.perf_counter() - start,
+                               **_token_metrics(getattr(response, "usage", None)))
+        usage_ledger.record(call_site, model, response.usage, usage_tags)
+        return response
+
+    def send():
+        if hedger.enabled_for(call_site):
+            # Hedged attempts run on the shared event loop, where the losing request can be cancelled
+            return run_async(hedger.acall(
+                call_site, lambda: _asend(get_async_azure_client(), call_site, request, usage_tags)))
+        if router.enabled:
+            return router.call(request, lambda backend: call(_get_client("sync", backend.settings),
+                                                             backend.deployment))
+        return rate_limiter.call(request, lambda: call(client, request.get("model")))
+
+    def limited_call():
+        usage_ledger.check_budget(usage_tags.get("run_id"))
+        # Identical requests already in flight (e.g. from other sessions) wait for that call
+        return single_flight.call(call_site, request_key(request), send)
+
+    return response_cache.cached_call(call_site, request, limited_call)
+
+
+def _asend(client, call_site: str, request: Dict[str, Any], usage_tags: Dict[str, Any]):
+    """One upstream attempt on the async client (routed or rate limited), recording latency and usage"""
+    async def call(target, model):
+        start = time.perf_counter()
+        response = await target.chat.completions.create(**dict(request, model=model))
+        latency_metrics.record(call_site, time.perf_counter() - start,
+                               **_token_metrics(getattr(response, "usage", None)))
+        usage_ledger.record(call_site, model, response.usage, usage_tags)
+        return response
+
+    if router.enabled:
+        return router.acall(request, lambda backend: call(_get_client("async", backend.settings),
+                                                          backend.deployment))
+    return rate_limiter.acall(request, lambda: call(client, request.get("model")))
+
+
+async def achat_completion(client, call_site: str = "default", tags: Optional[Dict[str, Any]] = None, **request):
+    """Async variant of chat_completion (takes the async client)"""
+    usage_tags = usage_ledger.current_tags(tags)
+
+    async def limited_call():
+        usage_ledger.check_budget(usage_tags.get("run_id"))
+        return await single_flight.acall(
+            call_site, request_key(request),
+            lambda: hedger.acall(call_site, lambda: _asend(client, call_site, request, usage_tags))
+        )
+
+    return await response_cache.acached_call(call_site, request, limited_call)
+
+
+class CompletionStream:
+    """
+    Iterable of text deltas from a streamed chat completion
+
+    Iterate it (e.g. with st.write_stream) to render tokens as they arrive;
+    the full text is in .text afterwards. Time-to-first-token, total latency
+    and tokens/sec are recorded in llm_metrics when the stream finishes.
+    """
+
+    def __init__(self, call_site: str, open_stream: Optional[Callable[[], Iterator]] = None,
+                 cached_text: Optional[str] = None,
+                 on_complete: Optional[Callable[["CompletionStream"], None]] = None,
+                 on_finish: Optional[Callable[["CompletionStream"], None]] = None,
+                 error_message: str = "Error: {error}"):
+        self.call_site = call_site
+        self.text = ""
+        self.finish_reason = None
+        self.ttft = None
+        self.latency = None
+        self.completion_tokens = None
+        self.usage = None
+        self.error = None
+        self.cached = cached_text is not None
+        self._open_stream = open_stream
+        self._cached_text = cached_text
+        self._on_complete = on_complete
+        self._on_finish = on_finish
+        self._error_message = error_message
+        self._started = False
+
+    def __iter__(self) -> Iterator[str]:
+        if self._started:
+            return
+        self._started = True
+        start = time.perf_counter()
+
+        if self.cached:
+            self.text = self._cached_text
+            self.ttft = self.latency = time.perf_counter() - start
+            latency_metrics.record(self.call_site, self.latency, ttft=self.ttft,
+                                   streamed=True, cached=True)
+            yield self.text
+            if self._on_complete:
+                self._on_complete(self)
+            return
+
+        parts = []
+        content_chunks = 0
+        try:
+            for chunk in self._open_stream():
+                if getattr(chunk, "usage", None):
+                    self.usage = chunk.usage
+                    self.completion_tokens = chunk.usage.completion_tokens
+                # Azure sends a first chunk with no choices (content filter results)
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                if choice.finish_reason:
+                    self.finish_reason = choice.finish_reason
+                delta = choice.delta.content if choice.delta else None
+                if delta:
+                    if self.ttft is None:
+                        self.ttft = time.perf_counter() - start
+                    content_chunks += 1
+                    parts.append(delta)
+                    yield delta
+        except Exception as e:
+            self.error = e
+            message = self._error_message.format(error=str(e))
+            parts.append(message)
+            self.text = "".join(parts)
+            yield message
+            return
+
+        self.text = "".join(parts)
+        self.latency = time.perf_counter() - start
+        if self.completion_tokens is None:
+            # Without usage in the stream, each content chunk is ~1 token
+            self.completion_tokens = content_chunks
+        tokens = dict(_token_metrics(self.usage), completion_tokens=self.completion_tokens)
+        latency_metrics.record(self.call_site, self.latency, ttft=self.ttft, streamed=True, **tokens)
+        if self._on_finish:
+            self._on_finish(self)
+
+        if self._on_complete and self.finish_reason in (None, "stop"):
+            self._on_complete(self)
+
+    def read(self) -> str:
+        """Consume the rest of the stream (if not already) and return the full text"""
+        for _ in self:
+            pass
+        return self.text
+
+    def as_completion(self, model: str) -> Dict[str, Any]:
+        """Serialize the finished stream as a ChatCompletion dictionary (for caching)"""
+        return {
+            "id": f"stream-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": self.finish_reason or "stop",
+                "message": {"role": "assistant", "content": self.text}
+            }],
+            "usage": None
+        }
+
+
+def stream_chat_completion(client, call_site: str = "default",
+                           on_complete: Optional[Callable[[str], None]] = None,
+                           error_message: str = "Error: {error}",
+                           tags: Optional[Dict[str, Any]] = None, **request) -> CompletionStream:
+    """
+    Create a streamed chat completion through the shared middleware
+
+    Cache hits are replayed as a single chunk; finished streams are stored
+    in the response cache under the same key as the non-streamed request.
+
+    Args:
+        client: Client from get_azure_client()
+        call_site: Name of the calling function
+        on_complete: Called with the full text once the stream finishes successfully
+        error_message: Text yielded if the request fails ("{error}" is replaced)
+        tags: Usage ledger tags for this call (see chat_completion)
+        **request: Keyword arguments for chat.completions.create
+
+    Returns:
+        CompletionStream to iterate (e.g. st.write_stream(stream))
+    """
+    request = dict(request, stream=True)
+    key = request_key(request)
+    usage_tags = usage_ledger.current_tags(tags)
+
+    if response_cache.enabled:
+        entry = response_cache.lookup(call_site, key)
+        content = entry["response"]["choices"][0]["message"].get("content") if entry else None
+        if content is not None:
+            return CompletionStream(
+                call_site, cached_text=content,
+                on_complete=(lambda stream: on_complete(stream.text)) if on_complete else None
+            )
+
+    flight = {"leader": True}
+
+    def open_upstream():
+        if router.enabled:
+            # Only the time to open the stream is measured here, so it isn't fed to the latency EWMA
+            return router.call(
+                request,
+                lambda backend: _get_client("sync", backend.settings).chat.completions.create(
+                    **dict(request, model=backend.deployment)),
+                track_latency=False
+            )
+        return rate_limiter.call(request, lambda: client.chat.completions.create(**request))
+
+    def open_stream():
+        usage_ledger.check_budget(usage_tags.get("run_id"))
+        # Admission and retries cover opening the stream (429s arrive before any chunk);
+        # identical streams already in flight are joined instead of opened again
+        chunks, flight["leader"] = single_flight.stream(
+            call_site, key, lambda: hedger.stream(call_site, open_upstream))
+        return chunks
+
+    def store(stream: CompletionStream):
+        if flight["leader"]:
+            response_cache.store(call_site, key, stream.as_completion(request["model"]), stream.latency)
+        if on_complete:
+            on_complete(stream.text)
+
+    def record_usage(stream: CompletionStream):
+        if not flight["leader"]:
+            # The session that opened the stream pays for it
+            return
+        usage = stream.usage
+        if usage is None:
+            # Most deployments don't send usage on streams; estimate it instead
+            prompt_tokens = estimate_prompt_tokens(request)
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": stream.completion_tokens,
+                "total_tokens": prompt_tokens + stream.completion_tokens
+            }
+        usage_ledger.record(call_site, request.get("model"), usage, usage_tags,
+                            streamed=True, estimated=stream.usage is None)
+
+    return CompletionStream(
+        call_site,
+        open_stream=open_stream,
+        on_complete=store,
+        on_finish=record_usage,
+        error_message=error_message
+    )
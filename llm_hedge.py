@@ -0,0 +1,229 @@
+"""
+Hedged LLM Requests to cut tail latency
+
+A few slow completions dominate p99 on long calls such as demo5's
+generate_report and demo3's call_agent. For opted-in call sites, a request
+that hasn't produced its first token after the call site's recent
+LLM_HEDGE_PERCENTILE latency gets a duplicate; whichever answers first wins
+and the other is cancelled:
+- Non-streamed calls race two attempts on the shared event loop (the loser's
+  HTTP request is cancelled); the threshold is the total-latency percentile
+- Streams race until the first content chunk (the threshold is the TTFT
+  percentile); the losing stream is closed
+- The duplicate goes through the normal routing path, so with several
+  deployments (llm_router.py) it usually lands on another backend, since the
+  slow request still counts against the first one
+- No hedging until LLM_HEDGE_MIN_SAMPLES calls have been timed, and at most
+  LLM_HEDGE_MAX_RATE of a call site's calls are hedged (each hedge is billed)
+- Eligible/hedged/won counts per call site are kept in llm_metrics.py
+
+Configuration via .env:
+- LLM_HEDGE_CALL_SITES comma-separated call sites to hedge (default empty = off),
+  e.g. demo5.generate_report,demo3.call_agent
+- LLM_HEDGE_PERCENTILE latency percentile that triggers a hedge (default 95)
+- LLM_HEDGE_MIN_SAMPLES timed calls needed before hedging (default 20)
+- LLM_HEDGE_MIN_DELAY seconds to wait at least before hedging (default 0.5)
+- LLM_HEDGE_MAX_RATE maximum share of hedged calls per call site (default 0.1)
+"""
+
+import asyncio
+import os
+import queue
+import threading
+from typing import Dict, Any, Optional, Callable, Iterator, Iterable
+
+from dotenv import load_dotenv
+
+from llm_metrics import latency_metrics
+
+load_dotenv()
+
+
+def _is_first_token(chunk) -> bool:
+    """Whether a stream chunk carries generated content (text or a tool call)"""
+    choices = getattr(chunk, "choices", None)
+    delta = choices[0].delta if choices else None
+    return bool(delta and (delta.content or delta.tool_calls))
+
+
+def _close(stream):
+    """Close an upstream stream, releasing its connection"""
+    try:
+        stream.close()
+    except Exception:
+        pass
+
+
+class Hedger:
+    """Sends a duplicate request when the first one is slower than usual"""
+
+    def __init__(self, call_sites: Iterable[str] = (), percentile: float = 95, min_samples: int = 20,
+                 min_delay: float = 0.5, max_rate: float = 0.1):
+        self.call_sites = set(call_sites)
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_rate = max_rate
+
+    def enabled_for(self, call_site: str) -> bool:
+        return call_site in self.call_sites
+
+    def delay(self, call_site: str, field: str = "latency") -> Optional[float]:
+        """
+        Seconds to wait before hedging a call, or None to not hedge it
+
+        Args:
+            call_site: Name of the calling function
+            field: "latency" for non-streamed calls, "ttft" for streams
+
+        Returns:
+            The call site's recent percentile latency (at least min_delay), or None
+            if the call site isn't opted in or has too few timed calls
+        """
+        if not self.enabled_for(call_site):
+            return None
+        timed = [s for s in latency_metrics.samples(call_site) if not s["cached"] and s[field] is not None]
+        if len(timed) < self.min_samples:
+            return None
+        return max(self.min_delay, latency_metrics.latency_percentile(call_site, self.percentile, field))
+
+    def _within_budget(self, call_site: str) -> bool:
+        stats = latency_metrics.hedge_stats(call_site)
+        return stats["hedged"] < self.max_rate * (stats["eligible"] + 1)
+
+    async def acall(self, call_site: str, attempt: Callable[[], Any]):
+        """
+        Run attempt() and, if it is slow, a second attempt() in parallel
+
+        Args:
+            call_site: Name of the calling function
+            attempt: Zero-argument function returning an awaitable for one upstream request
+
+        Returns:
+            The first successful attempt's result (errors are raised if both fail)
+        """
+        delay = self.delay(call_site)
+        if delay is None:
+            return await attempt()
+
+        primary = asyncio.ensure_future(attempt())
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                latency_metrics.record_hedge(call_site)
+                return primary.result()
+            if not self._within_budget(call_site):
+                latency_metrics.record_hedge(call_site, skipped=True)
+                return await primary
+
+            hedge = asyncio.ensure_future(attempt())
+            tasks.append(hedge)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        latency_metrics.record_hedge(call_site, hedged=True, hedge_won=task is hedge)
+                        return task.result()
+            latency_metrics.record_hedge(call_site, hedged=True)
+            return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stream(self, call_site: str, open_stream: Callable[[], Iterator]) -> Iterator:
+        """
+        Open a stream and, if its first token is slow, a second one in parallel
+
+        Args:
+            call_site: Name of the calling function
+            open_stream: Zero-argument function opening one upstream chunk stream
+
+        Returns:
+            Chunk iterator of whichever stream produced content first
+        """
+        delay = self.delay(call_site, "ttft")
+        if delay is None:
+            return open_stream()
+        return self._race(call_site, open_stream, delay)
+
+    def _race(self, call_site: str, open_stream: Callable[[], Iterator], delay: float) -> Iterator:
+        arrivals = queue.Queue()
+        state = {"winner": None, "streams": {}}
+        lock = threading.Lock()
+
+        def attempt(index: int):
+            # Read up to the first content chunk; the first attempt to get there closes the other
+            buffered = []
+            try:
+                stream = open_stream()
+                with lock:
+                    if state["winner"] is not None:
+                        _close(stream)
+                        return
+                    state["streams"][index] = stream
+                for chunk in stream:
+                    buffered.append(chunk)
+                    if _is_first_token(chunk):
+                        break
+                with lock:
+                    if state["winner"] is not None:
+                        return
+                    state["winner"] = index
+                    losers = [other for i, other in state["streams"].items() if i != index]
+                for other in losers:
+                    _close(other)
+                arrivals.put((index, stream, buffered, None))
+            except Exception as e:
+                arrivals.put((index, None, None, e))
+
+        def start(index: int):
+            threading.Thread(target=attempt, args=(index,), name="llm-hedge", daemon=True).start()
+
+        start(0)
+        started, skipped = 1, False
+        try:
+            first = arrivals.get(timeout=delay)
+        except queue.Empty:
+            first = None
+            if self._within_budget(call_site):
+                start(1)
+                started = 2
+            else:
+                skipped = True
+
+        errors = []
+        while True:
+            index, stream, buffered, error = first if first is not None else arrivals.get()
+            first = None
+            if error is None:
+                break
+            errors.append(error)
+            if len(errors) == started:
+                latency_metrics.record_hedge(call_site, hedged=started == 2, skipped=skipped)
+                raise errors[0]
+
+        latency_metrics.record_hedge(call_site, hedged=started == 2, hedge_won=index == 1, skipped=skipped)
+        return self._relay(stream, buffered)
+
+    @staticmethod
+    def _relay(stream, buffered):
+        yield from buffered
+        yield from stream
+
+
+# Process-wide hedging policy (off unless LLM_HEDGE_CALL_SITES names call sites)
+hedger = Hedger(
+    call_sites=[site.strip() for site in os.getenv("LLM_HEDGE_CALL_SITES", "").split(",") if site.strip()],
+    percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", 95)),
+    min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20)),
+    min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", 0.5)),
+    max_rate=float(os.getenv("LLM_HEDGE_MAX_RATE", 0.1))
+)
+
+
+def get_hedge_stats(call_site: Optional[str] = None) -> Dict[str, Any]:
+    """Get hedging counters for one call site (or all of them)"""
+    return latency_metrics.hedge_stats(call_site)
@@ -0,0 +1,193 @@
+"""
+LLM Latency Metrics
+
+This module records per-call latency for every chat completion:
+- Total latency (request sent → response complete)
+- Time-to-first-token (TTFT) for streamed calls
+- Completion tokens and tokens/sec
+- Percentiles per call site over a rolling window
+- Prompt tokens served from the provider's prefix cache
+  (usage.prompt_tokens_details.cached_tokens) and latency with vs without a hit
+- Hedged requests (see llm_hedge.py): how often a duplicate was sent and how
+  often it answered first, to weigh the extra cost against tail-latency wins
+
+Streaming doesn't make the model faster, but it cuts perceived latency to
+the TTFT, so both numbers are tracked side by side.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+
+WINDOW_SIZE = 500
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """
+    Nearest-rank percentile
+
+    Args:
+        values: Samples
+        q: Percentile between 0 and 100
+
+    Returns:
+        The percentile value, or None if there are no samples
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class LatencyMetrics:
+    """Rolling window of call timings, grouped by call site"""
+
+    def __init__(self, window: int = WINDOW_SIZE):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        self._hedges: Dict[str, Dict[str, int]] = {}
+
+    def record(self, call_site: str, latency: float, ttft: Optional[float] = None,
+               completion_tokens: Optional[int] = None, streamed: bool = False,
+               cached: bool = False, prompt_tokens: Optional[int] = None,
+               cached_prompt_tokens: Optional[int] = None):
+        """
+        Record one completed call
+
+        Args:
+            call_site: Name of the calling function
+            latency: Seconds from request to last token
+            ttft: Seconds to first token (streamed calls only)
+            completion_tokens: Tokens generated
+            streamed: Whether the response was streamed
+            cached: Whether it was served from a cache
+            prompt_tokens: Prompt tokens billed (from response.usage)
+            cached_prompt_tokens: Prompt tokens served from the provider's prefix cache
+        """
+        generation_time = latency - (ttft or 0.0)
+        tokens_per_sec = None
+        if completion_tokens and generation_time > 0:
+            tokens_per_sec = completion_tokens / generation_time
+
+        sample = {
+            "timestamp": time.time(),
+            "latency": latency,
+            "ttft": ttft,
+            "completion_tokens": completion_tokens,
+            "tokens_per_sec": tokens_per_sec,
+            "streamed": streamed,
+            "cached": cached,
+            "prompt_tokens": prompt_tokens,
+            "cached_prompt_tokens": cached_prompt_tokens
+        }
+        with self._lock:
+            self._samples.setdefault(call_site, deque(maxlen=self.window)).append(sample)
+
+    def samples(self, call_site: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get recorded samples for one call site (or all of them)"""
+        with self._lock:
+            if call_site is not None:
+                return list(self._samples.get(call_site, []))
+            return [s for samples in self._samples.values() for s in samples]
+
+    def latency_percentile(self, call_site: Optional[str], q: float,
+                           field: str = "latency") -> Optional[float]:
+        """Percentile of uncached latency (or ttft) for a call site"""
+        values = [s[field] for s in self.samples(call_site)
+                  if not s["cached"] and s[field] is not None]
+        return percentile(values, q)
+
+    def record_hedge(self, call_site: str, hedged: bool = False, hedge_won: bool = False,
+                     skipped: bool = False):
+        """
+        Count one call eligible for hedging
+
+        Args:
+            call_site: Name of the calling function
+            hedged: Whether a duplicate request was sent
+            hedge_won: Whether the duplicate answered first
+            skipped: Whether hedging was skipped because the hedge budget was used up
+        """
+        with self._lock:
+            counts = self._hedges.setdefault(call_site, {"eligible": 0, "hedged": 0, "hedge_wins": 0,
+                                                         "budget_skipped": 0})
+            counts["eligible"] += 1
+            counts["hedged"] += int(hedged)
+            counts["hedge_wins"] += int(hedge_won)
+            counts["budget_skipped"] += int(skipped)
+
+    def hedge_stats(self, call_site: Optional[str]) -> Dict[str, Any]:
+        """Hedged share of eligible calls and how often the hedge won, for one call site (or all)"""
+        with self._lock:
+            rows = [self._hedges.get(call_site, {})] if call_site is not None else list(self._hedges.values())
+            counts = {field: sum(row.get(field, 0) for row in rows)
+                      for field in ("eligible", "hedged", "hedge_wins", "budget_skipped")}
+        return dict(
+            counts,
+            hedge_rate=(counts["hedged"] / counts["eligible"]) if counts["eligible"] else 0.0,
+            hedge_win_rate=(counts["hedge_wins"] / counts["hedged"]) if counts["hedged"] else 0.0
+        )
+
+    def prefix_cache_stats(self, call_site: Optional[str]) -> Dict[str, Any]:
+        """Share of prompt tokens served from the provider's prefix cache, and its latency effect"""
+        samples = [s for s in self.samples(call_site)
+                   if not s["cached"] and s.get("prompt_tokens")]
+        hits = [s["latency"] for s in samples if s["cached_prompt_tokens"]]
+        misses = [s["latency"] for s in samples if not s["cached_prompt_tokens"]]
+        prompt_tokens = sum(s["prompt_tokens"] for s in samples)
+        cached_tokens = sum(s["cached_prompt_tokens"] or 0 for s in samples)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "cached_prompt_tokens": cached_tokens,
+            "cached_token_ratio": (cached_tokens / prompt_tokens) if prompt_tokens else 0.0,
+            "prefix_hits": len(hits),
+            "p50_latency_prefix_hit": percentile(hits, 50),
+            "p50_latency_prefix_miss": percentile(misses, 50)
+        }
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Summarize latency per call site
+
+        Returns:
+            Dictionary of call site → count, p50/p95 latency, p50/p95 TTFT, avg tokens/sec,
+            prefix cache stats (see prefix_cache_stats) and hedging stats (see hedge_stats)
+        """
+        with self._lock:
+            call_sites = list(self._samples.keys())
+
+        result = {}
+        for call_site in call_sites:
+            samples = self.samples(call_site)
+            rates = [s["tokens_per_sec"] for s in samples if s["tokens_per_sec"]]
+            result[call_site] = {
+                "calls": len(samples),
+                "cached": sum(1 for s in samples if s["cached"]),
+                "p50_latency": self.latency_percentile(call_site, 50),
+                "p95_latency": self.latency_percentile(call_site, 95),
+                "p50_ttft": self.latency_percentile(call_site, 50, "ttft"),
+                "p95_ttft": self.latency_percentile(call_site, 95, "ttft"),
+                "avg_tokens_per_sec": (sum(rates) / len(rates)) if rates else None,
+                **self.prefix_cache_stats(call_site),
+                **self.hedge_stats(call_site)
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._hedges.clear()
+
+
+# Process-wide metrics shared by all demos
+latency_metrics = LatencyMetrics()
+
+
+def get_latency_summary() -> Dict[str, Dict[str, Any]]:
+    """Get per-call-site latency, TTFT and tokens/sec"""
+    return latency_metrics.summary()
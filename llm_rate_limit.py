@@ -0,0 +1,307 @@
+"""
+Shared Client-Side Rate Limiter for LLM calls
+
+This module keeps every demo in the process under the deployment's quota:
+- Token buckets for requests/min and tokens/min, shared by all call sites
+- AIMD adaptive concurrency (add one slot per window of successes, halve on 429)
+- 429-aware retries that honor Retry-After and otherwise back off with full jitter
+- A process-wide pause after a 429, so other in-flight callers wait too
+
+Bursty runs (demo3 parallel agents, demo5 trend research) are paced up to the
+quota ceiling instead of turning a 429 into an "Error: ..." answer.
+
+Configuration via .env:
+- LLM_RATE_LIMIT_RPM requests per minute (default 0 = unlimited)
+- LLM_RATE_LIMIT_TPM tokens per minute (default 0 = unlimited)
+- LLM_MAX_CONCURRENCY upper bound for in-flight requests (default 8)
+- LLM_MAX_RETRIES retries after a 429/5xx/connection error (default 5)
+- LLM_BACKOFF_BASE / LLM_BACKOFF_MAX seconds (default 1 / 30)
+"""
+
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Dict, Any, Optional, Callable
+
+import openai
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# Completion budget assumed when a request doesn't set max_tokens
+DEFAULT_COMPLETION_ESTIMATE = 512
+
+# How often blocked callers re-check the limiter
+POLL_INTERVAL = 0.05
+
+
+def estimate_prompt_tokens(request: Dict[str, Any]) -> int:
+    """Estimate prompt tokens at ~4 characters per token"""
+    chars = 0
+    for message in request.get("messages", []):
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", None)
+        chars += len(content or "")
+    if request.get("tools"):
+        chars += len(str(request["tools"]))
+    return chars // 4
+
+
+def estimate_tokens(request: Dict[str, Any]) -> int:
+    """
+    Estimate the tokens a request will consume (prompt + completion)
+
+    The estimate is reconciled with the actual usage once the response arrives.
+    """
+    return estimate_prompt_tokens(request) + (request.get("max_tokens") or DEFAULT_COMPLETION_ESTIMATE)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read Retry-After (or Azure's retry-after-ms) from an API error, if present"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(retry_at.timestamp() - time.time(), 0.0) if retry_at else None
+
+
+def is_retryable(error: Exception) -> bool:
+    """429s, 5xx responses, timeouts and dropped connections are worth retrying"""
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding up to one minute of budget"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 if it is available now)"""
+        self._refill(now)
+        # Requests larger than the whole bucket are let through once it is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= amount
+
+    def give(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """Request/token buckets plus AIMD concurrency, shared by sync and async callers"""
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_concurrency: int = 8, max_retries: int = 5,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = float(max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._stats = {"requests": 0, "throttled": 0, "retries": 0, "failures": 0, "wait_seconds": 0.0}
+
+    def _try_acquire(self, estimate: int) -> float:
+        """Admit the request (returns 0) or return how long to wait before trying again"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._in_flight >= int(self.concurrency_limit):
+                return POLL_INTERVAL
+
+            wait = 0.0
+            if self.requests:
+                wait = max(wait, self.requests.wait_time(1, now))
+            if self.tokens:
+                wait = max(wait, self.tokens.wait_time(estimate, now))
+            if wait > 0:
+                return wait
+
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(estimate)
+            self._in_flight += 1
+            self._stats["requests"] += 1
+            return 0.0
+
+    def acquire(self, estimate: int):
+        """Block until the request may be sent"""
+        start = time.monotonic()
+        while True:
+            wait = self._try_acquire(estimate)
+            if wait == 0:
+                break
+            time.sleep(min(wait, 1.0))
+        self._count("wait_seconds", time.monotonic() - start)
+
+    async def aacquire(self, estimate: int):
+        """Async variant of acquire (doesn't block the event loop)"""
+        start = time.monotonic()
+        while True:
+            wait = self._try_acquire(estimate)
+            if wait == 0:
+                break
+            await asyncio.sleep(min(wait, 1.0))
+        self._count("wait_seconds", time.monotonic() - start)
+
+    def release(self, estimate: int, response=None, throttled: bool = False):
+        """
+        Free the concurrency slot and adapt the limit
+
+        Args:
+            estimate: Token estimate taken at acquire time
+            response: The completion, used to reconcile the token bucket with real usage
+            throttled: True if the request got a 429
+        """
+        usage = getattr(response, "usage", None)
+        with self._lock:
+            self._in_flight -= 1
+            if throttled:
+                # Multiplicative decrease
+                self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+            elif response is not None:
+                # Additive increase: +1 slot after a full window of successes
+                self.concurrency_limit = min(
+                    float(self.max_concurrency),
+                    self.concurrency_limit + 1 / self.concurrency_limit
+                )
+            if self.tokens and usage is not None:
+                self.tokens.give(estimate - usage.total_tokens)
+
+    def pause(self, seconds: float):
+        """Hold back every caller for `seconds` (after a 429)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """Delay before the next attempt: Retry-After if given, else full-jitter exponential"""
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _count(self, field: str, amount: float = 1):
+        with self._lock:
+            self._stats[field] += amount
+
+    def _on_error(self, estimate: int, attempt: int, error: Exception) -> float:
+        """Record a failed attempt; return the delay before retrying or re-raise"""
+        throttled = isinstance(error, openai.RateLimitError)
+        self.release(estimate, throttled=throttled)
+        if throttled:
+            self._count("throttled")
+        if not is_retryable(error) or attempt >= self.max_retries:
+            self._count("failures")
+            raise error
+
+        delay = self.backoff(attempt, error)
+        if throttled:
+            self.pause(delay)
+        self._count("retries")
+        return delay
+
+    def call(self, request: Dict[str, Any], call: Callable[[], Any]):
+        """
+        Make a rate-limited call, retrying 429s and transient errors
+
+        Args:
+            request: Keyword arguments for chat.completions.create (for the token estimate)
+            call: Zero-argument function that performs the real request
+
+        Returns:
+            Whatever call() returns
+        """
+        estimate = estimate_tokens(request)
+        attempt = 0
+        while True:
+            self.acquire(estimate)
+            try:
+                response = call()
+            except Exception as e:
+                time.sleep(self._on_error(estimate, attempt, e))
+                attempt += 1
+                continue
+            self.release(estimate, response)
+            return response
+
+    async def acall(self, request: Dict[str, Any], call: Callable[[], Any]):
+        """Async variant of call (call returns an awaitable)"""
+        estimate = estimate_tokens(request)
+        attempt = 0
+        while True:
+            await self.aacquire(estimate)
+            try:
+                response = await call()
+            except asyncio.CancelledError:
+                # e.g. the losing attempt of a hedged request (llm_hedge.py)
+                self.release(estimate)
+                raise
+            except Exception as e:
+                await asyncio.sleep(self._on_error(estimate, attempt, e))
+                attempt += 1
+                continue
+            self.release(estimate, response)
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        """Get throttling counters and the current adaptive concurrency limit"""
+        with self._lock:
+            return dict(
+                self._stats,
+                in_flight=self._in_flight,
+                concurrency_limit=int(self.concurrency_limit),
+                max_concurrency=self.max_concurrency
+            )
+
+
+# Process-wide limiter shared by all demos
+rate_limiter = RateLimiter(
+    requests_per_minute=float(os.getenv("LLM_RATE_LIMIT_RPM", 0)),
+    tokens_per_minute=float(os.getenv("LLM_RATE_LIMIT_TPM", 0)),
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 8)),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", 5)),
+    backoff_base=float(os.getenv("LLM_BACKOFF_BASE", 1.0)),
+    backoff_max=float(os.getenv("LLM_BACKOFF_MAX", 30.0))
+)
+
+
+def get_rate_limit_stats() -> Dict[str, Any]:
+    """Get throttling counters for the shared rate limiter"""
+    return rate_limiter.stats()
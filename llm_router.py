@@ -0,0 +1,314 @@
+"""
+Latency-Aware Router across multiple model deployments
+
+With one AZURE_AI_ENDPOINT/AZURE_AI_MODEL_NAME every demo shares a single
+deployment's quota. Listing several endpoint/deployment pairs in
+LLM_DEPLOYMENTS makes every uncached call go through this router instead:
+- Picks the backend with the lowest EWMA latency x (outstanding requests + 1),
+  so slow or busy deployments get less traffic (untried backends go first)
+- Each backend has its own rate limiter (RPM/TPM buckets, AIMD concurrency),
+  because Azure quotas are per deployment
+- 429s, 5xx and connection errors fail over to the next backend immediately
+- A 429 ejects the backend until its Retry-After; repeated 5xx/connection
+  errors eject it for an exponentially growing cool-down
+- When every backend is ejected, callers wait for the first one to return
+
+The demos keep passing their usual model name (cache keys and usage tags stay
+the same); the router substitutes each backend's deployment name.
+
+Configuration via .env:
+- LLM_DEPLOYMENTS backends separated by ";", each "endpoint|deployment[|api_key]"
+  (api_key defaults to AZURE_AI_API_KEY), or a JSON list of
+  {"endpoint", "deployment", "api_key", "name", "rpm", "tpm"} objects
+- LLM_ROUTER_EWMA_ALPHA weight of the newest latency sample (default 0.3)
+- LLM_ROUTER_MAX_FAILURES consecutive 5xx/connection errors before ejection (default 3)
+- LLM_ROUTER_EJECT_SECONDS first ejection cool-down (default 10, doubles up to 120)
+- Per-backend limits reuse LLM_RATE_LIMIT_RPM, LLM_RATE_LIMIT_TPM and LLM_MAX_CONCURRENCY
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional, Callable
+from urllib.parse import urlparse
+
+import openai
+from dotenv import load_dotenv
+
+from llm_rate_limit import RateLimiter, estimate_tokens, is_retryable, retry_after_seconds
+
+load_dotenv()
+
+
+class NoHealthyBackendError(RuntimeError):
+    """Raised when every backend failed and the retry budget is used up"""
+
+
+class Backend:
+    """One endpoint/deployment pair with its health and latency state"""
+
+    def __init__(self, endpoint: str, deployment: str, api_key: str, api_version: str,
+                 name: Optional[str] = None, rpm: float = 0, tpm: float = 0, max_concurrency: int = 8):
+        self.endpoint = endpoint
+        self.deployment = deployment
+        self.api_key = api_key
+        self.api_version = api_version
+        self.name = name or f"{urlparse(endpoint).hostname or endpoint}/{deployment}"
+        # Retries are the router's job (on another backend), so the limiter never retries
+        self.limiter = RateLimiter(rpm, tpm, max_concurrency=max_concurrency, max_retries=0)
+        self.ewma_latency: Optional[float] = None
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.stats = {"requests": 0, "successes": 0, "throttled": 0, "errors": 0}
+
+    @property
+    def settings(self) -> tuple:
+        """Client settings (endpoint, api_key, api_version) for llm_client"""
+        return (self.endpoint, self.api_key, self.api_version)
+
+
+def parse_deployments(value: Optional[str], default_api_key: Optional[str] = None,
+                      api_version: str = "2024-02-15-preview", rpm: float = 0, tpm: float = 0,
+                      max_concurrency: int = 8) -> List[Backend]:
+    """
+    Parse LLM_DEPLOYMENTS
+
+    Args:
+        value: "endpoint|deployment[|api_key];..." or a JSON list of objects
+        default_api_key: Key for entries that don't set one
+        api_version: Azure OpenAI API version for every backend
+        rpm, tpm, max_concurrency: Default per-backend limits
+
+    Returns:
+        List of backends (empty if value is unset)
+    """
+    if not value or not value.strip():
+        return []
+    if value.strip().startswith("["):
+        entries = json.loads(value)
+    else:
+        entries = []
+        for item in value.replace("\n", ";").split(";"):
+            if not item.strip():
+                continue
+            parts = [part.strip() for part in item.split("|")]
+            if len(parts) < 2:
+                raise ValueError(f"LLM_DEPLOYMENTS entry must be endpoint|deployment[|api_key]: {item!r}")
+            entries.append({"endpoint": parts[0], "deployment": parts[1],
+                            "api_key": parts[2] if len(parts) > 2 else None})
+    return [
+        Backend(
+            entry["endpoint"], entry["deployment"], entry.get("api_key") or default_api_key, api_version,
+            name=entry.get("name"), rpm=float(entry.get("rpm", rpm)), tpm=float(entry.get("tpm", tpm)),
+            max_concurrency=int(entry.get("max_concurrency", max_concurrency))
+        )
+        for entry in entries
+    ]
+
+
+class Router:
+    """Routes each call to the best healthy backend and fails over on throttling/errors"""
+
+    def __init__(self, backends: List[Backend], ewma_alpha: float = 0.3, max_failures: int = 3,
+                 eject_seconds: float = 10.0, eject_max_seconds: float = 120.0, max_retries: int = 5):
+        self.backends = backends
+        self.ewma_alpha = ewma_alpha
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.eject_max_seconds = eject_max_seconds
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "failovers": 0, "all_ejected_waits": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.backends)
+
+    def _score(self, backend: Backend) -> float:
+        # Untried backends score 0, so each one gets a first request
+        return (backend.ewma_latency or 0.0) * (backend.outstanding + 1)
+
+    def _pick(self, exclude: set) -> Optional[Backend]:
+        """Best healthy backend not tried yet for this request (reserves an outstanding slot)"""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [b for b in self.backends if b not in exclude and b.ejected_until <= now]
+            if not candidates:
+                return None
+            backend = min(candidates, key=self._score)
+            backend.outstanding += 1
+            backend.stats["requests"] += 1
+            return backend
+
+    def _wait_time(self) -> float:
+        """Seconds until the first ejected backend returns"""
+        with self._lock:
+            now = time.monotonic()
+            return max(0.0, min(b.ejected_until for b in self.backends) - now)
+
+    def _eject(self, backend: Backend, seconds: float):
+        backend.ejected_until = max(backend.ejected_until, time.monotonic() + seconds)
+        backend.ejections += 1
+
+    def _on_success(self, backend: Backend, latency: Optional[float]):
+        with self._lock:
+            backend.outstanding -= 1
+            backend.consecutive_failures = 0
+            backend.ejections = 0
+            backend.stats["successes"] += 1
+            if latency is not None:
+                backend.ewma_latency = latency if backend.ewma_latency is None else (
+                    self.ewma_alpha * latency + (1 - self.ewma_alpha) * backend.ewma_latency
+                )
+
+    def _on_cancel(self, backend: Backend):
+        with self._lock:
+            backend.outstanding -= 1
+
+    def _on_failure(self, backend: Backend, error: Exception):
+        with self._lock:
+            backend.outstanding -= 1
+            if isinstance(error, openai.RateLimitError):
+                backend.stats["throttled"] += 1
+                retry_after = retry_after_seconds(error)
+                self._eject(backend, retry_after if retry_after is not None else self.eject_seconds)
+            elif is_retryable(error):
+                backend.stats["errors"] += 1
+                backend.consecutive_failures += 1
+                if backend.consecutive_failures >= self.max_failures:
+                    backend.consecutive_failures = 0
+                    self._eject(backend, min(self.eject_max_seconds,
+                                             self.eject_seconds * 2 ** backend.ejections))
+            else:
+                backend.stats["errors"] += 1
+
+    def _count(self, field: str):
+        with self._lock:
+            self._stats[field] += 1
+
+    def _next_round(self, attempt: int, error: Optional[Exception]) -> float:
+        """Every backend was tried or is ejected: how long to wait before another round (or raise)"""
+        if attempt >= self.max_retries:
+            if error is not None:
+                raise error
+            raise NoHealthyBackendError("All LLM deployments are ejected")
+        self._count("all_ejected_waits")
+        return max(self._wait_time(), 0.05)
+
+    def call(self, request: Dict[str, Any], call: Callable[[Backend], Any], track_latency: bool = True):
+        """
+        Make a call on the best backend, failing over on 429/5xx/connection errors
+
+        Args:
+            request: Keyword arguments for chat.completions.create (for the token estimate)
+            call: Function taking the chosen Backend and performing the request on it
+            track_latency: Feed the call's duration into the backend's EWMA
+                (False for streams, where call() returns before the response is complete)
+
+        Returns:
+            Whatever call() returns
+        """
+        estimate = estimate_tokens(request)
+        self._count("requests")
+        tried, attempt, last_error = set(), 0, None
+        while True:
+            backend = self._pick(tried)
+            if backend is None:
+                time.sleep(self._next_round(attempt, last_error))
+                tried.clear()
+                attempt += 1
+                continue
+
+            backend.limiter.acquire(estimate)
+            start = time.perf_counter()
+            try:
+                response = call(backend)
+            except Exception as e:
+                backend.limiter.release(estimate, throttled=isinstance(e, openai.RateLimitError))
+                self._on_failure(backend, e)
+                if not is_retryable(e):
+                    raise
+                tried.add(backend)
+                last_error = e
+                self._count("failovers")
+                continue
+            backend.limiter.release(estimate, response)
+            self._on_success(backend, time.perf_counter() - start if track_latency else None)
+            return response
+
+    async def acall(self, request: Dict[str, Any], call: Callable[[Backend], Any], track_latency: bool = True):
+        """Async variant of call (call returns an awaitable)"""
+        estimate = estimate_tokens(request)
+        self._count("requests")
+        tried, attempt, last_error = set(), 0, None
+        while True:
+            backend = self._pick(tried)
+            if backend is None:
+                await asyncio.sleep(self._next_round(attempt, last_error))
+                tried.clear()
+                attempt += 1
+                continue
+
+            await backend.limiter.aacquire(estimate)
+            start = time.perf_counter()
+            try:
+                response = await call(backend)
+            except asyncio.CancelledError:
+                # e.g. the losing attempt of a hedged request (llm_hedge.py): not the backend's fault
+                backend.limiter.release(estimate)
+                self._on_cancel(backend)
+                raise
+            except Exception as e:
+                backend.limiter.release(estimate, throttled=isinstance(e, openai.RateLimitError))
+                self._on_failure(backend, e)
+                if not is_retryable(e):
+                    raise
+                tried.add(backend)
+                last_error = e
+                self._count("failovers")
+                continue
+            backend.limiter.release(estimate, response)
+            self._on_success(backend, time.perf_counter() - start if track_latency else None)
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        """Get routing counters and per-backend health, latency and load"""
+        with self._lock:
+            now = time.monotonic()
+            return dict(self._stats, backends=[
+                dict(b.stats,
+                     name=b.name,
+                     deployment=b.deployment,
+                     healthy=b.ejected_until <= now,
+                     ejected_for=max(0.0, b.ejected_until - now),
+                     ewma_latency=b.ewma_latency,
+                     outstanding=b.outstanding,
+                     concurrency_limit=int(b.limiter.concurrency_limit))
+                for b in self.backends
+            ])
+
+
+# Process-wide router shared by all demos (disabled unless LLM_DEPLOYMENTS is set)
+router = Router(
+    parse_deployments(
+        os.getenv("LLM_DEPLOYMENTS"),
+        default_api_key=os.getenv("AZURE_AI_API_KEY"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview"),
+        rpm=float(os.getenv("LLM_RATE_LIMIT_RPM", 0)),
+        tpm=float(os.getenv("LLM_RATE_LIMIT_TPM", 0)),
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+    ),
+    ewma_alpha=float(os.getenv("LLM_ROUTER_EWMA_ALPHA", 0.3)),
+    max_failures=int(os.getenv("LLM_ROUTER_MAX_FAILURES", 3)),
+    eject_seconds=float(os.getenv("LLM_ROUTER_EJECT_SECONDS", 10)),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", 5))
+)
+
+
+def get_router_stats() -> Dict[str, Any]:
+    """Get per-deployment routing stats for the shared router"""
+    return router.stats()
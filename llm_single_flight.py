@@ -0,0 +1,211 @@
+"""
+Single-Flight Coalescing of identical in-flight LLM requests
+
+When several Streamlit sessions send the same completion at the same moment
+(everyone clicks the same demo5 research question or demo2 example), only
+the first request goes upstream; the others wait for it and share the result:
+- Keyed on the canonical request hash (same key as llm_cache.py)
+- Works across threads (Streamlit sessions) and the shared async event loop
+- Streamed responses are fanned out chunk by chunk to every waiter
+- Errors are shared too, so a failing request isn't repeated N times at once
+
+Once the leader finishes, later identical requests are served by the
+response cache instead.
+
+Configuration via .env:
+- LLM_SINGLE_FLIGHT_ENABLED (default true)
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, Callable, Iterator, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class StreamBroadcast:
+    """Buffers an upstream stream on a background thread and replays it to every subscriber"""
+
+    def __init__(self):
+        self._items = []
+        self._done = False
+        self._error = None
+        self._cond = threading.Condition()
+
+    def pump(self, open_stream: Callable[[], Iterator], on_done: Callable[[], None]):
+        """Read the upstream stream to the end (runs on its own thread)"""
+        try:
+            for item in open_stream():
+                with self._cond:
+                    self._items.append(item)
+                    self._cond.notify_all()
+        except Exception as e:
+            self._error = e
+        finally:
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+            on_done()
+
+    def subscribe(self) -> Iterator:
+        """Yield every item from the start, blocking until more arrive or the stream ends"""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._items) and not self._done:
+                    self._cond.wait()
+                if index < len(self._items):
+                    item = self._items[index]
+                    index += 1
+                elif self._error is not None:
+                    raise self._error
+                else:
+                    return
+            yield item
+
+
+class SingleFlight:
+    """Shares one upstream call between concurrent identical requests"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._flights: Dict[str, Future] = {}
+        self._streams: Dict[str, StreamBroadcast] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, call_site: str, field: str):
+        site = self._stats.setdefault(call_site, {"leaders": 0, "followers": 0})
+        site[field] += 1
+
+    def _join(self, call_site: str, key: str) -> Tuple[Future, bool]:
+        """Return the in-flight future for key and whether the caller must run the call"""
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self._count(call_site, "followers")
+                return future, False
+            future = Future()
+            self._flights[key] = future
+            self._count(call_site, "leaders")
+            return future, True
+
+    def _finish(self, key: str, future: Future):
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+
+    def call(self, call_site: str, key: str, call: Callable[[], Any]):
+        """
+        Run call() once for all concurrent callers with the same key
+
+        Args:
+            call_site: Name of the calling function (for stats)
+            key: Canonical request hash
+            call: Zero-argument function that performs the real request
+
+        Returns:
+            The leader's result (followers get the same object)
+        """
+        if not self.enabled:
+            return call()
+
+        future, leader = self._join(call_site, key)
+        if not leader:
+            return future.result()
+
+        try:
+            result = call()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._finish(key, future)
+
+    async def acall(self, call_site: str, key: str, call: Callable[[], Any]):
+        """Async variant of call (call returns an awaitable; shares flights with sync callers)"""
+        if not self.enabled:
+            return await call()
+
+        future, leader = self._join(call_site, key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        try:
+            result = await call()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._finish(key, future)
+
+    def stream(self, call_site: str, key: str, open_stream: Callable[[], Iterator]) -> Tuple[Iterator, bool]:
+        """
+        Share one upstream stream between concurrent identical streamed requests
+
+        Args:
+            call_site: Name of the calling function (for stats)
+            key: Canonical request hash
+            open_stream: Zero-argument function returning the upstream chunk iterator
+
+        Returns:
+            (chunk iterator for this caller, whether this caller started the upstream call)
+        """
+        if not self.enabled:
+            return open_stream(), True
+
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is not None:
+                self._count(call_site, "followers")
+                return broadcast.subscribe(), False
+            broadcast = StreamBroadcast()
+            self._streams[key] = broadcast
+            self._count(call_site, "leaders")
+
+        def release():
+            with self._lock:
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+
+        threading.Thread(
+            target=broadcast.pump, args=(open_stream, release),
+            name="llm-stream-broadcast", daemon=True
+        ).start()
+        return broadcast.subscribe(), True
+
+    def stats(self) -> Dict[str, Any]:
+        """Get leader/follower counts overall and per call site"""
+        with self._lock:
+            per_site = {site: dict(values) for site, values in self._stats.items()}
+            in_flight = len(self._flights) + len(self._streams)
+        leaders = sum(s["leaders"] for s in per_site.values())
+        followers = sum(s["followers"] for s in per_site.values())
+        return {
+            "leaders": leaders,
+            "coalesced": followers,
+            "coalesce_rate": (followers / (leaders + followers)) if leaders + followers else 0.0,
+            "in_flight": in_flight,
+            "by_call_site": per_site
+        }
+
+
+# Process-wide single-flight group shared by all sessions
+single_flight = SingleFlight(
+    enabled=os.getenv("LLM_SINGLE_FLIGHT_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+)
+
+
+def get_single_flight_stats() -> Dict[str, Any]:
+    """Get coalescing counters for the shared single-flight group"""
+    return single_flight.stats()
@@ -0,0 +1,749 @@
+"""
+Local OpenAI-compatible Stub Server for load testing
+
+A dependency-free HTTP server implementing POST .../chat/completions well
+enough for every demo to run against it without network access:
+- Tool calling (arguments generated from each tool's JSON schema)
+- response_format=json_object (valid plan JSON for demo4's create_plan)
+- SSE streaming, with usage when stream_options.include_usage is set
+- Configurable latency distributions, tokens/sec and response length
+- 429 injection (random rate, requests/min ceiling, concurrency ceiling)
+- Prompt prefix caching like Azure OpenAI: repeated prefixes of 1024+ tokens are
+  reported in usage.prompt_tokens_details.cached_tokens and shorten the TTFT
+- Files and Batches API (upload a JSONL of requests, create a batch, poll it and
+  download the output file), for testing llm_batch.py offline
+- Canned or templated responses matched by regex
+
+Run it and point the demos at it:
+
+    python llm_stub_server.py --port 8000 --profile gpt-4o
+    AZURE_AI_ENDPOINT=http://127.0.0.1:8000/cognitiveservices/openai/v1/
+    AZURE_AI_API_KEY=stub
+
+Any path ending in /chat/completions works, so standard Azure OpenAI
+endpoints (/openai/deployments/<name>/chat/completions) are served too.
+GET /stats returns request counters; GET /health returns {"status": "ok"}.
+Batch endpoints: POST .../files, GET .../files/<id>[/content], POST .../batches,
+GET .../batches/<id>, POST .../batches/<id>/cancel.
+
+Distribution specs (milliseconds, tokens/sec or tokens):
+    fixed:300 | uniform:200:600 | normal:400:100 | lognormal:400:0.5 (median, sigma)
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import date, timedelta
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+
+
+# Named latency/throughput profiles (explicit flags override them)
+PROFILES = {
+    "instant": {"ttft": "fixed:0", "tokens_per_sec": "fixed:100000", "completion_tokens": "fixed:60"},
+    "fast": {"ttft": "lognormal:150:0.3", "tokens_per_sec": "normal:150:20", "completion_tokens": "normal:150:40"},
+    "gpt-4o": {"ttft": "lognormal:450:0.4", "tokens_per_sec": "normal:80:15", "completion_tokens": "normal:350:100"},
+    "slow": {"ttft": "lognormal:1500:0.5", "tokens_per_sec": "normal:25:5", "completion_tokens": "normal:500:150"},
+    "throttled": {"ttft": "lognormal:450:0.4", "tokens_per_sec": "normal:80:15", "completion_tokens": "normal:350:100",
+                  "error_rate_429": 0.2},
+}
+
+FILLER_SENTENCES = [
+    "The main consideration is {topic}, which shapes every later decision.",
+    "Start with a small, measurable pilot before committing the full budget.",
+    "Track a leading indicator weekly so problems surface early.",
+    "Stakeholders should agree on success criteria up front.",
+    "Risks are manageable if ownership for each workstream is explicit.",
+    "Reuse existing assets where possible to shorten time to value.",
+    "A phased rollout keeps the blast radius small while the team learns.",
+    "Document assumptions so they can be revisited as data arrives.",
+]
+
+STOPWORDS = {"the", "a", "an", "and", "or", "for", "to", "of", "in", "on", "with", "what", "how",
+             "is", "are", "i", "me", "my", "we", "our", "you", "your", "it", "this", "that", "be",
+             "can", "should", "do", "does", "please", "about", "at", "by", "from", "as", "tell",
+             "give", "need", "want", "help", "attending", "prepare", "i'm"}
+
+
+class Distribution:
+    """Random variable parsed from a spec like "lognormal:400:0.5" """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        parts = spec.split(":")
+        self.kind = parts[0]
+        self.params = [float(p) for p in parts[1:]]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if self.kind not in expected or len(self.params) != expected[self.kind]:
+            raise ValueError(f"Invalid distribution spec: {spec!r}")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            value = self.params[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(*self.params)
+        elif self.kind == "normal":
+            value = rng.gauss(*self.params)
+        else:
+            median, sigma = self.params
+            value = median * rng.lognormvariate(0, sigma)
+        return max(0.0, value)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def last_user_message(messages: List[Dict[str, Any]]) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return message_text(message)
+    return ""
+
+
+def keywords(text: str, limit: int = 6) -> List[str]:
+    words = re.findall(r"[A-Za-z][A-Za-z0-9.+#-]{2,}", text)
+    seen = []
+    for word in words:
+        if word.lower() not in STOPWORDS and word.lower() not in (w.lower() for w in seen):
+            seen.append(word)
+    return seen[:limit]
+
+
+def proper_nouns(text: str) -> List[str]:
+    """Capitalized phrases such as "Cape Town" (used as tool arguments)"""
+    phrases = re.findall(r"(?:[A-Z][a-z]+|\.NET)(?:\s+(?:[A-Z][a-z]+|\d{4}))*", text)
+    return [p for p in phrases if p.lower() not in STOPWORDS and p not in ("I", "What", "How")]
+
+
+class ResponseGenerator:
+    """Builds tool calls, JSON and text responses for a request"""
+
+    def __init__(self, templates: Optional[List[Dict[str, str]]] = None):
+        self.templates = [(re.compile(t["match"], re.IGNORECASE), t["response"]) for t in (templates or [])]
+
+    # --- Tools ------------------------------------------------------------
+
+    def choose_tools(self, request: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Tools mentioned in the user's message, or all of them if none are"""
+        user = last_user_message(request["messages"]).lower()
+        tools = [t["function"] for t in request.get("tools", []) if t.get("type") == "function"]
+        mentioned = [
+            tool for tool in tools
+            if any(word in user for word in re.split(r"[_\s]+", tool["name"]) if len(word) > 3 and word not in ("get", "info"))
+        ]
+        return mentioned or tools
+
+    def tool_arguments(self, tool: Dict[str, Any], user: str) -> Dict[str, Any]:
+        """Fill each parameter from the schema: enums, dates, places from the message, examples"""
+        schema = tool.get("parameters", {})
+        places = proper_nouns(user)
+        # Cities/locations: prefer phrases without digits ("Cape Town" over ".NET Conf 2025")
+        locations = [p for p in places if not re.search(r"\d|\.NET", p)] or places
+        dates = re.findall(r"\d{4}-\d{2}-\d{2}", user)
+        arguments = {}
+        for index, (name, prop) in enumerate(schema.get("properties", {}).items()):
+            if name not in schema.get("required", []) and "enum" not in prop:
+                continue
+            description = prop.get("description", "")
+            example = re.search(r"e\.g\.\s*([^,.;]+)", description)
+            if "enum" in prop:
+                arguments[name] = prop["enum"][0]
+            elif prop.get("type") in ("number", "integer"):
+                arguments[name] = 1
+            elif prop.get("type") == "boolean":
+                arguments[name] = True
+            elif prop.get("type") == "array":
+                arguments[name] = []
+            elif "date" in name:
+                arguments[name] = dates[0] if dates else (date.today() + timedelta(days=1)).isoformat()
+            elif name.startswith("from"):
+                arguments[name] = "Hotel"
+            elif locations and ("city" in name or "location" in name):
+                arguments[name] = locations[-1]
+            elif places:
+                arguments[name] = places[min(index, len(places) - 1)]
+            elif example:
+                arguments[name] = example.group(1).strip()
+            else:
+                arguments[name] = keywords(user, 1)[0] if keywords(user, 1) else name
+        return arguments
+
+    def tool_calls(self, request: Dict[str, Any]) -> List[Dict[str, Any]]:
+        user = last_user_message(request["messages"])
+        return [
+            {
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {"name": tool["name"], "arguments": json.dumps(self.tool_arguments(tool, user))}
+            }
+            for tool in self.choose_tools(request)
+        ]
+
+    def wants_tool_calls(self, request: Dict[str, Any]) -> bool:
+        if not request.get("tools") or request.get("tool_choice") == "none":
+            return False
+        # Once tool results are in the conversation, answer instead of calling again
+        return not any(m.get("role") == "tool" for m in request["messages"])
+
+    # --- Content ----------------------------------------------------------
+
+    def json_content(self, request: Dict[str, Any]) -> str:
+        prompt = " ".join(message_text(m) for m in request["messages"])
+        user = last_user_message(request["messages"])
+        if '"steps"' in prompt:
+            topics = keywords(user) or ["the task"]
+            phases = ["Research", "Design", "Build", "Launch", "Measure"]
+            return json.dumps({
+                "analysis": f"The task centres on {', '.join(topics[:3])}. It needs research, execution and review.",
+                "steps": [
+                    {
+                        "step_number": i + 1,
+                        "title": f"{phase} {topics[i % len(topics)]}",
+                        "description": f"{phase} activities for {user[:80]}",
+                        "expected_outcome": f"{phase} deliverables agreed and documented"
+                    }
+                    for i, phase in enumerate(phases)
+                ],
+                "success_criteria": "All steps delivered and reviewed against the original goal"
+            })
+        return json.dumps({"response": self.text_content(request, 60)})
+
+    def text_content(self, request: Dict[str, Any], target_tokens: int) -> str:
+        messages = request["messages"]
+        user = last_user_message(messages)
+        system = next((message_text(m) for m in messages if m.get("role") == "system"), "")
+        topic = ", ".join(keywords(user, 3)) or "the request"
+
+        for pattern, template in self.templates:
+            if pattern.search(user) or pattern.search(system):
+                return template.format(user=user, system=system, topic=topic, model=request.get("model", ""))
+
+        parts = [f"## {topic.title()}", ""]
+        tool_results = [message_text(m) for m in messages if m.get("role") == "tool"]
+        for result in tool_results:
+            parts.append(f"- Based on the tool result: {result[:120]}")
+        i = 0
+        while estimate_tokens("\n".join(parts)) < target_tokens:
+            parts.append(FILLER_SENTENCES[i % len(FILLER_SENTENCES)].format(topic=topic))
+            i += 1
+        return "\n".join(parts)
+
+
+class PrefixCache:
+    """Remembers prompt prefixes in 128-token blocks, like provider-side prompt caching"""
+
+    MIN_TOKENS = 1024
+    BLOCK_TOKENS = 128
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._seen = set()
+
+    @staticmethod
+    def serialize(request: Dict[str, Any]) -> str:
+        # Tools are part of the prompt prefix, ahead of the messages
+        parts = [json.dumps(request.get("tools") or [], sort_keys=True)]
+        parts += [f"{m.get('role')}:{message_text(m)}" for m in request["messages"]]
+        return "\n".join(parts)
+
+    def lookup_and_store(self, request: Dict[str, Any]) -> int:
+        """Cached tokens for this prompt (longest previously seen block prefix); stores its prefixes"""
+        prompt = self.serialize(request)
+        block_chars = self.BLOCK_TOKENS * 4
+        cached = 0
+        digest = hashlib.sha256()
+        for end in range(block_chars, len(prompt) + 1, block_chars):
+            digest.update(prompt[end - block_chars:end].encode("utf-8"))
+            key = digest.hexdigest()
+            tokens = end // 4
+            if key in self._seen:
+                if tokens >= self.MIN_TOKENS:
+                    cached = tokens
+            elif len(self._seen) < self.max_entries:
+                self._seen.add(key)
+        return cached
+
+
+class StubState:
+    """Shared configuration and counters for all handler threads"""
+
+    def __init__(self, args):
+        profile = dict(PROFILES[args.profile])
+        self.ttft = Distribution(args.ttft or profile["ttft"])
+        self.tokens_per_sec = Distribution(args.tokens_per_sec or profile["tokens_per_sec"])
+        self.completion_tokens = Distribution(args.completion_tokens or profile["completion_tokens"])
+        self.error_rate_429 = args.error_rate_429 if args.error_rate_429 is not None else profile.get("error_rate_429", 0.0)
+        self.retry_after = args.retry_after
+        self.rpm = args.rpm
+        self.max_concurrency = args.max_concurrency
+        self.rng = random.Random(args.seed)
+        self.generator = ResponseGenerator(load_templates(args.templates))
+        self.prefix_cache = PrefixCache() if not args.no_prefix_cache else None
+        self.batches = BatchStore(self, args.batch_seconds_per_request)
+        self.lock = threading.Lock()
+        self.recent = deque()
+        self.in_flight = 0
+        self.stats = {"requests": 0, "throttled": 0, "streamed": 0, "tool_calls": 0,
+                      "completion_tokens": 0, "prompt_tokens": 0, "cached_tokens": 0,
+                      "peak_in_flight": 0, "batch_requests": 0, "client_disconnects": 0}
+
+    def sample(self, distribution: Distribution) -> float:
+        with self.lock:
+            return distribution.sample(self.rng)
+
+    def admit(self) -> bool:
+        """Apply 429 injection; returns False if the request should be throttled"""
+        with self.lock:
+            now = time.monotonic()
+            while self.recent and now - self.recent[0] > 60:
+                self.recent.popleft()
+            self.stats["requests"] += 1
+            throttled = (
+                (self.rpm and len(self.recent) >= self.rpm)
+                or (self.max_concurrency and self.in_flight >= self.max_concurrency)
+                or self.rng.random() < self.error_rate_429
+            )
+            if throttled:
+                self.stats["throttled"] += 1
+                return False
+            self.recent.append(now)
+            self.in_flight += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.in_flight)
+            return True
+
+    def cached_tokens(self, request: Dict[str, Any]) -> int:
+        if self.prefix_cache is None:
+            return 0
+        with self.lock:
+            return self.prefix_cache.lookup_and_store(request)
+
+    def generate(self, request: Dict[str, Any], path: str = "") -> Dict[str, Any]:
+        """Generate one completion (content or tool calls, usage and timing) without sending it"""
+        model = request.get("model") or (re.search(r"/deployments/([^/]+)/", path) or [None, "stub"])[1]
+        tool_calls = None
+        if self.generator.wants_tool_calls(request):
+            tool_calls = self.generator.tool_calls(request)
+            content = None
+            completion_tokens = estimate_tokens(json.dumps(tool_calls))
+        else:
+            target = int(self.sample(self.completion_tokens)) or 1
+            if (request.get("response_format") or {}).get("type") == "json_object":
+                content = self.generator.json_content(request)
+            else:
+                content = self.generator.text_content(request, target)
+            completion_tokens = estimate_tokens(content)
+
+        finish_reason = "tool_calls" if tool_calls else "stop"
+        max_tokens = request.get("max_tokens") or request.get("max_completion_tokens")
+        if content is not None and max_tokens and completion_tokens > max_tokens:
+            content = content[:max_tokens * 4]
+            completion_tokens = max_tokens
+            finish_reason = "length"
+
+        prompt_tokens = sum(estimate_tokens(message_text(m)) + 4 for m in request["messages"])
+        if request.get("tools"):
+            prompt_tokens += estimate_tokens(json.dumps(request["tools"]))
+        cached_tokens = min(self.cached_tokens(request), prompt_tokens)
+
+        # Cached prefix tokens skip prefill, which is a large share of the TTFT for long prompts
+        return {
+            "id": f"chatcmpl-stub-{uuid.uuid4().hex[:16]}",
+            "model": model,
+            "content": content,
+            "tool_calls": tool_calls,
+            "finish_reason": finish_reason,
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens}
+            },
+            "ttft": self.sample(self.ttft) / 1000 * (1 - 0.5 * cached_tokens / prompt_tokens),
+            "tokens_per_sec": max(self.sample(self.tokens_per_sec), 1.0)
+        }
+
+    def done(self, completion: Optional[Dict[str, Any]], streamed: bool):
+        with self.lock:
+            self.in_flight -= 1
+            if completion is None:
+                return
+            usage = completion["usage"]
+            self.stats["completion_tokens"] += usage["completion_tokens"]
+            self.stats["prompt_tokens"] += usage["prompt_tokens"]
+            self.stats["cached_tokens"] += usage["prompt_tokens_details"]["cached_tokens"]
+            self.stats["streamed"] += int(streamed)
+            self.stats["tool_calls"] += int(bool(completion["tool_calls"]))
+
+    def record_batch_request(self, completion: Dict[str, Any]):
+        with self.lock:
+            usage = completion["usage"]
+            self.stats["batch_requests"] += 1
+            self.stats["completion_tokens"] += usage["completion_tokens"]
+            self.stats["prompt_tokens"] += usage["prompt_tokens"]
+            self.stats["cached_tokens"] += usage["prompt_tokens_details"]["cached_tokens"]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return dict(self.stats, in_flight=self.in_flight)
+
+
+def load_templates(path: Optional[str]) -> List[Dict[str, str]]:
+    """Templates file: JSON list of {"match": regex, "response": "text with {user}/{topic}/{system}/{model}"}"""
+    if not path:
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def split_tokens(text: str) -> List[str]:
+    """Split text into stream deltas of roughly one token each"""
+    return re.findall(r"\s*\S+|\s+", text)
+
+
+def completion_body(completion: Dict[str, Any]) -> Dict[str, Any]:
+    """Non-streamed chat.completion response for a generated completion"""
+    message = {"role": "assistant", "content": completion["content"]}
+    if completion["tool_calls"]:
+        message["tool_calls"] = completion["tool_calls"]
+    return {
+        "id": completion["id"],
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": completion["model"],
+        "choices": [{"index": 0, "message": message, "finish_reason": completion["finish_reason"]}],
+        "usage": completion["usage"]
+    }
+
+
+def parse_multipart(content_type: str, body: bytes) -> Dict[str, Any]:
+    """Parse a multipart/form-data body into {field: text or (filename, bytes)}"""
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body
+    )
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        payload = part.get_payload(decode=True) or b""
+        filename = part.get_filename()
+        fields[name] = (filename, payload) if filename else payload.decode("utf-8")
+    return fields
+
+
+class BatchStore:
+    """In-memory Files and Batches API; batches are processed on a background thread"""
+
+    def __init__(self, state: "StubState", seconds_per_request: float = 0.0):
+        self.state = state
+        self.seconds_per_request = seconds_per_request
+        self.lock = threading.Lock()
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+
+    def create_file(self, filename: str, purpose: str, content: bytes) -> Dict[str, Any]:
+        file_id = f"file-stub-{uuid.uuid4().hex[:16]}"
+        meta = {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+        with self.lock:
+            self.files[file_id] = {"meta": meta, "content": content}
+        return meta
+
+    def file(self, file_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            return self.files.get(file_id)
+
+    def create_batch(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if self.file(request.get("input_file_id", "")) is None:
+            return None
+        now = int(time.time())
+        batch = {
+            "id": f"batch_stub_{uuid.uuid4().hex[:16]}", "object": "batch",
+            "endpoint": request.get("endpoint", "/chat/completions"), "errors": None,
+            "input_file_id": request["input_file_id"],
+            "completion_window": request.get("completion_window", "24h"),
+            "status": "validating", "output_file_id": None, "error_file_id": None,
+            "created_at": now, "in_progress_at": None, "expires_at": now + 24 * 3600,
+            "finalizing_at": None, "completed_at": None, "failed_at": None, "expired_at": None,
+            "cancelling_at": None, "cancelled_at": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": request.get("metadata")
+        }
+        with self.lock:
+            self.batches[batch["id"]] = batch
+        threading.Thread(target=self._run, args=(batch["id"],), name="stub-batch", daemon=True).start()
+        return dict(batch)
+
+    def batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            batch = self.batches.get(batch_id)
+            return json.loads(json.dumps(batch)) if batch else None
+
+    def cancel(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            batch = self.batches.get(batch_id)
+            if batch and batch["status"] in ("validating", "in_progress"):
+                batch["status"] = "cancelling"
+                batch["cancelling_at"] = int(time.time())
+        return self.batch(batch_id)
+
+    def _result(self, line: str) -> Dict[str, Any]:
+        """Output (or error) file line for one input line"""
+        result = {"id": f"batch_req_{uuid.uuid4().hex[:16]}", "custom_id": None, "response": None, "error": None}
+        try:
+            item = json.loads(line)
+            result["custom_id"] = item.get("custom_id")
+            body = item["body"]
+            if not body.get("messages"):
+                raise ValueError("messages is required")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            result["error"] = {"code": "invalid_request", "message": str(e)}
+            return result
+        completion = self.state.generate(body, item.get("url", ""))
+        result["response"] = {"status_code": 200, "request_id": uuid.uuid4().hex,
+                              "body": completion_body(completion)}
+        self.state.record_batch_request(completion)
+        return result
+
+    def _run(self, batch_id: str):
+        with self.lock:
+            batch = self.batches[batch_id]
+            lines = [line for line in self.files[batch["input_file_id"]]["content"].decode("utf-8").splitlines()
+                     if line.strip()]
+            batch["status"] = "in_progress"
+            batch["in_progress_at"] = int(time.time())
+            batch["request_counts"]["total"] = len(lines)
+
+        outputs, errors = [], []
+        for line in lines:
+            with self.lock:
+                if batch["status"] == "cancelling":
+                    break
+            time.sleep(self.seconds_per_request)
+            result = self._result(line)
+            (errors if result["error"] else outputs).append(result)
+            with self.lock:
+                batch["request_counts"]["failed" if result["error"] else "completed"] += 1
+
+        def to_file(results, suffix):
+            if not results:
+                return None
+            content = "".join(json.dumps(r) + "\n" for r in results).encode("utf-8")
+            return self.create_file(f"{batch_id}_{suffix}.jsonl", "batch_output", content)["id"]
+
+        output_file_id, error_file_id = to_file(outputs, "output"), to_file(errors, "error")
+        with self.lock:
+            now = int(time.time())
+            batch["finalizing_at"] = now
+            batch["output_file_id"] = output_file_id
+            batch["error_file_id"] = error_file_id
+            if batch["status"] == "cancelling":
+                batch["status"], batch["cancelled_at"] = "cancelled", now
+            else:
+                batch["status"], batch["completed_at"] = "completed", now
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: StubState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_not_found(self, what: str):
+        self._send_json(404, {"error": {"code": "not_found", "message": what}})
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        batches = self.state.batches
+        match = re.search(r"/(files|batches)/([^/]+)(/content)?$", path)
+        if path.endswith("/stats"):
+            self._send_json(200, self.state.snapshot())
+        elif path.endswith("/health"):
+            self._send_json(200, {"status": "ok"})
+        elif match and match.group(1) == "files":
+            stored = batches.file(match.group(2))
+            if stored is None:
+                self._send_not_found(match.group(2))
+            elif match.group(3):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(stored["content"])))
+                self.end_headers()
+                self.wfile.write(stored["content"])
+            else:
+                self._send_json(200, stored["meta"])
+        elif match and not match.group(3):
+            batch = batches.batch(match.group(2))
+            self._send_json(200, batch) if batch else self._send_not_found(match.group(2))
+        else:
+            self._send_not_found(self.path)
+
+    def _post_batch_api(self, path: str, body: bytes) -> bool:
+        """Handle Files/Batches API posts; returns False for other paths"""
+        batches = self.state.batches
+        if path.endswith("/files"):
+            fields = parse_multipart(self.headers.get("Content-Type", ""), body)
+            filename, content = fields.get("file") or ("upload.jsonl", b"")
+            self._send_json(200, batches.create_file(filename, fields.get("purpose", "batch"), content))
+        elif path.endswith("/batches"):
+            batch = batches.create_batch(json.loads(body or b"{}"))
+            if batch is None:
+                self._send_json(400, {"error": {"code": "invalid_request", "message": "input_file_id not found"}})
+            else:
+                self._send_json(200, batch)
+        elif re.search(r"/batches/[^/]+/cancel$", path):
+            batch = batches.cancel(path.split("/")[-2])
+            self._send_json(200, batch) if batch else self._send_not_found(path)
+        else:
+            return False
+        return True
+
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if self._post_batch_api(path, body):
+            return
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"code": "invalid_json", "message": "Request body is not JSON"}})
+            return
+        if not path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"code": "not_found", "message": path}})
+            return
+        if not request.get("messages"):
+            self._send_json(400, {"error": {"code": "invalid_request", "message": "messages is required"}})
+            return
+
+        state = self.state
+        if not state.admit():
+            self._send_json(429, {"error": {
+                "code": "429",
+                "message": "Requests to the ChatCompletions_Create Operation have exceeded the rate limit (stub)"
+            }}, headers={"Retry-After": str(state.retry_after)})
+            return
+
+        completion = None
+        try:
+            completion = state.generate(request, path)
+            if request.get("stream"):
+                self._stream(request, completion)
+            else:
+                usage = completion["usage"]
+                time.sleep(completion["ttft"] + usage["completion_tokens"] / completion["tokens_per_sec"])
+                self._send_json(200, completion_body(completion))
+        except (BrokenPipeError, ConnectionResetError):
+            # Client gave up mid-response (e.g. the losing attempt of a hedged request)
+            self.close_connection = True
+            with state.lock:
+                state.stats["client_disconnects"] += 1
+        finally:
+            state.done(completion, bool(request.get("stream")))
+
+    def _stream(self, request: Dict[str, Any], completion: Dict[str, Any]):
+        """Send the completion as Server-Sent Events with chunked transfer encoding"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(choices, extra=None):
+            payload = {"id": completion["id"], "object": "chat.completion.chunk",
+                       "created": int(time.time()), "model": completion["model"], "choices": choices}
+            payload.update(extra or {})
+            self._write_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+        time.sleep(completion["ttft"])
+        event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        if completion["tool_calls"]:
+            for index, call in enumerate(completion["tool_calls"]):
+                event([{"index": 0, "delta": {"tool_calls": [dict(call, index=index)]}, "finish_reason": None}])
+        else:
+            for delta in split_tokens(completion["content"]):
+                time.sleep(1 / completion["tokens_per_sec"])
+                event([{"index": 0, "delta": {"content": delta}, "finish_reason": None}])
+        event([{"index": 0, "delta": {}, "finish_reason": completion["finish_reason"]}])
+
+        if (request.get("stream_options") or {}).get("include_usage"):
+            event([], {"usage": completion["usage"]})
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub server for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="gpt-4o",
+                        help="Latency/throughput preset (explicit flags override it)")
+    parser.add_argument("--ttft", help="Time to first token distribution in ms, e.g. lognormal:450:0.4")
+    parser.add_argument("--tokens-per-sec", help="Generation speed distribution, e.g. normal:80:15")
+    parser.add_argument("--completion-tokens", help="Response length distribution, e.g. normal:350:100")
+    parser.add_argument("--error-rate-429", type=float, help="Probability of a random 429 (0-1)")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests/min ceiling before 429s (0 = none)")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="In-flight ceiling before 429s (0 = none)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--templates", help="JSON file of {match, response} templates")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible runs")
+    parser.add_argument("--no-prefix-cache", action="store_true",
+                        help="Always report cached_tokens=0 (no prompt prefix caching)")
+    parser.add_argument("--batch-seconds-per-request", type=float, default=0.0,
+                        help="Processing time per request in a batch job")
+    return parser
+
+
+def create_server(args) -> ThreadingHTTPServer:
+    """Create (but don't start) a stub server; port 0 picks a free port"""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"state": StubState(args)})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    args = build_parser().parse_args()
+    server = create_server(args)
+    host, port = server.server_address[:2]
+    print(f"🧪 Stub LLM server on http://{host}:{port} (profile: {args.profile})")
+    print(f"   AZURE_AI_ENDPOINT=http://{host}:{port}/cognitiveservices/openai/v1/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+LLM Usage Ledger with per-run budgets
+
+This module records what every chat completion costs:
+- Prompt, completion and cached prompt tokens from response.usage
+- Estimated cost from a configurable price table
+- Tags: demo, run, agent key (e.g. "researcher", "insight_analyst") and plan step
+- Optional per-run token/cost budgets, checked before each uncached call
+- Queries and group-by summaries after the run (memory, or SQLite across processes)
+
+Runs are scoped with usage_run() / start_run(); the run travels with the
+current context, including coroutines started through llm_client.run_async().
+
+Configuration via .env:
+- LLM_PRICE_INPUT_PER_1M (default 2.50 USD)
+- LLM_PRICE_CACHED_INPUT_PER_1M (default 1.25 USD)
+- LLM_PRICE_OUTPUT_PER_1M (default 10.00 USD)
+- LLM_USAGE_SQLITE_PATH (unset = memory only)
+"""
+
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# Fields a record can be filtered or grouped by
+TAG_FIELDS = ("run_id", "demo", "call_site", "agent", "step", "model")
+
+# Token counters summed in summaries
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens")
+
+_context_tags: contextvars.ContextVar = contextvars.ContextVar("llm_usage_tags", default={})
+
+
+class BudgetExceededError(RuntimeError):
+    """Raised before an LLM call once the current run is over its budget"""
+
+
+def _usage_fields(usage) -> Dict[str, int]:
+    """Extract token counts from a response.usage object (or dict)"""
+    if usage is None:
+        return {field: 0 for field in TOKEN_FIELDS}
+    if not isinstance(usage, dict):
+        usage = usage.model_dump()
+    details = usage.get("prompt_tokens_details") or {}
+    return {
+        "prompt_tokens": usage.get("prompt_tokens") or 0,
+        "completion_tokens": usage.get("completion_tokens") or 0,
+        "cached_tokens": details.get("cached_tokens") or 0,
+        "total_tokens": usage.get("total_tokens") or 0
+    }
+
+
+class UsageStore:
+    """SQLite table of usage records, so runs can be queried after the process exits"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS llm_usage (
+                    timestamp REAL NOT NULL,
+                    run_id TEXT,
+                    demo TEXT,
+                    call_site TEXT,
+                    agent TEXT,
+                    step TEXT,
+                    model TEXT,
+                    prompt_tokens INTEGER,
+                    completion_tokens INTEGER,
+                    cached_tokens INTEGER,
+                    total_tokens INTEGER,
+                    cost REAL,
+                    streamed INTEGER,
+                    estimated INTEGER
+                )"""
+            )
+            self._conn.commit()
+
+    def insert(self, record: Dict[str, Any]):
+        columns = list(record.keys())
+        values = [str(v) if k == "step" and v is not None else v for k, v in record.items()]
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO llm_usage ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                values
+            )
+            self._conn.commit()
+
+    def select(self, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        where = " AND ".join(f"{field} = ?" for field in filters)
+        query = "SELECT * FROM llm_usage" + (f" WHERE {where}" if where else "") + " ORDER BY timestamp"
+        with self._lock:
+            cursor = self._conn.execute(query, [str(v) for v in filters.values()])
+            columns = [c[0] for c in cursor.description]
+            rows = cursor.fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+
+class UsageLedger:
+    """Process-wide record of token usage and cost, grouped into budgeted runs"""
+
+    def __init__(self, prices: Optional[Dict[str, float]] = None,
+                 sqlite_path: Optional[str] = None, max_records: int = 10000):
+        self.prices = prices or {"input": 2.50, "cached_input": 1.25, "output": 10.00}
+        self.store = UsageStore(sqlite_path) if sqlite_path else None
+        self._lock = threading.Lock()
+        self._records: deque = deque(maxlen=max_records)
+        # Run totals, oldest first; ended runs beyond max_records are evicted
+        self._runs: Dict[str, Dict[str, Any]] = {}
+        self.max_runs = max_records
+        self._tokens: Dict[str, contextvars.Token] = {}
+
+    # --- Runs -------------------------------------------------------------
+
+    def start_run(self, demo: str, token_budget: Optional[int] = None,
+                  cost_budget: Optional[float] = None) -> str:
+        """
+        Start a run and make it current for this context
+
+        Args:
+            demo: Demo name, e.g. "demo4"
+            token_budget: Stop making calls after this many total tokens (None = unlimited)
+            cost_budget: Stop making calls after this many USD (None = unlimited)
+
+        Returns:
+            The run id
+        """
+        run_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._runs[run_id] = {
+                "run_id": run_id,
+                "demo": demo,
+                "token_budget": token_budget,
+                "cost_budget": cost_budget,
+                "started_at": time.time(),
+                "ended_at": None,
+                "calls": 0,
+                "total_tokens": 0,
+                "cost": 0.0
+            }
+        self._tokens[run_id] = _context_tags.set({"run_id": run_id, "demo": demo})
+        return run_id
+
+    def end_run(self, run_id: str):
+        """Mark the run finished and stop tagging calls with it"""
+        with self._lock:
+            if run_id in self._runs:
+                self._runs[run_id]["ended_at"] = time.time()
+            self._prune_runs()
+        token = self._tokens.pop(run_id, None)
+        try:
+            if token is not None:
+                _context_tags.reset(token)
+        except ValueError:
+            # Ended from a different context than it was started in
+            _context_tags.set({})
+
+    def _prune_runs(self):
+        """Evict the oldest ended runs beyond max_runs (open runs are kept); call with the lock held"""
+        excess = len(self._runs) - self.max_runs
+        if excess <= 0:
+            return
+        ended = [run_id for run_id, run in self._runs.items() if run["ended_at"] is not None]
+        for run_id in ended[:excess]:
+            del self._runs[run_id]
+
+    def current_run(self) -> Optional[str]:
+        return _context_tags.get().get("run_id")
+
+    def current_tags(self, tags: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Context tags (run, demo) merged with call-specific tags (agent, step)"""
+        return dict(_context_tags.get(), **(tags or {}))
+
+    async def bind(self, coro, tags: Optional[Dict[str, Any]] = None):
+        """Run a coroutine on another thread/loop with the caller's run tags"""
+        _context_tags.set(tags if tags is not None else {})
+        return await coro
+
+    def run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            run = self._runs.get(run_id)
+            return dict(run) if run else None
+
+    def budget_exceeded(self, run_id: Optional[str] = None) -> bool:
+        """Whether the run (default: current run) has used up its token or cost budget"""
+        run = self.run(run_id or self.current_run() or "")
+        if run is None:
+            return False
+        if run["token_budget"] and run["total_tokens"] >= run["token_budget"]:
+            return True
+        return bool(run["cost_budget"]) and run["cost"] >= run["cost_budget"]
+
+    def check_budget(self, run_id: Optional[str] = None):
+        """Raise BudgetExceededError if the run is over budget"""
+        if self.budget_exceeded(run_id):
+            run = self.run(run_id or self.current_run())
+            raise BudgetExceededError(
+                f"Run {run['run_id']} ({run['demo']}) exceeded its budget: "
+                f"{run['total_tokens']:,} tokens, ${run['cost']:.4f}"
+            )
+
+    # --- Recording --------------------------------------------------------
+
+    def cost(self, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+        """Estimated USD cost of one call"""
+        return (
+            (prompt_tokens - cached_tokens) * self.prices["input"]
+            + cached_tokens * self.prices["cached_input"]
+            + completion_tokens * self.prices["output"]
+        ) / 1_000_000
+
+    def record(self, call_site: str, model: Optional[str], usage,
+               tags: Optional[Dict[str, Any]] = None, streamed: bool = False,
+               estimated: bool = False) -> Dict[str, Any]:
+        """
+        Record one completed call
+
+        Args:
+            call_site: Name of the calling function, e.g. "demo4.execute_step"
+            model: Deployment name
+            usage: response.usage (or a dict with the same fields)
+            tags: Tags captured when the call was made (see current_tags)
+            streamed: Whether the response was streamed
+            estimated: True if token counts are estimates (streams without usage)
+
+        Returns:
+            The stored record
+        """
+        tags = tags if tags is not None else self.current_tags()
+        tokens = _usage_fields(usage)
+        record = {
+            "timestamp": time.time(),
+            "run_id": tags.get("run_id"),
+            "demo": tags.get("demo") or call_site.split(".")[0],
+            "call_site": call_site,
+            "agent": tags.get("agent"),
+            "step": tags.get("step"),
+            "model": model,
+            **tokens,
+            "cost": self.cost(tokens["prompt_tokens"], tokens["completion_tokens"], tokens["cached_tokens"]),
+            "streamed": streamed,
+            "estimated": estimated
+        }
+
+        with self._lock:
+            self._records.append(record)
+            run = self._runs.get(record["run_id"])
+            if run is not None:
+                run["calls"] += 1
+                run["total_tokens"] += record["total_tokens"]
+                run["cost"] += record["cost"]
+
+        if self.store is not None:
+            try:
+                self.store.insert(record)
+            except sqlite3.Error as e:
+                print(f"⚠️ Usage ledger write failed: {str(e)}")
+        return record
+
+    # --- Queries ----------------------------------------------------------
+
+    def query(self, **filters) -> List[Dict[str, Any]]:
+        """
+        Get usage records matching all filters (e.g. run_id=..., agent="researcher")
+
+        Reads from SQLite when configured, so earlier processes' runs are included.
+        """
+        unknown = set(filters) - set(TAG_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown filter field(s): {', '.join(sorted(unknown))}")
+        if self.store is not None:
+            return self.store.select(filters)
+        with self._lock:
+            records = list(self._records)
+        return [r for r in records if all(str(r[k]) == str(v) for k, v in filters.items())]
+
+    def summarize(self, group_by: str = "agent", **filters) -> Dict[Any, Dict[str, Any]]:
+        """
+        Total tokens and cost per group (e.g. per agent or per step)
+
+        Args:
+            group_by: Tag field to group on
+            **filters: Same filters as query()
+
+        Returns:
+            Dictionary of group value → calls, token counters and cost
+        """
+        groups: Dict[Any, Dict[str, Any]] = {}
+        for record in self.query(**filters):
+            totals = groups.setdefault(record[group_by], dict(
+                {field: 0 for field in TOKEN_FIELDS}, calls=0, cost=0.0
+            ))
+            totals["calls"] += 1
+            totals["cost"] += record["cost"]
+            for field in TOKEN_FIELDS:
+                totals[field] += record[field]
+        return groups
+
+
+@contextmanager
+def usage_run(demo: str, token_budget: Optional[int] = None, cost_budget: Optional[float] = None):
+    """Context manager around start_run/end_run that yields the run id"""
+    run_id = usage_ledger.start_run(demo, token_budget, cost_budget)
+    try:
+        yield run_id
+    finally:
+        usage_ledger.end_run(run_id)
+
+
+# Process-wide ledger shared by all demos
+usage_ledger = UsageLedger(
+    prices={
+        "input": float(os.getenv("LLM_PRICE_INPUT_PER_1M", 2.50)),
+        "cached_input": float(os.getenv("LLM_PRICE_CACHED_INPUT_PER_1M", 1.25)),
+        "output": float(os.getenv("LLM_PRICE_OUTPUT_PER_1M", 10.00))
+    },
+    sqlite_path=os.getenv("LLM_USAGE_SQLITE_PATH") or None
+)
+
+
+def get_usage_summary(group_by: str = "agent", **filters) -> Dict[Any, Dict[str, Any]]:
+    """Get token and cost totals from the shared ledger"""
+    return usage_ledger.summarize(group_by, **filters)
@@ -0,0 +1,106 @@
+"""
+Planning Prompts for Demo 4 (Planning Pattern)
+
+System prompts and chat message builders for the planner, executor and
+reflector agents. They live outside demo4_planning.py so non-UI code (e.g.
+llm_batch.py) can build the same requests without running the Streamlit page.
+"""
+
+from prompt_layout import assemble_messages
+
+
+PLANNER_SYSTEM_PROMPT = """You are an expert task planner. Your job is to break down complex tasks into clear, actionable steps.
+
+For each task, create a plan with:
+1. A brief analysis of the task
+2. 4-6 specific, actionable steps
+3. Expected outcome for each step
+
+Format your response as JSON:
+{
+    "analysis": "Brief analysis of the task",
+    "steps": [
+        {
+            "step_number": 1,
+            "title": "Step title",
+            "description": "What to do",
+            "expected_outcome": "What should result"
+        }
+    ],
+    "success_criteria": "How to know if the task is complete"
+}
+
+Be specific and practical. Each step should be clear enough to execute."""
+
+EXECUTOR_SYSTEM_PROMPT = """You are an expert executor. You receive a step from a plan and execute it thoughtfully.
+
+For each step:
+1. Consider the context and previous results
+2. Execute the step thoroughly
+3. Provide concrete, actionable output
+4. Note any challenges or insights
+
+Keep your response focused and practical (2-3 paragraphs max)."""
+
+REFLECTION_SYSTEM_PROMPT = """You are a reflective analyst. Review the task execution and provide insights.
+
+Analyze:
+1. What went well
+2. What could be improved
+3. Key learnings
+4. Next steps or recommendations
+
+Be concise (3-4 key points total)."""
+
+
+def build_plan_messages(task):
+    """Build the chat messages for creating a plan"""
+    return [
+        {"role": "system", "content": PLANNER_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Create a detailed execution plan for this task: {task}"}
+    ]
+
+
+def build_step_messages(step, task_context, previous_results):
+    """Build the chat messages for executing one plan step (static first, so prompt prefixes cache)"""
+    # The task and completed steps are shared by every later step (each step's
+    # prompt extends the previous one); the current step goes last
+    previous_steps = "\n".join([
+        f"Step {r['step_number']}: {r['result'][:100]}..."
+        for r in previous_results or []
+    ])
+
+    return assemble_messages(
+        EXECUTOR_SYSTEM_PROMPT,
+        [("Task Context", task_context), ("Previous steps completed", previous_steps)],
+        f"""Current Step:
+- Title: {step['title']}
+- Description: {step['description']}
+- Expected Outcome: {step['expected_outcome']}
+
+Execute this step and provide the results."""
+    )
+
+
+def build_reflection_messages(task, plan, results):
+    """Build the chat messages for reflecting on the execution"""
+    results_summary = "\n".join([
+        f"Step {r['step_number']} ({r['title']}): {r['result'][:150]}..."
+        for r in results
+    ])
+
+    return assemble_messages(
+        REFLECTION_SYSTEM_PROMPT,
+        [("Original Task", task), ("Execution Results", results_summary)],
+        "Provide your reflection and insights."
+    )
+
+
+def plan_error(error):
+    """Plan placeholder returned when planning fails"""
+    return {
+        "error": str(error),
+        "analysis": "Failed to create plan",
+        "steps": [],
+        "success_criteria": "N/A"
+    }
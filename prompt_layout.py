@@ -0,0 +1,61 @@
+"""
+Prefix-Cache-Friendly Prompt Assembly
+
+Azure OpenAI caches the longest previously seen prompt prefix (in 128-token
+blocks, from 1024 tokens up) and bills/serves those tokens faster. A cache hit
+needs the prompt to be byte-identical up to the point where it changes, so
+this module builds every prompt in the same order:
+1. Static system prompt (and tool schemas, sent before the messages)
+2. Stable context: content shared by many calls, e.g. the demo4 task, earlier
+   results (append-only, so one step's prompt is a prefix of the next), or
+   retrieved documents in a fixed order
+3. The variable request last: the question, the current step, the agent's ask
+
+Everything is serialized deterministically (sorted JSON keys, no trailing
+whitespace), so the same content always produces the same bytes.
+
+Cached prompt tokens per call are reported from response.usage in
+llm_metrics.py (prefix-cache hit rate, latency with vs without a hit) and
+llm_usage.py (cached tokens per agent/step).
+"""
+
+import json
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+
+def canonical_json(value: Any) -> str:
+    """Serialize JSON deterministically (sorted keys, compact separators)"""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def normalize_text(text: str) -> str:
+    """Strip trailing whitespace per line so incidental spacing doesn't change the prefix"""
+    return "\n".join(line.rstrip() for line in str(text).strip().splitlines())
+
+
+def render_section(title: str, body: str) -> str:
+    """Render one titled block of prompt content"""
+    return f"{title}:\n{normalize_text(body)}"
+
+
+def assemble_messages(system_prompt: str,
+                      stable_context: Optional[Sequence[Tuple[str, str]]] = None,
+                      request: str = "") -> List[Dict[str, str]]:
+    """
+    Build chat messages with static content first and the variable request last
+
+    Args:
+        system_prompt: The static system prompt
+        stable_context: (title, body) sections ordered from most to least stable;
+            empty bodies are skipped
+        request: The per-call variable part (question, current step, instruction)
+
+    Returns:
+        [system message, user message] ready for chat_completion
+    """
+    sections = [render_section(title, body) for title, body in (stable_context or []) if body]
+    sections.append(normalize_text(request))
+    return [
+        {"role": "system", "content": normalize_text(system_prompt)},
+        {"role": "user", "content": "\n\n".join(sections)}
+    ]
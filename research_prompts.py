@@ -0,0 +1,215 @@
+"""
+Research Prompts for Demo 5 (Trend Research System)
+
+Research questions, agent definitions and the Insight Analyst / Report
+Generator message builders. They live outside demo5_trend_research.py so
+non-UI code (e.g. llm_batch.py) can build the same requests without running
+the Streamlit page.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+
+
+# Research questions for marketing agencies
+RESEARCH_QUESTIONS = {
+    "gen_z_nigeria": {
+        "title": "Gen Z Nigeria: Facebook vs Google Usage",
+        "question": "Why does Gen Z in Nigeria appear to use Facebook for community and content discovery, while using Google primarily for functional, task-based searches?",
+        "focus": "Social behavior patterns, platform preferences, user motivations",
+        "search_terms": ["Gen Z Nigeria Facebook", "Nigeria Google usage", "Nigerian social media behavior"]
+    },
+    "detty_december": {
+        "title": "Detty December Tourism Analysis",
+        "question": "Beyond the parties, what are the core drivers and frustrations for the diaspora and domestic tourists participating in 'Detty December' in Nigeria and Ghana?",
+        "focus": "Tourism motivations, pain points, diaspora engagement",
+        "search_terms": ["Detty December Nigeria Ghana", "Diaspora tourism Africa", "December tourism West Africa"]
+    },
+    "creator_economy": {
+        "title": "African Creator Economy Challenges",
+        "question": "What are the primary financial challenges and unmet needs of emerging creators and gamers in key African markets?",
+        "focus": "Monetization barriers, infrastructure gaps, creator pain points",
+        "search_terms": ["African creators challenges", "African gamers monetization", "Creator economy Africa"]
+    },
+    "mpesa_competition": {
+        "title": "M-Pesa Market Dominance Analysis",
+        "question": "What are the primary drivers of M-Pesa's dominance in East Africa, and what specific user frustrations or unmet needs could a competitor leverage to capture market share among the digital-native population?",
+        "focus": "Competitive analysis, user pain points, market opportunities",
+        "search_terms": ["M-Pesa dominance East Africa", "Mobile money Kenya", "M-Pesa competition"]
+    }
+}
+
+# Agent definitions
+AGENTS = {
+    "orchestrator": {
+        "name": "Research Orchestrator",
+        "icon": "🎯",
+        "color": "#FF6B6B",
+        "role": "coordinator",
+        "system_prompt": """You are a Research Orchestrator for a marketing agency.
+Your role is to coordinate multi-source research projects and ensure comprehensive data collection.
+Break down research questions into specific data collection tasks for specialized agents."""
+    },
+    "social_media": {
+        "name": "Social Media Intelligence Agent",
+        "icon": "📱",
+        "color": "#4ECDC4",
+        "role": "data_collector",
+        "system_prompt": """You are a Social Media Intelligence Agent specializing in Twitter/X, TikTok, and Reddit analysis.
+Analyze social media data for trends, sentiment, engagement patterns, and audience insights.
+Focus on actionable insights for marketing strategies."""
+    },
+    "trends": {
+        "name": "Trends Analysis Agent",
+        "icon": "📈",
+        "color": "#45B7D1",
+        "role": "data_collector",
+        "system_prompt": """You are a Trends Analysis Agent specializing in Google Trends data.
+Analyze search trends, regional interest, related queries, and temporal patterns.
+Identify rising trends and seasonal patterns relevant to marketing campaigns."""
+    },
+    "web_intelligence": {
+        "name": "Web Intelligence Agent",
+        "icon": "🌐",
+        "color": "#96CEB4",
+        "role": "data_collector",
+        "system_prompt": """You are a Web Intelligence Agent specializing in web search and content analysis.
+Analyze news articles, blog posts, reports, and online discussions.
+Extract key themes, expert opinions, and market signals."""
+    },
+    "insight_analyst": {
+        "name": "Insight Analyst Agent",
+        "icon": "🔍",
+        "color": "#FFEAA7",
+        "role": "analyst",
+        "system_prompt": """You are an Insight Analyst Agent for a marketing agency.
+Synthesize data from multiple sources to identify patterns, trends, and actionable insights.
+Focus on: audience behavior, market opportunities, competitive dynamics, and strategic recommendations."""
+    },
+    "report_generator": {
+        "name": "Report Generator Agent",
+        "icon": "📄",
+        "color": "#DFE6E9",
+        "role": "synthesizer",
+        "system_prompt": """You are a Report Generator Agent for a marketing agency.
+Create comprehensive, client-ready research reports with:
+- Executive Summary
+- Key Findings
+- Platform-specific Insights
+- Audience Demographics
+- Sentiment Analysis
+- Actionable Recommendations
+- Data Sources
+
+Use clear, professional language suitable for marketing executives."""
+    }
+}
+
+
+def collect_research_data(question_data, apis) -> Dict[str, Any]:
+    """Phase 1 without the UI: collect data from every source for a question, in parallel"""
+    term = question_data["search_terms"][0]
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        twitter = pool.submit(apis["twitter"].search_tweets, term, max_results=50)
+        tiktok = pool.submit(apis["tiktok"].search_videos, term, max_results=30)
+        reddit = pool.submit(apis["reddit"].search_posts, term, max_results=50)
+        trends = pool.submit(apis["google_trends"].get_trends, term)
+        web = pool.submit(apis["web_search"].search, term, max_results=20)
+        return {
+            "social_media": {
+                "twitter": twitter.result(),
+                "tiktok": tiktok.result(),
+                "reddit": reddit.result()
+            },
+            "trends": trends.result(),
+            "web_intelligence": web.result()
+        }
+
+
+def build_insights_messages(all_data, question_data):
+    """Build the Insight Analyst prompt from all collected data"""
+    data_summary = f"""
+Research Question: {question_data['question']}
+
+TWITTER/X DATA:
+- Total tweets: {all_data['social_media']['twitter']['total_results']}
+- Sentiment: {all_data['social_media']['twitter']['metrics']['sentiment_breakdown']}
+- Top hashtags: {all_data['social_media']['twitter']['metrics']['top_hashtags']}
+- Geographic distribution: {all_data['social_media']['twitter']['metrics']['geographic_distribution']}
+
+TIKTOK DATA:
+- Total videos: {all_data['social_media']['tiktok']['total_results']}
+- Total views: {all_data['social_media']['tiktok']['metrics']['total_views']:,}
+- Engagement rate: {all_data['social_media']['tiktok']['metrics']['total_engagement_rate']}%
+- Age demographics: {all_data['social_media']['tiktok']['metrics']['age_demographics']}
+
+REDDIT DATA:
+- Total posts: {all_data['social_media']['reddit']['total_results']}
+- Total comments: {all_data['social_media']['reddit']['metrics']['total_comments']}
+- Top subreddits: {all_data['social_media']['reddit']['metrics']['top_subreddits']}
+- Discussion intensity: {all_data['social_media']['reddit']['metrics']['discussion_intensity']}
+
+GOOGLE TRENDS:
+- Search volume index: {all_data['trends']['search_volume_index']}
+- Trending status: {all_data['trends']['trending_status']}
+- Regional interest: {all_data['trends']['regional_interest']}
+- Related queries: {all_data['trends']['related_queries']}
+
+WEB INTELLIGENCE:
+- Total sources: {all_data['web_intelligence']['total_results']}
+- News articles: {all_data['web_intelligence']['metrics']['news_articles']}
+- Blog posts: {all_data['web_intelligence']['metrics']['blog_posts']}
+- Top domains: {all_data['web_intelligence']['metrics']['top_domains']}
+
+Analyze this data and identify:
+1. Key patterns and trends
+2. Audience behavior insights
+3. Platform-specific findings
+4. Market opportunities
+5. Strategic implications for marketing
+"""
+    
+    return [
+        {"role": "system", "content": AGENTS["insight_analyst"]["system_prompt"]},
+        {"role": "user", "content": data_summary}
+    ]
+
+
+
+def build_report_messages(all_data, insights, question_data):
+    """Build the Report Generator prompt from insights and raw data"""
+    report_prompt = f"""
+Create a comprehensive marketing research report for the following question:
+
+{question_data['question']}
+
+INSIGHTS FROM ANALYSIS:
+{insights}
+
+RAW DATA SUMMARY:
+- Twitter: {all_data['social_media']['twitter']['total_results']} tweets, {all_data['social_media']['twitter']['metrics']['sentiment_breakdown']}
+- TikTok: {all_data['social_media']['tiktok']['total_results']} videos, {all_data['social_media']['tiktok']['metrics']['total_views']:,} views
+- Reddit: {all_data['social_media']['reddit']['total_results']} posts, {all_data['social_media']['reddit']['metrics']['total_comments']} comments
+- Google Trends: Index {all_data['trends']['search_volume_index']}, Status: {all_data['trends']['trending_status']}
+- Web Sources: {all_data['web_intelligence']['total_results']} articles
+
+Create a client-ready report with these sections:
+1. EXECUTIVE SUMMARY (2-3 paragraphs)
+2. KEY FINDINGS (5-7 bullet points)
+3. PLATFORM INSIGHTS
+   - Twitter/X Analysis
+   - TikTok Analysis
+   - Reddit Analysis
+   - Google Trends Analysis
+4. AUDIENCE DEMOGRAPHICS & BEHAVIOR
+5. SENTIMENT ANALYSIS
+6. ACTIONABLE RECOMMENDATIONS (5-7 specific actions)
+7. DATA SOURCES & METHODOLOGY
+
+Use professional, clear language suitable for marketing executives.
+"""
+    
+    return [
+        {"role": "system", "content": AGENTS["report_generator"]["system_prompt"]},
+        {"role": "user", "content": report_prompt}
+    ]
@@ -0,0 +1,268 @@
+"""
+Semantic Answer Cache using local embeddings
+
+This module provides a near-duplicate answer cache for chat and RAG:
+- Local, CPU-only embeddings (hashed word + character n-gram TF-IDF)
+- Cosine similarity search over a bounded NumPy matrix
+- Configurable similarity threshold
+- Corpus versioning, so cached RAG answers are dropped when the knowledge base changes
+
+Rephrasings like "How much does Azure AI Foundry cost?" and
+"Azure AI Foundry pricing?" map to the same cached answer in milliseconds.
+Exact repeats are already handled by llm_cache.py; this layer catches paraphrases.
+
+Configuration via .env:
+- SEMANTIC_CACHE_ENABLED (default true)
+- SEMANTIC_CACHE_THRESHOLD cosine similarity, 0-1 (default 0.85)
+- SEMANTIC_CACHE_MAX_ENTRIES (default 256)
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# Words that carry no meaning for matching questions
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "do", "does", "did",
+    "what", "whats", "how", "much", "many", "which", "who", "when", "where", "why",
+    "i", "me", "my", "we", "our", "you", "your", "it", "its", "this", "that",
+    "of", "for", "to", "in", "on", "at", "by", "with", "and", "or", "about",
+    "can", "could", "should", "would", "will", "please", "tell", "there", "s"
+}
+
+# Small synonym map so common rephrasings share features
+SYNONYMS = {
+    "cost": "price", "costs": "price", "pricing": "price", "prices": "price",
+    "priced": "price", "expensive": "price", "fee": "price", "fees": "price",
+    "included": "include", "includes": "include", "including": "include",
+    "event": "conference", "conf": "conference",
+    "patterns": "pattern", "agents": "agent", "agentic": "agent",
+    "features": "feature", "tools": "tool", "details": "detail",
+    "start": "begin", "starts": "begin", "begins": "begin"
+}
+
+
+def _env_flag(name: str, default: str = "true") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def corpus_fingerprint(corpus: Any) -> str:
+    """
+    Fingerprint a corpus (e.g. KNOWLEDGE_BASE) so changes can be detected
+
+    Args:
+        corpus: Any JSON-serializable structure
+
+    Returns:
+        Short SHA-256 hex digest
+    """
+    data = json.dumps(corpus, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
+
+class HashedNgramEmbedder:
+    """Maps text to a fixed-size sparse-ish term-frequency vector via feature hashing"""
+
+    def __init__(self, dim: int = 4096):
+        self.dim = dim
+
+    def tokenize(self, text: str) -> List[str]:
+        words = re.findall(r"[a-z0-9]+", text.lower().replace(".net", "dotnet"))
+        return [SYNONYMS.get(w, w) for w in words if w not in STOPWORDS]
+
+    def features(self, text: str) -> List[str]:
+        tokens = self.tokenize(text)
+        feats = [f"w:{t}" for t in tokens]
+        feats += [f"b:{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+        for token in tokens:
+            padded = f"<{token}>"
+            feats += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        return feats
+
+    def term_frequencies(self, text: str) -> np.ndarray:
+        """Sublinear term frequencies (1 + log tf) in hashed feature space"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self.features(text):
+            vector[zlib.crc32(feature.encode("utf-8")) % self.dim] += 1.0
+        nonzero = vector > 0
+        vector[nonzero] = 1.0 + np.log(vector[nonzero])
+        return vector
+
+
+class SemanticCache:
+    """Bounded semantic cache: cosine similarity over hashed TF-IDF vectors"""
+
+    def __init__(self, threshold: float = 0.85, max_entries: int = 256,
+                 dim: int = 4096, enabled: bool = True):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.embedder = HashedNgramEmbedder(dim)
+        self._lock = threading.Lock()
+        self._tf = np.zeros((max_entries, dim), dtype=np.float32)
+        self._doc_freq = np.zeros(dim, dtype=np.float32)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._corpus_versions: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _idf(self) -> np.ndarray:
+        count = sum(1 for entry in self._entries if entry is not None)
+        return np.log((1.0 + count) / (1.0 + self._doc_freq)) + 1.0
+
+    def _free_slot(self) -> int:
+        for slot, entry in enumerate(self._entries):
+            if entry is None:
+                return slot
+        # Evict the least recently used entry
+        slot = min(range(self.max_entries), key=lambda i: self._entries[i]["last_used"])
+        self._remove(slot)
+        self.evictions += 1
+        return slot
+
+    def _remove(self, slot: int):
+        self._doc_freq -= (self._tf[slot] > 0)
+        self._tf[slot] = 0
+        self._entries[slot] = None
+
+    def lookup(self, namespace: str, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Find the most similar cached query in the same namespace
+
+        Args:
+            namespace: Isolates entries (call site, model, agent, retrieved docs...)
+            query: The user's question
+
+        Returns:
+            Dictionary with answer, matched query and similarity, or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        query_tf = self.embedder.term_frequencies(query)
+        with self._lock:
+            slots = [i for i, entry in enumerate(self._entries)
+                     if entry is not None and entry["namespace"] == namespace]
+            if not slots or not query_tf.any():
+                self.misses += 1
+                return None
+
+            idf = self._idf()
+            candidates = self._tf[slots] * idf
+            query_vec = query_tf * idf
+            norms = np.linalg.norm(candidates, axis=1) * np.linalg.norm(query_vec)
+            similarities = (candidates @ query_vec) / np.maximum(norms, 1e-9)
+
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            entry = self._entries[slots[best]]
+            entry["last_used"] = time.time()
+            entry["hits"] += 1
+            self.hits += 1
+            return {"answer": entry["answer"], "matched_query": entry["query"], "similarity": similarity}
+
+    def store(self, namespace: str, query: str, answer: str):
+        """
+        Cache an answer for a query
+
+        Args:
+            namespace: Same namespace used for lookup
+            query: The user's question
+            answer: The model's answer
+        """
+        if not self.enabled:
+            return
+
+        query_tf = self.embedder.term_frequencies(query)
+        if not query_tf.any():
+            return
+
+        with self._lock:
+            slot = self._free_slot()
+            self._tf[slot] = query_tf
+            self._doc_freq += (query_tf > 0)
+            self._entries[slot] = {
+                "namespace": namespace,
+                "query": query,
+                "answer": answer,
+                "last_used": time.time(),
+                "hits": 0
+            }
+
+    def invalidate(self, namespace_prefix: str = ""):
+        """Drop all entries whose namespace starts with the prefix ("" drops everything)"""
+        with self._lock:
+            for slot, entry in enumerate(self._entries):
+                if entry is not None and entry["namespace"].startswith(namespace_prefix):
+                    self._remove(slot)
+            self.invalidations += 1
+
+    def sync_corpus(self, namespace_prefix: str, version: str):
+        """
+        Invalidate a namespace when its underlying corpus changes
+
+        Args:
+            namespace_prefix: Namespace prefix the corpus feeds (e.g. "demo2")
+            version: Current corpus fingerprint (see corpus_fingerprint)
+        """
+        previous = self._corpus_versions.get(namespace_prefix)
+        self._corpus_versions[namespace_prefix] = version
+        if previous is not None and previous != version:
+            self.invalidate(namespace_prefix)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "entries": sum(1 for entry in self._entries if entry is not None),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+
+# Process-wide semantic cache shared by app.py and demo2
+semantic_cache = SemanticCache(
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.85)),
+    max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 256)),
+    enabled=_env_flag("SEMANTIC_CACHE_ENABLED")
+)
+
+
+def get_semantic_cache_stats() -> Dict[str, Any]:
+    """Get hit/miss counters for the shared semantic cache"""
+    return semantic_cache.stats()
+
+
+# Test function
+if __name__ == "__main__":
+    cache = SemanticCache(threshold=0.6, max_entries=4)
+    cache.store("demo", "How much does Azure AI Foundry cost and what's included?", "answer")
+
+    for question in ["Azure AI Foundry pricing?", "What does GitHub Copilot offer?"]:
+        start = time.perf_counter()
+        result = cache.lookup("demo", question)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"{question!r}: {result} ({elapsed_ms:.2f} ms)")
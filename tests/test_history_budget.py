@@ -0,0 +1,41 @@
+"""Tests for history_budget.HistoryBudgeter"""
+
+from history_budget import HistoryBudgeter, count_message_tokens, count_tokens, MESSAGE_OVERHEAD_TOKENS
+
+SYSTEM_PROMPT = "You are a helpful agent."
+
+
+def _sent_tokens(result):
+    return count_tokens(SYSTEM_PROMPT) + MESSAGE_OVERHEAD_TOKENS + count_message_tokens(result["messages"])
+
+
+def test_history_within_budget_is_sent_unchanged():
+    history = [{"role": "user", "content": "How can we improve retention?"}]
+    result = HistoryBudgeter(max_prompt_tokens=500).fit(SYSTEM_PROMPT, history)
+
+    assert result["messages"] == history
+    assert result["truncated_query"] is False
+
+
+def test_oversized_query_alone_is_truncated_to_fit():
+    query = "Please analyze our customer retention strategy in detail. " * 42  # ~2.4k characters
+    history = [{"role": "user", "content": query}]
+    result = HistoryBudgeter(max_prompt_tokens=500).fit(SYSTEM_PROMPT, history)
+
+    assert result["truncated_query"] is True
+    assert len(result["messages"]) == 1
+    assert query.startswith(result["messages"][0]["content"][:100])
+    assert result["prompt_tokens"] == _sent_tokens(result) <= 500
+
+
+def test_oversized_query_drops_earlier_turns():
+    query = "Please analyze our customer retention strategy in detail. " * 42
+    history = [
+        {"role": "user", "content": query},
+        {"role": "assistant", "content": "[Analyst]: Retention depends on onboarding."}
+    ]
+    result = HistoryBudgeter(max_prompt_tokens=500).fit(SYSTEM_PROMPT, history)
+
+    assert result["truncated_query"] is True
+    assert result["dropped_turns"] == 1
+    assert result["prompt_tokens"] <= 500
@@ -0,0 +1,41 @@
+"""Tests for intent_router.IntentRouter"""
+
+from intent_router import IntentRouter, IntentClassifier, EXTRACTORS, RULES
+
+POEM = "Was the weather in Cape Town on 2025-11-22 good for the picnic last year? write a poem"
+CITIES = ["Cape Town", "Johannesburg", "Durban", "Pretoria", "Seattle", "London"]
+
+
+def _router(**kwargs):
+    return IntentRouter(IntentClassifier(list(EXTRACTORS), RULES), EXTRACTORS, **kwargs)
+
+
+def _train(router, count=30):
+    for i in range(count):
+        city = CITIES[i % len(CITIES)]
+        router.learn(f"What's the weather like in {city} on November {10 + i % 15}, 2025?", ["get_weather"])
+        router.learn(f"Tell me about the venue for .NET Conf in {city}", ["get_venue_info"])
+
+
+def test_untrained_router_declines():
+    router = _router()
+
+    assert router.predict("What's the weather like in Cape Town on November 22, 2025?") is None
+    assert router.stats()["fallbacks"]["untrained"] == 1
+
+
+def test_keyword_match_alone_does_not_clear_the_threshold():
+    router = _router(min_examples=0)
+
+    assert router.classifier.predict(POEM)["get_weather"] == 0.5
+    assert router.predict(POEM) is None
+
+
+def test_trained_router_routes_familiar_questions_only():
+    router = _router()
+    _train(router)
+
+    routed = router.predict("What's the weather like in Durban on November 3, 2025?")
+    assert [call["name"] for call in routed["tool_calls"]] == ["get_weather"]
+    assert routed["tool_calls"][0]["arguments"]["city"] == "Durban"
+    assert router.predict(POEM) is None
@@ -0,0 +1,17 @@
+"""Tests for llm_usage.UsageLedger"""
+
+from llm_usage import UsageLedger
+
+
+def test_ended_runs_beyond_the_cap_are_evicted_oldest_first():
+    ledger = UsageLedger(max_records=3)
+    open_run = ledger.start_run("demo4")
+    ended = []
+    for _ in range(5):
+        run_id = ledger.start_run("demo5")
+        ledger.end_run(run_id)
+        ended.append(run_id)
+
+    assert ledger.run(open_run) is not None
+    assert [ledger.run(run_id) is not None for run_id in ended] == [False, False, False, True, True]
+    ledger.end_run(open_run)
@@ -0,0 +1,14 @@
+"""Tests for tool_agent's tool execution helpers"""
+
+import asyncio
+
+import pytest
+
+# Needs the LLM client dependencies (openai, httpx) from requirements.txt
+tool_agent = pytest.importorskip("tool_agent")
+
+
+def test_no_tool_calls_run_nothing():
+    assert list(tool_agent.run_tools([])) == []
+    assert tool_agent.execute_tool_calls([]) == []
+    assert asyncio.run(tool_agent.execute_tool_calls_async([])) == []
@@ -0,0 +1,45 @@
+"""Tests for tool result caching of the Demo 1 conference tools"""
+
+import pytest
+
+import conference_tools
+from conference_tools import registry, WEATHER_DATA
+from tool_cache import tool_cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(conference_tools, "MOCK_LATENCY_SECONDS", 0)
+    tool_cache.clear()
+    yield
+    tool_cache.clear()
+
+
+def test_weather_cache_shared_across_casings_returns_the_right_forecast():
+    first = registry.run("get_weather", {"city": "cape town", "date": "2025-11-22"})
+    second = registry.run("get_weather", {"city": "Cape Town", "date": "November 22, 2025"})
+
+    assert first["result"] == WEATHER_DATA["Cape Town"]
+    assert second["cached"] is True
+    assert second["result"] == WEATHER_DATA["Cape Town"]
+
+
+def test_weather_batch_mixed_casings_get_the_same_forecast():
+    results = registry.run("get_weather_batch", {"queries": [
+        {"city": "CAPE TOWN", "date": "2025-11-22"},
+        {"city": "Cape Town", "date": "2025-11-23"}
+    ]})["result"]
+
+    assert [r["temperature"] for r in results] == [WEATHER_DATA["Cape Town"]["temperature"]] * 2
+    assert [r["city"] for r in results] == ["CAPE TOWN", "Cape Town"]
+
+
+def test_travel_time_echoes_each_callers_locations():
+    registry.run("calculate_travel_time", {"from_location": "cape town airport", "to_location": "cticc"})
+    other = registry.run("calculate_travel_time", {"from_location": "Cape Town Airport", "to_location": "CTICC"})
+    spaced = registry.run("calculate_travel_time", {"from_location": " Cape Town  Airport", "to_location": "CTICC "})
+
+    assert other["cached"] is False
+    assert (other["result"]["from"], other["result"]["to"]) == ("Cape Town Airport", "CTICC")
+    assert spaced["cached"] is True
+    assert (spaced["result"]["from"], spaced["result"]["to"]) == ("Cape Town Airport", "CTICC")
@@ -0,0 +1,71 @@
+"""Tests for tool_registry.ToolRegistry deadlines"""
+
+import asyncio
+import threading
+import time
+
+from tool_registry import ToolRegistry, CancelScope
+
+
+def _registry_with_stuck_slot():
+    """Registry whose single-slot tool is held by a call that ignores cancellation"""
+    registry = ToolRegistry(default_timeout=0.2)
+    release = threading.Event()
+
+    @registry.tool(max_concurrency=1)
+    def lookup(query: str) -> dict:
+        """
+        Look something up
+
+        Args:
+            query: What to look up
+        """
+        if query == "stuck":
+            release.wait(5)  # Non-cooperative: never checks its scope
+        return {"query": query}
+
+    holder = threading.Thread(target=registry.run, args=("lookup", {"query": "stuck"}, CancelScope(None)))
+    holder.start()
+    time.sleep(0.05)
+    return registry, release, holder
+
+
+def test_queued_call_times_out_at_its_deadline():
+    registry, release, holder = _registry_with_stuck_slot()
+    try:
+        start = time.perf_counter()
+        outcome = registry.run("lookup", {"query": "next"})
+        elapsed = time.perf_counter() - start
+    finally:
+        release.set()
+        holder.join()
+
+    assert outcome["timed_out"] is True
+    assert 0.15 < elapsed < 1.0
+    assert outcome["seconds"] >= 0.15  # Queue time counts
+    assert registry.stats()["lookup"]["timeouts"] == 1
+
+
+def test_async_queued_call_times_out_at_its_deadline():
+    registry, release, holder = _registry_with_stuck_slot()
+    try:
+        start = time.perf_counter()
+        outcome = asyncio.run(registry.arun("lookup", {"query": "next"}))
+        elapsed = time.perf_counter() - start
+    finally:
+        release.set()
+        holder.join()
+
+    assert outcome["timed_out"] is True
+    assert elapsed < 1.0
+
+
+def test_queueing_counts_towards_seconds():
+    registry, release, holder = _registry_with_stuck_slot()
+    threading.Timer(0.1, release.set).start()
+    outcome = registry.run("lookup", {"query": "next"}, CancelScope(2))
+    holder.join()
+
+    assert outcome["timed_out"] is False
+    assert outcome["result"] == {"query": "next"}
+    assert outcome["seconds"] >= 0.05
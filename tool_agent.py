@@ -0,0 +1,413 @@
+"""
+Conference Assistant Tool Agent (Demo 1)
+
+The model → tools → model loop behind demo1_tool_use.py, importable without
+Streamlit:
+- run_agent_events() yields an event as each step happens, so the UI can
+  render the loop live: model_call_start, model_call_complete, tool_start,
+  tool_finish (as each tool completes), turn_complete and final_answer,
+  each with the seconds elapsed since the run started
+- All tool calls of a turn run concurrently (tools from conference_tools.py);
+  tool messages are appended in the assistant's tool_calls order
+- Each call has its tool's deadline and the whole turn TOOL_TURN_TIMEOUT_SECONDS;
+  a call past its deadline is cancelled and the model gets a "timed out"
+  result (with any partial data) instead of the loop waiting on it
+- Repeated questions replay the tool plan remembered by trajectory_cache.py,
+  and questions intent_router.py is confident about run the predicted tools:
+  either way the planning model call(s) are skipped
+- Tool results are compacted before they go back to the model
+  (tool_compaction.py); the run reports the prompt tokens saved
+- run_agent_with_tools() / run_agent_with_tools_async() return the final
+  result with per-tool and per-turn timing
+"""
+
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Iterator
+
+from dotenv import load_dotenv
+from openai.types.chat import ChatCompletionMessage, ChatCompletionMessageToolCall
+
+from conference_tools import TOOLS, registry
+from llm_client import chat_completion, achat_completion
+from prompt_layout import canonical_json
+from tool_compaction import create_compactor
+from intent_router import intent_router
+from trajectory_cache import trajectory_cache
+
+load_dotenv()
+
+CALL_SITE = "demo1.run_agent_with_tools"
+MAX_ITERATIONS = 5
+
+# Upper bound for all tool calls of one turn (each tool also has its own timeout)
+TURN_TIMEOUT_SECONDS = float(os.getenv("TOOL_TURN_TIMEOUT_SECONDS", 15))
+
+# Slack for a cooperative tool to report its own timeout (with partial data) before it's abandoned
+CANCEL_GRACE_SECONDS = 0.1
+
+SYSTEM_PROMPT = """You are a helpful conference assistant. You help attendees prepare for conferences.
+            When asked about conference preparation, use the available tools to gather information about:
+            - Weather conditions
+            - Venue details
+            - Travel times
+            For several cities, dates or trip legs, use the batch tools to fetch them in one call.
+            Then provide comprehensive, personalized advice based on the tool results."""
+
+
+def build_initial_messages(user_message: str) -> List[Dict[str, Any]]:
+    """Build the opening conversation for the tool agent"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_message}
+    ]
+
+
+def assistant_tool_call_message(assistant_message) -> Dict[str, Any]:
+    """Convert an assistant message with tool calls into a conversation entry"""
+    return {
+        "role": "assistant",
+        "content": assistant_message.content,
+        "tool_calls": [
+            {
+                "id": tc.id,
+                "type": "function",
+                "function": {
+                    "name": tc.function.name,
+                    "arguments": tc.function.arguments
+                }
+            } for tc in assistant_message.tool_calls
+        ]
+    }
+
+
+def parse_tool_calls(tool_calls) -> List[tuple]:
+    """(tool_call, name, arguments) for each tool call in an assistant message"""
+    return [(tc, tc.function.name, json.loads(tc.function.arguments)) for tc in tool_calls]
+
+
+def run_tools(parsed: List[tuple]) -> Iterator[tuple]:
+    """
+    Run one turn's parsed tool calls concurrently, yielding (index, outcome) as each finishes
+
+    Each call gets its tool's deadline, capped at TURN_TIMEOUT_SECONDS. A call still
+    running past its deadline is cancelled and reported as timed out right away;
+    its worker thread is left to wind down instead of being waited for.
+    """
+    if not parsed:
+        return
+    turn_start = time.perf_counter()
+    scopes = [registry.scope_for(name, TURN_TIMEOUT_SECONDS) for _, name, _ in parsed]
+    executor = ThreadPoolExecutor(max_workers=len(parsed))
+    futures = {executor.submit(registry.run, name, args, scope): index
+               for index, ((_, name, args), scope) in enumerate(zip(parsed, scopes))}
+    pending = set(futures)
+    try:
+        while pending:
+            deadlines = [scopes[futures[f]].time_left() for f in pending]
+            deadlines = [left for left in deadlines if left is not None]
+            timeout = max(min(deadlines), 0) + CANCEL_GRACE_SECONDS if deadlines else None
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield futures[future], future.result()
+            for future in list(pending):
+                index = futures[future]
+                left = scopes[index].time_left()
+                if left is not None and left <= 0:
+                    pending.discard(future)
+                    yield index, registry.time_out(parsed[index][1], scopes[index],
+                                                   time.perf_counter() - turn_start)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def execute_tool_calls(tool_calls) -> List[tuple]:
+    """
+    Execute one turn's tool calls concurrently, within their deadlines
+
+    Returns:
+        (tool_call, name, arguments, outcome) in the original order, so the tool
+        messages line up with the assistant's tool_calls; outcome is
+        registry.run's {"result", "cached", "seconds", "timed_out"}
+    """
+    parsed = parse_tool_calls(tool_calls)
+    if not parsed:
+        return []
+    outcomes = [None] * len(parsed)
+    for index, outcome in run_tools(parsed):
+        outcomes[index] = outcome
+    return [(tc, name, args, outcome) for (tc, name, args), outcome in zip(parsed, outcomes)]
+
+
+async def execute_tool_calls_async(tool_calls) -> List[tuple]:
+    """Async variant of execute_tool_calls (timed-out calls are cancelled by registry.arun)"""
+    parsed = parse_tool_calls(tool_calls)
+    outcomes = await asyncio.gather(*[registry.arun(name, args, registry.scope_for(name, TURN_TIMEOUT_SECONDS))
+                                      for _, name, args in parsed])
+    return [(tc, name, args, outcome) for (tc, name, args), outcome in zip(parsed, outcomes)]
+
+
+def record_tool_turn(messages, compactor, tool_calls_made, turns, iteration, model_seconds, executed, tool_seconds,
+                     planned_by="model"):
+    """Append the turn's (compacted) tool messages in call order, and its timing to the run's log"""
+    for tool_call, function_name, function_args, outcome in executed:
+        tool_calls_made.append({
+            "name": function_name,
+            "arguments": function_args,
+            "status": "timed_out" if outcome.get("timed_out") else "completed",
+            "result": outcome["result"],
+            "cached": outcome["cached"],
+            "timed_out": outcome.get("timed_out", False),
+            "iteration": iteration,
+            "seconds": outcome["seconds"]
+        })
+        messages.append(compactor.tool_message(tool_call.id, function_name, outcome["result"]))
+    turns.append({
+        "iteration": iteration,
+        "model_seconds": model_seconds,
+        "tool_calls": len(executed),
+        "tool_seconds": tool_seconds,
+        "sequential_tool_seconds": sum(outcome["seconds"] for _, _, _, outcome in executed),
+        "timed_out": sum(1 for _, _, _, outcome in executed if outcome.get("timed_out")),
+        "planned_by": planned_by
+    })
+
+
+def final_turn(iteration: int, model_seconds: float) -> Dict[str, Any]:
+    """Timing entry for the turn that produced the answer"""
+    return {"iteration": iteration, "model_seconds": model_seconds, "tool_calls": 0,
+            "tool_seconds": 0.0, "sequential_tool_seconds": 0.0, "timed_out": 0, "planned_by": "model"}
+
+
+def replayed_assistant_message(iteration: int, tool_turn: List[Dict[str, Any]]) -> ChatCompletionMessage:
+    """Assistant message issuing a tool turn planned without the model (cached or routed)"""
+    return ChatCompletionMessage(role="assistant", content=None, tool_calls=[
+        ChatCompletionMessageToolCall(
+            id=f"call_replay_{iteration}_{index}",
+            type="function",
+            function={"name": call["name"], "arguments": canonical_json(call["arguments"])}
+        ) for index, call in enumerate(tool_turn)
+    ])
+
+
+def plan_tool_turns(user_message: str):
+    """
+    Tool turns to run before asking the model, if they can be planned locally
+
+    Returns:
+        (tool turns or None, "trajectory_cache" | "intent_router" | "model", event for the UI or None)
+    """
+    trajectory = trajectory_cache.lookup(user_message, TOOLS)
+    if trajectory:
+        return trajectory, "trajectory_cache", {"type": "trajectory_hit", "tool_turns": len(trajectory)}
+    routed = intent_router.predict(user_message)
+    if routed:
+        return [routed["tool_calls"]], "intent_router", {
+            "type": "intent_routed",
+            "tools": [call["name"] for call in routed["tool_calls"]],
+            "confidence": routed["confidence"]
+        }
+    return None, "model", None
+
+
+def learn_from_run(user_message: str, planned_by: str, tool_calls_made: List[Dict[str, Any]],
+                   turns: List[Dict[str, Any]]):
+    """Feed the model's tool choices back into the trajectory cache and the intent router"""
+    model_turns = [turn for turn in turns if turn["planned_by"] == "model" and turn["tool_calls"]]
+    if planned_by == "model":
+        remember_trajectory(user_message, tool_calls_made, turns)
+    elif planned_by == "intent_router" and model_turns:
+        intent_router.record_correction()
+    else:
+        return  # Replayed, or routed exactly right: nothing new to learn
+    intent_router.learn(user_message, sorted({call["name"] for call in tool_calls_made}))
+
+
+def remember_trajectory(user_message: str, tool_calls_made: List[Dict[str, Any]], turns: List[Dict[str, Any]]):
+    """Store the run's tool plan unless a tool failed (the plan may not be worth repeating)"""
+    if any(isinstance(call["result"], dict) and "error" in call["result"] for call in tool_calls_made):
+        return
+    plan = {}
+    for call in tool_calls_made:
+        plan.setdefault(call["iteration"], []).append({"name": call["name"], "arguments": call["arguments"]})
+    planning_seconds = sum(turn["model_seconds"] for turn in turns if turn["tool_calls"])
+    trajectory_cache.store(user_message, TOOLS, [plan[i] for i in sorted(plan)], planning_seconds)
+
+
+def _tool_turn_events(messages, compactor, tool_calls_made, turns, iteration, model_seconds, assistant_message,
+                      planned_by="model") -> Iterator[Dict[str, Any]]:
+    """Run one turn's tool calls concurrently, yielding tool_start/tool_finish/turn_complete events"""
+    messages.append(assistant_tool_call_message(assistant_message))
+
+    parsed = parse_tool_calls(assistant_message.tool_calls)
+    tool_start = time.perf_counter()
+    for index, (_, name, args) in enumerate(parsed):
+        yield {"type": "tool_start", "iteration": iteration, "index": index, "name": name, "arguments": args}
+    outcomes = [None] * len(parsed)
+    # Report each tool as it finishes (or times out); messages still follow the tool_calls order
+    for index, outcome in run_tools(parsed):
+        outcomes[index] = outcome
+        yield dict(outcome, type="tool_finish", iteration=iteration, index=index,
+                   name=parsed[index][1], arguments=parsed[index][2])
+
+    executed = [(tc, name, args, outcome) for (tc, name, args), outcome in zip(parsed, outcomes)]
+    record_tool_turn(messages, compactor, tool_calls_made, turns, iteration, model_seconds,
+                     executed, time.perf_counter() - tool_start, planned_by=planned_by)
+    yield dict(turns[-1], type="turn_complete")
+
+
+def run_agent_events(client, user_message: str) -> Iterator[Dict[str, Any]]:
+    """
+    Run the tool agent, yielding an event as each step starts or finishes
+
+    A question seen before replays its cached tool plan (trajectory_cache.py),
+    and one the intent router is confident about runs the predicted tools
+    (intent_router.py); both go straight to the final model call.
+
+    Args:
+        client: Client from get_azure_client()
+        user_message: The user's question
+
+    Yields:
+        Event dictionaries with "type" and "elapsed" (seconds since the run started);
+        the last one is final_answer with "response", "tool_calls", "turns",
+        "planned_by" (who chose the first tool turn) and "compaction" (prompt tokens saved)
+    """
+    deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
+    run_start = time.perf_counter()
+
+    def timed(event):
+        event["elapsed"] = time.perf_counter() - run_start
+        return event
+
+    messages = build_initial_messages(user_message)
+    compactor = create_compactor(registry)
+    tool_calls_made = []
+    turns = []
+    iterations = 0
+
+    plan, planned_by, plan_event = plan_tool_turns(user_message)
+    if plan_event:
+        yield timed(plan_event)
+    for tool_turn in plan or []:
+        iterations += 1
+        for event in _tool_turn_events(messages, compactor, tool_calls_made, turns, iterations, 0.0,
+                                       replayed_assistant_message(iterations, tool_turn), planned_by=planned_by):
+            yield timed(event)
+
+    while iterations < MAX_ITERATIONS:
+        iterations += 1
+
+        compactor.prepare(messages)
+        yield timed({"type": "model_call_start", "iteration": iterations})
+        model_start = time.perf_counter()
+        response = chat_completion(
+            client, CALL_SITE,
+            model=deployment_name,
+            messages=messages,
+            tools=TOOLS,
+            tool_choice="auto"
+        )
+        model_seconds = time.perf_counter() - model_start
+        assistant_message = response.choices[0].message
+        yield timed({
+            "type": "model_call_complete",
+            "iteration": iterations,
+            "seconds": model_seconds,
+            "tool_calls": len(assistant_message.tool_calls or [])
+        })
+
+        if not assistant_message.tool_calls:
+            turns.append(final_turn(iterations, model_seconds))
+            learn_from_run(user_message, planned_by, tool_calls_made, turns)
+            yield timed({
+                "type": "final_answer",
+                "response": assistant_message.content,
+                "tool_calls": tool_calls_made,
+                "turns": turns,
+                "planned_by": planned_by,
+                "compaction": compactor.report()
+            })
+            return
+
+        for event in _tool_turn_events(messages, compactor, tool_calls_made, turns, iterations, model_seconds,
+                                       assistant_message):
+            yield timed(event)
+
+    yield timed({
+        "type": "final_answer",
+        "response": "Maximum iterations reached",
+        "tool_calls": tool_calls_made,
+        "turns": turns,
+        "planned_by": planned_by,
+        "compaction": compactor.report()
+    })
+
+
+def run_agent_with_tools(client, user_message: str) -> Dict[str, Any]:
+    """Run agent with tool calling capability (returns the final_answer event)"""
+    for event in run_agent_events(client, user_message):
+        if event["type"] == "final_answer":
+            return event
+
+
+async def run_agent_with_tools_async(client, user_message: str) -> Dict[str, Any]:
+    """Async variant of run_agent_with_tools (takes the async client, no events)"""
+    deployment_name = os.getenv("AZURE_AI_MODEL_NAME", "gpt-4")
+
+    messages = build_initial_messages(user_message)
+    compactor = create_compactor(registry)
+    tool_calls_made = []
+    turns = []
+    iterations = 0
+
+    async def run_tool_turn(assistant_message, model_seconds, planned_by="model"):
+        messages.append(assistant_tool_call_message(assistant_message))
+        tool_start = time.perf_counter()
+        executed = await execute_tool_calls_async(assistant_message.tool_calls)
+        record_tool_turn(messages, compactor, tool_calls_made, turns, iterations, model_seconds,
+                         executed, time.perf_counter() - tool_start, planned_by=planned_by)
+
+    plan, planned_by, _ = plan_tool_turns(user_message)
+    for tool_turn in plan or []:
+        iterations += 1
+        await run_tool_turn(replayed_assistant_message(iterations, tool_turn), 0.0, planned_by=planned_by)
+
+    while iterations < MAX_ITERATIONS:
+        iterations += 1
+
+        compactor.prepare(messages)
+        model_start = time.perf_counter()
+        response = await achat_completion(
+            client, CALL_SITE,
+            model=deployment_name,
+            messages=messages,
+            tools=TOOLS,
+            tool_choice="auto"
+        )
+        model_seconds = time.perf_counter() - model_start
+        assistant_message = response.choices[0].message
+
+        if not assistant_message.tool_calls:
+            turns.append(final_turn(iterations, model_seconds))
+            learn_from_run(user_message, planned_by, tool_calls_made, turns)
+            return {
+                "response": assistant_message.content,
+                "tool_calls": tool_calls_made,
+                "turns": turns,
+                "planned_by": planned_by,
+                "compaction": compactor.report()
+            }
+
+        await run_tool_turn(assistant_message, model_seconds)
+
+    return {
+        "response": "Maximum iterations reached",
+        "tool_calls": tool_calls_made,
+        "turns": turns,
+        "planned_by": planned_by,
+        "compaction": compactor.report()
+    }
@@ -0,0 +1,151 @@
+"""
+Tool Result Cache
+
+Agents call the same tools with the same arguments over and over (weather in
+Cape Town, the .NET Conf venue), and every call pays the tool's full latency.
+This cache memoizes tool results for tools registered with a cache_ttl
+(see tool_registry.py):
+- Keyed on the tool name and its normalized arguments: defaults filled in,
+  strings trimmed and case-folded, dates in canonical YYYY-MM-DD form
+  (per-parameter normalizers can be set when registering the tool, e.g.
+  collapse_whitespace for values a tool echoes back in its result)
+- Per-tool TTL (short for weather, long for venue details)
+- In-memory LRU with a size bound (shared by all tools)
+- Error results and exceptions are never cached
+- Hits, misses and seconds saved per tool
+
+Configuration via .env:
+- TOOL_CACHE_ENABLED (default true)
+- TOOL_CACHE_MAX_ENTRIES (default 1024)
+"""
+
+import copy
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable
+
+from dotenv import load_dotenv
+
+from llm_cache import LRUCache
+from prompt_layout import canonical_json
+
+load_dotenv()
+
+DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%B %d, %Y", "%B %d %Y", "%d %B %Y",
+                "%b %d, %Y", "%b %d %Y", "%d %b %Y")
+
+
+def normalize_text(value: Any) -> Any:
+    """Trim, collapse whitespace and case-fold strings (other values pass through)"""
+    if not isinstance(value, str):
+        return value
+    return " ".join(value.split()).casefold()
+
+
+def collapse_whitespace(value: Any) -> Any:
+    """Trim and collapse whitespace but keep case (for values echoed back in a result)"""
+    if not isinstance(value, str):
+        return value
+    return " ".join(value.split())
+
+
+def canonical_date(value: Any) -> Any:
+    """Dates in any common format → YYYY-MM-DD (unparseable values are only text-normalized)"""
+    if isinstance(value, str):
+        text = " ".join(value.replace("th,", ",").split())
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(text, fmt).strftime("%Y-%m-%d")
+            except ValueError:
+                continue
+    return normalize_text(value)
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return normalize_text(value)
+
+
+class ToolResultCache:
+    """LRU memo of tool results with per-tool TTLs"""
+
+    def __init__(self, max_entries: int = 1024, enabled: bool = True):
+        self.enabled = enabled
+        self.memory = LRUCache(max_entries)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def key(self, tool_name: str, arguments: Dict[str, Any],
+            normalizers: Optional[Dict[str, Callable[[Any], Any]]] = None) -> str:
+        """Cache key for a tool call (arguments should already include defaults)"""
+        normalizers = normalizers or {}
+        normalized = {
+            name: normalizers[name](value) if name in normalizers else _normalize(value)
+            for name, value in arguments.items()
+        }
+        return f"{tool_name}:{canonical_json(normalized)}"
+
+    def _count(self, tool_name: str, field: str, amount: float = 1):
+        with self._lock:
+            stats = self._stats.setdefault(tool_name, {"hits": 0, "misses": 0, "seconds_saved": 0.0})
+            stats[field] += amount
+
+    def lookup(self, tool_name: str, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached result
+
+        Returns:
+            {"result": ..., "seconds": original execution time} or None on a miss
+        """
+        entry = self.memory.get(key)
+        if entry is None:
+            self._count(tool_name, "misses")
+            return None
+        self._count(tool_name, "hits")
+        self._count(tool_name, "seconds_saved", entry["seconds"])
+        # Callers may modify the result; keep the cached copy intact
+        return {"result": copy.deepcopy(entry["result"]), "seconds": entry["seconds"]}
+
+    def store(self, key: str, result: Any, seconds: float, ttl: float):
+        """Cache a successful result (error results are skipped)"""
+        if isinstance(result, dict) and "error" in result:
+            return
+        self.memory.set(key, {"result": copy.deepcopy(result), "seconds": seconds}, ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters overall and per tool"""
+        with self._lock:
+            per_tool = {name: dict(values) for name, values in self._stats.items()}
+        hits = sum(s["hits"] for s in per_tool.values())
+        misses = sum(s["misses"] for s in per_tool.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": (hits / (hits + misses)) if hits + misses else 0.0,
+            "seconds_saved": sum(s["seconds_saved"] for s in per_tool.values()),
+            "entries": len(self.memory),
+            "evictions": self.memory.evictions,
+            "by_tool": per_tool
+        }
+
+    def clear(self):
+        """Drop all cached results and reset counters"""
+        self.memory.clear()
+        with self._lock:
+            self._stats.clear()
+
+
+# Process-wide tool result cache shared by all sessions
+tool_cache = ToolResultCache(
+    max_entries=int(os.getenv("TOOL_CACHE_MAX_ENTRIES", 1024)),
+    enabled=os.getenv("TOOL_CACHE_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+)
+
+
+def get_tool_cache_stats() -> Dict[str, Any]:
+    """Get hit/miss counters for the shared tool result cache"""
+    return tool_cache.stats()
@@ -0,0 +1,181 @@
+"""
+Tool Result Compaction for the Demo 1 tool agent
+
+Every model call in the tool loop resends all earlier tool results, so
+verbose payloads quickly dominate prompt tokens (and latency). This module
+shrinks what the model is sent, without changing what the UI shows:
+- Per-tool projection to the fields the model needs (result_fields= on
+  @registry.tool; applied to each item of a list result), empty values dropped
+- Compact serialization (sorted keys, no whitespace)
+- A per-message size cap: lists keep as many items as fit plus an "omitted"
+  count, anything else is cut off with a marker
+- Once a model call has seen a tool result and answered (it has been
+  consumed), the result is reduced to a one-line summary for later calls;
+  replayed turns with no model call in between keep their full results
+- Sent vs uncompacted prompt tokens per run
+
+Token counts are estimated at ~4 characters per token (see history_budget.py).
+
+Configuration via .env:
+- TOOL_COMPACTION_ENABLED (default true)
+- TOOL_RESULT_MAX_TOKENS size cap per tool message (default 400)
+- TOOL_SUMMARY_MAX_TOKENS size of a consumed result's summary (default 60)
+"""
+
+import os
+from typing import Dict, Any, List, Optional
+
+from dotenv import load_dotenv
+
+from history_budget import count_tokens, MESSAGE_OVERHEAD_TOKENS
+from prompt_layout import canonical_json
+
+load_dotenv()
+
+TRUNCATION_MARKER = "…(truncated)"
+
+
+def _is_error(result: Any) -> bool:
+    return isinstance(result, dict) and "error" in result
+
+
+def project(result: Any, fields: Optional[List[str]]) -> Any:
+    """Keep only the listed keys of a dict result, or of each dict in a list result"""
+    if fields is None or _is_error(result):
+        return result
+    if isinstance(result, list):
+        return [project(item, fields) for item in result]
+    if isinstance(result, dict):
+        return {key: result[key] for key in fields if key in result}
+    return result
+
+
+def drop_empty(value: Any) -> Any:
+    """Remove None, empty strings and empty containers (recursively)"""
+    if isinstance(value, dict):
+        cleaned = {key: drop_empty(item) for key, item in value.items()}
+        return {key: item for key, item in cleaned.items() if item not in (None, "", [], {})}
+    if isinstance(value, list):
+        return [drop_empty(item) for item in value if item not in (None, "", [], {})]
+    return value
+
+
+def cap(result: Any, max_tokens: int) -> str:
+    """Serialize a result compactly within a token budget"""
+    serialized = canonical_json(result)
+    if count_tokens(serialized) <= max_tokens:
+        return serialized
+    if isinstance(result, list):
+        for keep in range(len(result) - 1, 0, -1):
+            shortened = canonical_json({"items": result[:keep], "omitted": len(result) - keep})
+            if count_tokens(shortened) <= max_tokens:
+                return shortened
+    return serialized[:max(max_tokens * 4 - len(TRUNCATION_MARKER), 0)] + TRUNCATION_MARKER
+
+
+def _flatten(value: Any) -> str:
+    if isinstance(value, dict):
+        return ", ".join(f"{key}={_flatten(item)}" for key, item in value.items())
+    if isinstance(value, list):
+        return "; ".join(_flatten(item) for item in value)
+    return str(value)
+
+
+def summarize(name: str, result: Any, max_tokens: int) -> str:
+    """One-line summary of a consumed tool result"""
+    text = f"[{name}, already used] {_flatten(result)}"
+    if count_tokens(text) <= max_tokens:
+        return text
+    return text[:max(max_tokens * 4 - len(TRUNCATION_MARKER), 0)] + TRUNCATION_MARKER
+
+
+def prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Estimate prompt tokens for chat messages, including assistant tool calls"""
+    total = 0
+    for message in messages:
+        total += count_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+        for tool_call in message.get("tool_calls") or []:
+            total += count_tokens(tool_call["function"]["name"] + tool_call["function"]["arguments"])
+    return total
+
+
+class ToolResultCompactor:
+    """Builds compact tool messages for one agent run and tracks the tokens saved"""
+
+    def __init__(self, registry, enabled: bool = True, max_tokens: int = 400, summary_tokens: int = 60):
+        self.registry = registry
+        self.enabled = enabled
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        # Per tool message: [message, full content, projected result, tool name, model calls before it, summarized]
+        self._tool_messages: List[list] = []
+        self.model_calls = 0
+        self.raw_prompt_tokens = 0
+        self.sent_prompt_tokens = 0
+        self.summarized = 0
+
+    def tool_message(self, tool_call_id: str, name: str, result: Any) -> Dict[str, Any]:
+        """
+        Tool message for a result (compacted unless disabled)
+
+        Args:
+            tool_call_id: The assistant's tool call id
+            name: Tool name
+            result: The tool's full result
+        """
+        full = canonical_json(result)
+        projected = result
+        content = full
+        if self.enabled:
+            tool = self.registry.get(name)
+            projected = drop_empty(project(result, tool.result_fields if tool else None))
+            content = cap(projected, self.max_tokens)
+        message = {"role": "tool", "tool_call_id": tool_call_id, "name": name, "content": content}
+        self._tool_messages.append([message, full, projected, name, self.model_calls, False])
+        return message
+
+    def prepare(self, messages: List[Dict[str, Any]]):
+        """
+        Summarize consumed tool results and count this model call's prompt tokens
+
+        Call right before every model call: a result is consumed once a model call
+        made after it has answered (not just once a later iteration ran, since
+        replayed trajectory turns run without model calls in between).
+        """
+        for entry in self._tool_messages:
+            message, _, projected, name, calls_before, summarized = entry
+            if self.enabled and not summarized and calls_before < self.model_calls:
+                message["content"] = summarize(name, projected, self.summary_tokens)
+                entry[5] = True
+                self.summarized += 1
+        sent = prompt_tokens(messages)
+        extra = sum(count_tokens(full) - count_tokens(message["content"])
+                    for message, full, _, _, _, _ in self._tool_messages)
+        self.sent_prompt_tokens += sent
+        self.raw_prompt_tokens += sent + extra
+        self.model_calls += 1
+
+    def report(self) -> Dict[str, Any]:
+        """Prompt tokens sent vs without compaction, summed over the run's model calls"""
+        saved = self.raw_prompt_tokens - self.sent_prompt_tokens
+        return {
+            "raw_prompt_tokens": self.raw_prompt_tokens,
+            "sent_prompt_tokens": self.sent_prompt_tokens,
+            "saved_tokens": saved,
+            "saved_ratio": (saved / self.raw_prompt_tokens) if self.raw_prompt_tokens else 0.0,
+            "summarized_results": self.summarized
+        }
+
+
+def _env_flag(name: str, default: str = "true") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def create_compactor(registry) -> ToolResultCompactor:
+    """New per-run compactor configured from the environment"""
+    return ToolResultCompactor(
+        registry,
+        enabled=_env_flag("TOOL_COMPACTION_ENABLED"),
+        max_tokens=int(os.getenv("TOOL_RESULT_MAX_TOKENS", 400)),
+        summary_tokens=int(os.getenv("TOOL_SUMMARY_MAX_TOKENS", 60))
+    )
@@ -0,0 +1,524 @@
+"""
+Tool Registry for function-calling agents
+
+Tools are plain functions registered with a decorator; everything the model
+and the agent loop need is derived once, at import:
+- JSON schema from the signature and type hints (str/int/float/bool, lists,
+  dicts, Optional, Literal → enum); parameters without a default are required
+- Tool description from the docstring's first paragraph, parameter
+  descriptions from its "Args:" section
+- Dispatch by dict lookup instead of an if/elif chain
+- Sync and async tools, callable from sync code (worker threads) or coroutines
+- Optional per-tool concurrency limit (e.g. for a rate-limited backend API)
+- Optional result memoization with a per-tool TTL (see tool_cache.py)
+- Optional projection of the result fields the model needs (see tool_compaction.py)
+- Per-tool deadlines with cooperative cancellation: a CancelScope travels with
+  each call, tools check it (cancellable_sleep, check_cancelled), and a call
+  that runs out of time returns a structured "timed out" result, with any
+  partial data, instead of blocking its caller
+- Call counts, errors, timeouts and time per tool
+
+Example:
+
+    registry = ToolRegistry()
+
+    @registry.tool(max_concurrency=4, cache_ttl=600, normalizers={"date": canonical_date})
+    def get_weather(city: str, date: str) -> dict:
+        \"\"\"
+        Get weather forecast for a specific city and date
+
+        Args:
+            city: The city name, e.g. Cape Town
+            date: The date in YYYY-MM-DD format
+        \"\"\"
+
+    registry.schemas()   # → the "tools" list for chat.completions.create
+    registry.execute("get_weather", {"city": "Cape Town", "date": "2025-11-22"})
+    registry.run("get_weather", {...})   # → {"result", "cached", "seconds"}
+
+Batch tools can share a single tool's cache entries with registry.batch(),
+which sends only the uncached items to a vectorized backend.
+"""
+
+import asyncio
+import contextvars
+import inspect
+import re
+import threading
+import time
+import typing
+from typing import Dict, Any, List, Optional, Callable
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean",
+               list: "array", dict: "object"}
+
+
+def _json_schema(annotation) -> Dict[str, Any]:
+    """JSON schema for a type hint (unannotated parameters are strings)"""
+    if annotation is inspect.Parameter.empty or annotation is Any:
+        return {"type": "string"}
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Literal:
+        return {"type": _JSON_TYPES.get(type(args[0]), "string"), "enum": list(args)}
+    if origin is typing.Union:
+        # Optional[X] → X (optionality comes from the default)
+        options = [arg for arg in args if arg is not type(None)]
+        return _json_schema(options[0]) if len(options) == 1 else {}
+    if origin in (list, tuple, typing.List, typing.Tuple):
+        return {"type": "array", "items": _json_schema(args[0]) if args else {}}
+    if origin in (dict, typing.Dict):
+        return {"type": "object"}
+    if inspect.isclass(annotation) and typing.is_typeddict(annotation):
+        hints = typing.get_type_hints(annotation)
+        return {
+            "type": "object",
+            "properties": {name: _json_schema(hint) for name, hint in hints.items()},
+            "required": sorted(annotation.__required_keys__)
+        }
+    return {"type": _JSON_TYPES.get(annotation, "string")}
+
+
+class ToolTimeout(Exception):
+    """Raised inside a tool when its deadline passes or its caller cancels it"""
+
+    def __init__(self, message: str = "Tool call timed out", partial: Any = None):
+        super().__init__(message)
+        self.partial = partial
+
+
+class CancelScope:
+    """Deadline and cancel flag shared by a running tool call and whoever waits for it"""
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._timed_out = False
+
+    def cancel(self):
+        """Ask the tool to stop (it notices at its next check)"""
+        self._cancelled.set()
+
+    def time_left(self) -> Optional[float]:
+        """Seconds until the deadline (None = no deadline)"""
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        left = self.time_left()
+        return self._cancelled.is_set() or (left is not None and left <= 0)
+
+    def check(self):
+        if self.cancelled:
+            raise ToolTimeout()
+
+    def sleep(self, seconds: float):
+        """Sleep, waking up early (and raising ToolTimeout) on cancellation or the deadline"""
+        left = self.time_left()
+        if left is not None and left < seconds:
+            self._cancelled.wait(max(left, 0))
+            raise ToolTimeout()
+        if self._cancelled.wait(seconds):
+            raise ToolTimeout()
+
+    def mark_timed_out(self) -> bool:
+        """Record that this call timed out; True only the first time (so it's counted once)"""
+        with self._lock:
+            first, self._timed_out = not self._timed_out, True
+            return first
+
+
+_current_scope: contextvars.ContextVar = contextvars.ContextVar("tool_cancel_scope", default=None)
+
+
+def current_scope() -> CancelScope:
+    """The running tool call's scope (a scope without a deadline outside tool calls)"""
+    return _current_scope.get() or CancelScope()
+
+
+def check_cancelled():
+    """Raise ToolTimeout if the running tool call is past its deadline or cancelled"""
+    current_scope().check()
+
+
+def cancellable_sleep(seconds: float):
+    """time.sleep for tools: returns early with ToolTimeout when the call is cancelled"""
+    current_scope().sleep(seconds)
+
+
+def timeout_result(name: str, seconds: float, partial: Any = None) -> Dict[str, Any]:
+    """Structured result the model gets for a tool call that ran out of time"""
+    return {
+        "error": f"{name} timed out after {seconds:.1f}s",
+        "timed_out": True,
+        "partial_data": partial
+    }
+
+
+def _parse_docstring(doc: Optional[str]):
+    """(description, {parameter: description}) from a docstring with an "Args:" section"""
+    doc = inspect.cleandoc(doc or "")
+    sections = re.split(r"\n\s*(?:Args|Returns|Raises):\s*\n", doc)
+    description = " ".join(sections[0].split("\n\n")[0].split())
+    params = {}
+    match = re.search(r"Args:\s*\n(.*?)(?:\n\s*\n|\n\s*(?:Returns|Raises):|\Z)", doc, re.S)
+    if match:
+        name = None
+        for line in match.group(1).splitlines():
+            entry = re.match(r"\s*(\w+)(?:\s*\([^)]*\))?:\s*(.*)", line)
+            if entry:
+                name = entry.group(1)
+                params[name] = entry.group(2).strip()
+            elif name and line.strip():
+                params[name] += " " + line.strip()
+    return description, params
+
+
+class Tool:
+    """A registered tool: the function, its schema, concurrency limit, cache policy and result fields"""
+
+    def __init__(self, func: Callable, name: Optional[str] = None, description: Optional[str] = None,
+                 max_concurrency: Optional[int] = None, cache_ttl: Optional[float] = None,
+                 normalizers: Optional[Dict[str, Callable[[Any], Any]]] = None,
+                 result_fields: Optional[List[str]] = None, timeout: Optional[float] = None):
+        self.func = func
+        self.name = name or func.__name__
+        self.is_async = inspect.iscoroutinefunction(func)
+        self.max_concurrency = max_concurrency
+        self.cache_ttl = cache_ttl
+        self.normalizers = normalizers or {}
+        self.result_fields = result_fields
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self.parameters = list(inspect.signature(func).parameters.values())
+        self.schema = self._build_schema(description)
+
+    def _build_schema(self, description: Optional[str]) -> Dict[str, Any]:
+        doc_description, param_docs = _parse_docstring(self.func.__doc__)
+        hints = typing.get_type_hints(self.func)
+        properties = {}
+        for param in self.parameters:
+            prop = _json_schema(hints.get(param.name, param.annotation))
+            if param_docs.get(param.name):
+                prop["description"] = param_docs[param.name]
+            properties[param.name] = prop
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": description or doc_description,
+                "parameters": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": [p.name for p in self.parameters if p.default is inspect.Parameter.empty]
+                }
+            }
+        }
+
+    def bind(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Check model-supplied arguments against the signature and fill in defaults (raises TypeError)"""
+        bound = inspect.signature(self.func).bind(**arguments)
+        bound.apply_defaults()
+        return dict(bound.arguments)
+
+    def acquire(self, scope: Optional[CancelScope] = None):
+        """Take a concurrency slot, waiting no longer than the scope's deadline (raises ToolTimeout)"""
+        if self._slots:
+            left = scope.time_left() if scope else None
+            if not self._slots.acquire(timeout=None if left is None else max(left, 0)):
+                raise ToolTimeout(f"No free {self.name} slot before the deadline")
+
+    async def aacquire(self, scope: Optional[CancelScope] = None):
+        """Async variant of acquire"""
+        # The limit is shared with sync callers, so poll the thread semaphore instead of blocking the loop
+        if self._slots:
+            while not self._slots.acquire(blocking=False):
+                if scope and scope.cancelled:
+                    raise ToolTimeout(f"No free {self.name} slot before the deadline")
+                left = scope.time_left() if scope else None
+                await asyncio.sleep(0.01 if left is None else min(0.01, max(left, 0)))
+
+    def release(self):
+        if self._slots:
+            self._slots.release()
+
+
+class ToolRegistry:
+    """Name → Tool table with schema generation, sync/async dispatch and result caching"""
+
+    def __init__(self, cache=None, default_timeout: Optional[float] = None):
+        self.cache = cache
+        self.default_timeout = default_timeout
+        self._tools: Dict[str, Tool] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def tool(self, func: Optional[Callable] = None, *, name: Optional[str] = None,
+             description: Optional[str] = None, max_concurrency: Optional[int] = None,
+             cache_ttl: Optional[float] = None, normalizers: Optional[Dict[str, Callable[[Any], Any]]] = None,
+             result_fields: Optional[List[str]] = None, timeout: Optional[float] = None):
+        """
+        Register a function as a tool (use as @registry.tool or @registry.tool(...))
+
+        Args:
+            func: The tool function (sync or async)
+            name: Tool name (default: the function name)
+            description: Tool description (default: the docstring's first paragraph)
+            max_concurrency: Maximum simultaneous executions of this tool (default: unlimited)
+            cache_ttl: Seconds to reuse a result for the same normalized arguments
+                (default: not cached; needs a registry cache)
+            normalizers: Parameter name → function normalizing its value for the cache key
+                (default: strings trimmed and case-folded)
+            result_fields: Keys of a dict result (or of each dict in a list result) the model
+                needs to see (default: all; the full result is still returned to the caller)
+            timeout: Seconds before a call is cancelled and returns a timeout result
+                (default: the registry's default_timeout)
+
+        Returns:
+            The function, unchanged
+        """
+        def register(f: Callable) -> Callable:
+            tool = Tool(f, name=name, description=description, max_concurrency=max_concurrency,
+                        cache_ttl=cache_ttl, normalizers=normalizers, result_fields=result_fields,
+                        timeout=timeout)
+            if tool.name in self._tools:
+                raise ValueError(f"Tool {tool.name!r} is already registered")
+            self._tools[tool.name] = tool
+            self._stats[tool.name] = {"calls": 0, "errors": 0, "timeouts": 0, "seconds": 0.0}
+            return f
+
+        return register(func) if func is not None else register
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def get(self, name: str) -> Optional[Tool]:
+        return self._tools.get(name)
+
+    def names(self) -> List[str]:
+        return list(self._tools)
+
+    def schemas(self, names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Tool schemas for chat.completions.create(tools=...), in registration order"""
+        return [tool.schema for tool in self._tools.values() if names is None or tool.name in names]
+
+    def _resolve(self, name: str, arguments: Dict[str, Any]):
+        tool = self._tools.get(name)
+        if tool is None:
+            return None, {"error": "Unknown tool"}
+        try:
+            return tool, tool.bind(arguments)
+        except TypeError as e:
+            return None, {"error": f"Invalid arguments for {name}: {e}"}
+
+    def _record(self, name: str, seconds: float, failed: bool):
+        with self._lock:
+            stats = self._stats[name]
+            stats["calls"] += 1
+            stats["errors"] += int(failed)
+            stats["seconds"] += seconds
+
+    def scope_for(self, name: str, limit: Optional[float] = None) -> CancelScope:
+        """
+        Cancel scope for a call: the tool's timeout, capped at limit (e.g. what's left of a turn)
+
+        Args:
+            name: Tool name
+            limit: Upper bound in seconds (default: none)
+        """
+        tool = self._tools.get(name)
+        timeouts = [t for t in (tool.timeout if tool and tool.timeout is not None else self.default_timeout, limit)
+                    if t is not None]
+        return CancelScope(min(timeouts) if timeouts else None)
+
+    def time_out(self, name: str, scope: CancelScope, seconds: float, partial: Any = None) -> Dict[str, Any]:
+        """
+        Give up on a call: cancel it, count the timeout and build its outcome
+
+        Returns:
+            {"result": timeout_result(...), "cached": False, "seconds", "timed_out": True}
+        """
+        scope.cancel()
+        if scope.mark_timed_out() and name in self._stats:
+            with self._lock:
+                self._stats[name]["timeouts"] += 1
+        return {"result": timeout_result(name, seconds, partial), "cached": False,
+                "seconds": seconds, "timed_out": True}
+
+    def _cache_key(self, tool: Tool, bound: Dict[str, Any]) -> Optional[str]:
+        if self.cache is None or not self.cache.enabled or not tool.cache_ttl:
+            return None
+        return self.cache.key(tool.name, bound, tool.normalizers)
+
+    def _lookup(self, name: str, arguments: Dict[str, Any]):
+        """(tool, bound arguments, cache key, finished outcome or None)"""
+        tool, bound = self._resolve(name, arguments)
+        if tool is None:
+            return None, None, None, {"result": bound, "cached": False, "seconds": 0.0, "timed_out": False}
+        key = self._cache_key(tool, bound)
+        hit = self.cache.lookup(name, key) if key else None
+        if hit is not None:
+            return tool, bound, key, {"result": hit["result"], "cached": True, "seconds": 0.0, "timed_out": False}
+        return tool, bound, key, None
+
+    def _finish(self, tool: Tool, key: Optional[str], result, seconds: float) -> Dict[str, Any]:
+        if key:
+            self.cache.store(key, result, seconds, tool.cache_ttl)
+        return {"result": result, "cached": False, "seconds": seconds, "timed_out": False}
+
+    def _call(self, tool: Tool, bound: Dict[str, Any], scope: CancelScope):
+        """Execute a tool within its concurrency limit and scope; returns (result, seconds incl. queueing)"""
+        start = time.perf_counter()
+        tool.acquire(scope)
+        failed = True
+        token = _current_scope.set(scope)
+        try:
+            scope.check()
+            if tool.is_async:
+                result = asyncio.run(self._await_within(tool, bound, scope))
+            else:
+                result = tool.func(**bound)
+            failed = False
+        except ToolTimeout:
+            failed = False  # Counted as a timeout, not an error
+            raise
+        finally:
+            _current_scope.reset(token)
+            tool.release()
+            seconds = time.perf_counter() - start
+            self._record(tool.name, seconds, failed)
+        return result, seconds
+
+    @staticmethod
+    async def _await_within(tool: Tool, bound: Dict[str, Any], scope: CancelScope):
+        try:
+            return await asyncio.wait_for(tool.func(**bound), scope.time_left())
+        except asyncio.TimeoutError:
+            raise ToolTimeout() from None
+
+    async def _acall(self, tool: Tool, bound: Dict[str, Any], scope: CancelScope):
+        """Async variant of _call (sync tools run in a worker thread)"""
+        if not tool.is_async:
+            try:
+                return await asyncio.wait_for(asyncio.to_thread(self._call, tool, bound, scope),
+                                              scope.time_left())
+            except asyncio.TimeoutError:
+                raise ToolTimeout() from None
+        start = time.perf_counter()
+        await tool.aacquire(scope)
+        failed = True
+        token = _current_scope.set(scope)
+        try:
+            scope.check()
+            result = await self._await_within(tool, bound, scope)
+            failed = False
+        except ToolTimeout:
+            failed = False
+            raise
+        finally:
+            _current_scope.reset(token)
+            tool.release()
+            seconds = time.perf_counter() - start
+            self._record(tool.name, seconds, failed)
+        return result, seconds
+
+    def run(self, name: str, arguments: Dict[str, Any], scope: Optional[CancelScope] = None) -> Dict[str, Any]:
+        """
+        Run a tool from sync code (async tools get their own event loop)
+
+        Args:
+            name: Tool name from the model's tool call
+            arguments: Parsed tool call arguments
+            scope: Deadline/cancellation for the call (default: scope_for(name))
+
+        Returns:
+            {"result": tool result (or {"error": ...} for unknown tools and bad arguments,
+             timeout_result(...) when the call ran out of time), "cached": served from the
+             result cache, "seconds": execution time, "timed_out"}
+        """
+        tool, bound, key, outcome = self._lookup(name, arguments)
+        if outcome is not None:
+            return outcome
+        scope = scope or self.scope_for(name)
+        start = time.perf_counter()
+        try:
+            result, seconds = self._call(tool, bound, scope)
+        except ToolTimeout as e:
+            return self.time_out(name, scope, time.perf_counter() - start, e.partial)
+        return self._finish(tool, key, result, seconds)
+
+    async def arun(self, name: str, arguments: Dict[str, Any], scope: Optional[CancelScope] = None) -> Dict[str, Any]:
+        """Async variant of run"""
+        tool, bound, key, outcome = self._lookup(name, arguments)
+        if outcome is not None:
+            return outcome
+        scope = scope or self.scope_for(name)
+        start = time.perf_counter()
+        try:
+            result, seconds = await self._acall(tool, bound, scope)
+        except ToolTimeout as e:
+            return self.time_out(name, scope, time.perf_counter() - start, e.partial)
+        return self._finish(tool, key, result, seconds)
+
+    def batch(self, name: str, argument_list: List[Dict[str, Any]],
+              backend: Callable[[List[Dict[str, Any]]], List[Any]]) -> List[Any]:
+        """
+        Results of a tool for many argument sets, fetched with one backend call
+
+        Items share the tool's result cache: cached items are reused, and only
+        the misses go to the backend (time is split evenly when caching them).
+        If the backend times out, the ToolTimeout carries the cached items as
+        partial data ({"arguments", "result"} per item).
+
+        Args:
+            name: Registered tool whose signature, normalizers and TTL apply per item
+            argument_list: Arguments for each item
+            backend: Vectorized implementation taking the misses' bound arguments,
+                returning one result per item in the same order
+
+        Returns:
+            One result per item ({"error": ...} for items with bad arguments)
+        """
+        tool = self._tools[name]
+        results: List[Any] = [None] * len(argument_list)
+        misses = []
+        for index, arguments in enumerate(argument_list):
+            try:
+                bound = tool.bind(arguments)
+            except TypeError as e:
+                results[index] = {"error": f"Invalid arguments for {name}: {e}"}
+                continue
+            key = self._cache_key(tool, bound)
+            hit = self.cache.lookup(name, key) if key else None
+            if hit is not None:
+                results[index] = hit["result"]
+            else:
+                misses.append((index, bound, key))
+        if misses:
+            start = time.perf_counter()
+            try:
+                fetched = backend([bound for _, bound, _ in misses])
+            except ToolTimeout as e:
+                for index, _, _ in misses:
+                    results[index] = {"error": "timed out"}
+                partial = [{"arguments": arguments, "result": result}
+                           for arguments, result in zip(argument_list, results)]
+                raise ToolTimeout(str(e), partial=partial) from None
+            seconds = (time.perf_counter() - start) / len(misses)
+            for (index, _, key), result in zip(misses, fetched):
+                results[index] = self._finish(tool, key, result, seconds)["result"]
+        return results
+
+    def execute(self, name: str, arguments: Dict[str, Any]):
+        """Run a tool and return just its result (see run)"""
+        return self.run(name, arguments)["result"]
+
+    async def aexecute(self, name: str, arguments: Dict[str, Any]):
+        """Async variant of execute"""
+        return (await self.arun(name, arguments))["result"]
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Calls, errors, timeouts and total seconds per tool"""
+        with self._lock:
+            return {name: dict(values) for name, values in self._stats.items()}
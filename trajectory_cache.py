@@ -0,0 +1,126 @@
+"""
+Agent Trajectory Cache
+
+For a repeated question the tool agent makes the same round trips every time:
+a model call to decide which tools to call, the tools, then a model call to
+write the answer. This cache remembers the tool calls the model chose for a
+question so the planning round trips can be skipped:
+- Keyed on the normalized user message (trimmed, whitespace collapsed,
+  case-folded, trailing punctuation dropped) and a fingerprint of the tool
+  schemas, so a changed toolset never replays stale plans
+- Stores the sequence of tool turns (tool names and arguments), not results:
+  on a hit the tools run again (fresh, or from tool_cache.py) and only the
+  final synthesis call goes to the model
+- Only trajectories that ended in an answer without tool errors are stored
+- In-memory LRU with a TTL
+- Hits, misses, model calls and planning seconds saved
+
+Configuration via .env:
+- TRAJECTORY_CACHE_ENABLED (default true)
+- TRAJECTORY_CACHE_MAX_ENTRIES (default 256)
+- TRAJECTORY_CACHE_TTL seconds (default 900)
+"""
+
+import copy
+import hashlib
+import os
+import threading
+from typing import Dict, Any, Optional, List
+
+from dotenv import load_dotenv
+
+from llm_cache import LRUCache
+from prompt_layout import canonical_json
+from tool_cache import normalize_text
+
+load_dotenv()
+
+
+def normalize_message(user_message: str) -> str:
+    """Trim, collapse whitespace, case-fold and drop trailing punctuation"""
+    return normalize_text(user_message).rstrip(" ?!.")
+
+
+class TrajectoryCache:
+    """LRU of question → tool-call plan for the tool agent"""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 900, enabled: bool = True):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "model_calls_saved": 0, "seconds_saved": 0.0}
+
+    def key(self, user_message: str, tools: List[Dict[str, Any]]) -> str:
+        """Cache key for a question asked with a given set of tool schemas"""
+        fingerprint = hashlib.sha256(canonical_json(tools).encode("utf-8")).hexdigest()[:16]
+        return f"{fingerprint}:{normalize_message(user_message)}"
+
+    def _count(self, field: str, amount: float = 1):
+        with self._lock:
+            self._stats[field] += amount
+
+    def lookup(self, user_message: str, tools: List[Dict[str, Any]]) -> Optional[List[List[Dict[str, Any]]]]:
+        """
+        Look up the tool plan for a question
+
+        Returns:
+            Tool turns, each a list of {"name", "arguments"}, or None on a miss
+        """
+        if not self.enabled:
+            return None
+        entry = self.memory.get(self.key(user_message, tools))
+        if entry is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        self._count("model_calls_saved", len(entry["turns"]))
+        self._count("seconds_saved", entry["planning_seconds"])
+        return copy.deepcopy(entry["turns"])
+
+    def store(self, user_message: str, tools: List[Dict[str, Any]],
+              turns: List[List[Dict[str, Any]]], planning_seconds: float):
+        """
+        Remember the tool plan of a completed run
+
+        Args:
+            user_message: The user's question
+            tools: Tool schemas the run was made with
+            turns: Tool turns, each a list of {"name", "arguments"}
+            planning_seconds: Model time spent choosing the tools (reported as saved on hits)
+        """
+        if not self.enabled or not turns:
+            return
+        self.memory.set(self.key(user_message, tools),
+                        {"turns": copy.deepcopy(turns), "planning_seconds": planning_seconds}, self.ttl)
+        self._count("stores")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] / lookups) if lookups else 0.0
+        stats["entries"] = len(self.memory)
+        stats["evictions"] = self.memory.evictions
+        return stats
+
+    def clear(self):
+        """Drop all trajectories and reset counters"""
+        self.memory.clear()
+        with self._lock:
+            for field in self._stats:
+                self._stats[field] = 0
+
+
+# Process-wide trajectory cache shared by all sessions
+trajectory_cache = TrajectoryCache(
+    max_entries=int(os.getenv("TRAJECTORY_CACHE_MAX_ENTRIES", 256)),
+    ttl=float(os.getenv("TRAJECTORY_CACHE_TTL", 900)),
+    enabled=os.getenv("TRAJECTORY_CACHE_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+)
+
+
+def get_trajectory_cache_stats() -> Dict[str, Any]:
+    """Get hit/miss counters for the shared trajectory cache"""
+    return trajectory_cache.stats()